@@ -1,20 +1,114 @@
+import json
+import os
+
 import pandas as pd
 
-from dash import Dash, dcc, html, Input, Output, State, ctx
+from dash import (
+    ClientsideFunction,
+    Dash,
+    dcc,
+    html,
+    Input,
+    Output,
+    State,
+    ctx,
+    no_update,
+)
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 from dash.exceptions import PreventUpdate
-from common_functions import *
+from common_functions import (
+    DASHBOARD_CHARTS,
+    TREND_RESOLUTIONS,
+    get_axis_year,
+    get_bar_fig,
+    get_count_frame,
+    get_double_bar_fig,
+    get_double_line_fig,
+    get_map_bins_fig,
+    get_single_line_plot,
+    get_split_count_frame,
+    get_time_rollups,
+    get_top_n_with_others,
+    get_trend_resolution,
+    get_trend_x_values,
+)
+from columnar_store import decode_float_column, get_unique_values
+from count_cube import CountCube
+from datasets import DATASETS, SPLIT_VALUES, prepare_dataset
+from geo_index import GeoIndex, get_bin_level, get_view_tiles
+from metrics import Metrics
+from figure_cache import (
+    FigureCache,
+    get_figure_patch,
+    get_figure_signature,
+    serialize_figure,
+)
 import copy
 
+# Memory budget of the filter state -> figures cache, per process
+FIGURE_CACHE_BYTES = int(os.environ.get("FIGURE_CACHE_MB", 64)) * 1024 * 1024
 
-def main():
-    # Path to data, local
-    data_path = "data/new_cleaned_updated_data.csv"
+# Per stage callback timings on /metrics, METRICS_ENABLED=0 turns them off
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Cross filter in the browser (assets/crossfilter.js) instead of on the
+# server. The count cube is sent once with the page, clicks cost no requests.
+CLIENTSIDE_FILTERING = os.environ.get("CLIENTSIDE_FILTERING", "0") == "1"
+
+# Bars in the top sharks figure, the rest are summed into others
+TOP_SHARKS = 7
+
+# Points per line of the incident trend, about 2 per pixel of its width.
+# Longer series are downsampled (min/max per bucket) for the visible
+# range, zooming in narrows the range so finer detail comes back.
+TREND_MAX_POINTS = 500
+
+# Dataset to serve, a key of datasets.DATASETS (shark, railroad, osha)
+DASHBOARD_DATASET = os.environ.get("DASHBOARD_DATASET", "shark")
 
-    df = prepare_data(data_path)
-    df_all_columns = list(df.columns)
-    # print(df_all_columns)
+
+def create_app(dataset_name: str = None) -> Dash:
+    """
+    Build the dashboard: load the data, build the count cube and register
+    the callbacks. Everything is done once here, so a WSGI server that
+    preloads the app (see wsgi.py) shares it between its workers.
+
+    Args:
+        dataset_name (str): key of datasets.DATASETS.
+            Defaults to None (DASHBOARD_DATASET).
+
+    Returns:
+        Dash: the app, app.server is the flask WSGI app
+    """
+    dataset = DATASETS[dataset_name or DASHBOARD_DATASET]
+    # Labels of the provoked/unprovoked values of the split role
+    split_labels = dict(
+        zip(
+            SPLIT_VALUES,
+            [value.title() for value in dataset["split"]["values"]],
+        )
+    )
+    facet_titles = {
+        graph_id: facet["title"]
+        for graph_id, facet in dataset["facets"].items()
+    }
+    has_map = "geo" in dataset
+
+    # Only the columns the charts read, free text columns stay on disk.
+    # Memory mapped codes + values, no pandas objects: every worker process
+    # shares the same pages (see columnar_store.py).
+    row_codes, row_categories = prepare_dataset(dataset)
+    # Decade and month of each incident, the trend switches to them when
+    # zoomed out/in (see get_trend_dimension)
+    rollup_codes, rollup_categories = get_time_rollups(
+        row_codes, row_categories
+    )
+    row_codes = {**row_codes, **rollup_codes}
+    row_categories = {**row_categories, **rollup_categories}
+    states = get_unique_values(
+        row_codes["state_names"], row_categories["state_names"]
+    )
 
     app = Dash(
         __name__,
@@ -25,11 +119,8 @@ def main():
     # Dropdown for state names
     dropdown_states = dcc.Dropdown(
         id="dropdown-states",
-        options=[
-            {"label": state, "value": state}
-            for state in df["state_names"].unique()
-        ],
-        value=df["state_names"].unique().tolist(),
+        options=[{"label": state, "value": state} for state in states],
+        value=list(states),
         multi=True,
         className="dropdown-container",
     )
@@ -41,10 +132,10 @@ def main():
             dcc.Checklist(
                 id="checkbox-items",
                 options=[
-                    {"label": "Provoked", "value": "provoked"},
-                    {"label": "Unprovoked", "value": "unprovoked"},
+                    {"label": split_labels[value], "value": value}
+                    for value in SPLIT_VALUES
                 ],
-                value=["provoked", "unprovoked"],
+                value=list(SPLIT_VALUES),
                 className="checkbox-container",
                 inline=True,
                 inputStyle={"margin-right": "5px", "padding": "2px"},
@@ -80,7 +171,7 @@ def main():
 
     # Header - Initially for multipage app
     header_div = html.Div(
-        "Australian Shark Incidents Analysis",
+        dataset["title"],
         style={
             "fontSize": "32px",
             "color": "#ffd600",
@@ -201,6 +292,28 @@ def main():
                     className="h-50",
                     style={"height": "50%"},
                 ),
+                # Datasets without locations have no map
+                *(
+                    [
+                        dbc.Row(
+                            [
+                                dbc.Col(
+                                    dcc.Graph(
+                                        id="incident-map",
+                                        style={
+                                            "width": "100",
+                                            "height": "100%",
+                                        },
+                                    ),
+                                    width=12,
+                                    style={"height": "60vh"},
+                                ),
+                            ],
+                        )
+                    ]
+                    if has_map
+                    else []
+                ),
             ],
         )
 
@@ -213,220 +326,182 @@ def main():
             dcc.Store(id="stored-monthly-click"),
             dcc.Store(id="stored-top-sharks-click"),
             dcc.Store(id="stored-line-relayout"),
+            # lon/lat polygon of the lasso/box drawn on the map, or None
+            dcc.Store(id="map-selection"),
+            # Normalized [isin, between] of the current filters, the figures
+            # only listen to this (and the radio) instead of every click
+            dcc.Store(id="filter-selection"),
+            # Signature of the figure each graph shows, see update_figure
+            *[
+                dcc.Store(id=f"{graph_id}-signature")
+                for graph_id in DASHBOARD_CHARTS
+            ],
             dcc.Location(id="url", refresh=False),
             html.Div(id="page-content"),
         ]
     )
 
-    @app.callback(Output("page-content", "children"), Input("url", "pathname"))
-    def display_page(pathname):
-        return shared_layout(general_content())
-
-    # Callback - I did it one step at a time, did not have enough time to do multiple functions for each.
-    # I apologize for the huge functions.
-    @app.callback(
-        [
-            Output("incident-trend", "figure"),
-            Output("victim-injury-bar", "figure"),
-            Output("site-category-bar", "figure"),
-            Output("injury-severity-bar", "figure"),
-            Output("monthly-incidents-bar", "figure"),
-            Output("top-sharks-bar", "figure"),
-            Output("stored-bar-click", "data"),
-            Output("stored-monthly-click", "data"),
-            Output("stored-site-category-click", "data"),
-            Output("stored-injury-severity-click", "data"),
-            Output("stored-top-sharks-click", "data"),
-            Output("stored-line-relayout", "data"),
-        ],
-        [
-            Input("dropdown-states", "value"),
-            Input("checkbox-items", "value"),
-            Input("radio-together-separate", "value"),
-            Input("victim-injury-bar", "clickData"),
-            Input("site-category-bar", "clickData"),
-            Input("injury-severity-bar", "clickData"),
-            Input("monthly-incidents-bar", "clickData"),
-            Input("top-sharks-bar", "clickData"),
-            Input("incident-trend", "relayoutData"),
-            Input("reset-button", "n_clicks"),
-            # Input("reset-filters-button", "n_clicks"),
-        ],
-        [
-            State("stored-bar-click", "data"),
-            State("stored-site-category-click", "data"),
-            State("stored-injury-severity-click", "data"),
-            State("stored-monthly-click", "data"),
-            State("stored-top-sharks-click", "data"),
-            State("stored-line-relayout", "data"),
-        ],
+    # Every chart is a count over these dimensions, so they are answered
+    # from a preaggregated cube instead of the rows. Built once at startup.
+    cube_dimensions = [
+        "state_names",
+        "provoked_unprovoked",
+        "victim_injury",
+        "site_category_cleaned",
+        "shark_common_name",
+        "incident_month",
+        "injury_severity",
+        "incident_year",
+        # rollups of year and month, no extra cells
+        "incident_decade",
+        "incident_month_year",
+    ]
+    # Datasets with dates also get the day, that one does add cells (at
+    # most one per row)
+    if "incident_day" in row_codes:
+        cube_dimensions.append("incident_day")
+    count_cube = CountCube(
+        {dim: row_codes[dim] for dim in cube_dimensions},
+        {dim: row_categories[dim] for dim in cube_dimensions},
+        range_dimensions=["incident_year"],
     )
-    # Funciton that runs on callback. Updates the graphs.
-    def update_graphs(
-        selected_states,
-        checkbox_values,
-        radio_value,
-        bar_click,
-        site_category_click,
-        injury_severity_click,
-        monthly_click,
-        top_sharks_click,
-        trend_relayout,
-        reset_click,
-        stored_bar_click,
-        stored_site_category_click,
-        stored_injury_severity_click,
-        stored_monthly_click,
-        stored_top_sharks_click,
-        stored_line_relayout,
-    ):
-        ctx_id = ctx.triggered_id
-        if ctx_id == "reset-button":
-            filtered_data = filter_data_by_states(df, selected_states)
-
-            if (
-                "provoked" in checkbox_values
-                and "unprovoked" not in checkbox_values
-            ):
-
-                filtered_data = filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "provoked"
-                )
+    categories = count_cube.categories
+
+    # Incident locations for the map, in a quadtree with the same filter
+    # columns as the cube, so the map follows every filter
+    geo_index = None
+    if has_map:
+        geo_index = GeoIndex(
+            decode_float_column(
+                row_codes["latitude"], row_categories["latitude"]
+            ),
+            decode_float_column(
+                row_codes["longitude"], row_categories["longitude"]
+            ),
+            {dim: row_codes[dim] for dim in cube_dimensions},
+            categories,
+            range_columns=["incident_year"],
+        )
 
-            elif (
-                "unprovoked" in checkbox_values
-                and "provoked" not in checkbox_values
-            ):
+    def get_selection(
+        selected_states, checkbox_values, isin=None, between=None
+    ):
+        # States and provoked checkboxes always apply, clicks/zoom on top.
+        # Normalized, so equivalent filter states give the same selection.
+        provoked_values = [
+            value for value in SPLIT_VALUES if value in checkbox_values
+        ]
+        return count_cube.index.normalize(
+            isin={
+                "state_names": selected_states,
+                "provoked_unprovoked": provoked_values,
+                **(isin or {}),
+            },
+            between=between,
+        )
 
-                filtered_data = filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "unprovoked"
-                )
-            elif (
-                "provoked" not in checkbox_values
-                and "unprovoked" not in checkbox_values
-            ):
+    def get_trend_dimension(between):
+        # Finest rollup that fits the chart for the years in view, the
+        # zoom on the trend is a between filter on incident_year
+        years = categories["incident_year"]
+        low, high = (between or {}).get(
+            "incident_year", (years.min(), years.max())
+        )
+        _, dimension = get_trend_resolution(
+            high - low + 1, cube_dimensions, TREND_MAX_POINTS
+        )
+        return dimension
 
-                filtered_data = pd.DataFrame(columns=df_all_columns)
-            else:
-                filtered_data = filter_data_by_states(df, selected_states)
+    trend_resolutions = {dim: name for name, dim, _ in TREND_RESOLUTIONS}
 
-            aggregated_data = groupby_count(
-                filtered_data, "incident_year", "count"
-            )
-            line_fig = get_single_line_plot(
+    def get_trend_fig(marginal, radio_value):
+        xname = marginal.index.name
+        resolution = trend_resolutions[xname]
+        marginal = marginal.set_axis(
+            get_trend_x_values(marginal.index, resolution)
+        )
+        if radio_value == "together":
+            aggregated_data = get_count_frame(marginal["count"])
+            trend_fig = get_single_line_plot(
                 aggregated_data,
-                "incident_year",
+                xname,
                 "count",
                 "Incidents Over Time",
+                max_points=TREND_MAX_POINTS,
             )
+        else:
+            trend_fig = get_separate_trend_fig(marginal, xname)
+        # Year is the default, a different axis title also makes the
+        # signature differ so the browser gets the whole figure
+        if resolution != "year":
+            trend_fig.update_xaxes(title_text=resolution.title())
+        return trend_fig
+
+    def get_separate_trend_fig(marginal, xname):
+        provoked_agg = get_count_frame(marginal["provoked"], "provoked_count")
+        unprovoked_agg = get_count_frame(
+            marginal["unprovoked"], "unprovoked_count"
+        )
+        return get_double_line_fig(
+            df_first_agg=provoked_agg,
+            df_second_agg=unprovoked_agg,
+            xname=xname,
+            y1name="provoked_count",
+            y2name="unprovoked_count",
+            g1_name=f"{split_labels['provoked']} Incidents",
+            g2_name=f"{split_labels['unprovoked']} Incidents",
+            title="Incidents Over Time",
+            yaxis_title="Number of Incidents",
+            max_points=TREND_MAX_POINTS,
+        )
 
-            injury_counts = get_reset_value_counts(
-                filtered_data, "victim_injury"
-            )
-
-            bar_fig = get_bar_fig(
-                injury_counts, "victim_injury", "count", "Injury Type", None
-            )
-
-            site_category_counts = get_reset_value_counts(
-                filtered_data, "site_category_cleaned"
-            )
-
-            site_category_bar_fig = get_bar_fig(
-                site_category_counts,
-                "site_category_cleaned",
-                "count",
-                "Site Category",
-                None,
+    def get_category_bar_fig(
+        marginal, radio_value, title, yaxis_title=None, sort=True
+    ):
+        column_name = marginal.index.name
+        if radio_value == "together":
+            counts = get_count_frame(marginal["count"], sort=sort)
+            return get_bar_fig(
+                counts, column_name, "count", title, yaxis_title
             )
 
-            injury_severity_counts = get_reset_value_counts(
-                filtered_data, "injury_severity"
-            )
-            injury_severity_bar_fig = get_bar_fig(
-                injury_severity_counts,
-                "injury_severity",
-                "count",
-                "Injury Severity",
-                None,
-            )
-            # fn for this just swapped months around, too lz to fix
-            monthly_counts = (
-                filtered_data.groupby("incident_month")
-                .size()
-                .reset_index(name="count")
-            )
-            # monthly_counts = map_months_for_graphs(monthly_counts)
-            monthly_bar_fig = get_bar_fig(
-                monthly_counts,
-                "incident_month",
-                "count",
-                "Monthly Incidents",
-                "Number of Incidents",
-            )
+        combined_counts = get_split_count_frame(marginal)
+        return get_double_bar_fig(
+            combined_counts,
+            xname=column_name,
+            y1name="provoked_count",
+            y2name="unprovoked_count",
+            g1_name=split_labels["provoked"],
+            g2_name=split_labels["unprovoked"],
+            title=title,
+            yaxis_title=yaxis_title,
+        )
 
-            # These changes are made here but could be moved to a function
-            # Its different thatn regular bar graph functions
-            # Because I am adding number of tupes in the end
-            # Like 18 shark types in others, for example.
-            # Had logic for hover text. I had an old function
-            # That showed the values, got lost somewhere.
-            shark_counts = (
-                filtered_data["shark_common_name"].value_counts().reset_index()
-            )
-            shark_counts.columns = ["shark_common_name", "count"]
-
-            top_7_sharks = shark_counts.head(7)
-            others = shark_counts.iloc[7:]
-            num_others = others["shark_common_name"].nunique()
-            others_count = others["count"].sum()
-            others_row = {
-                "shark_common_name": f"others: {num_others} types",
-                "count": others_count,
-            }
-            top_7_sharks = pd.concat(
-                [top_7_sharks, pd.DataFrame([others_row])], ignore_index=True
-            )
-            others_text = "<br>".join(
-                [
-                    f"{row['shark_common_name']}: {row['count']} incidents"
-                    for _, row in others.iterrows()
-                ]
-            )
-            hover_text = [
-                (
-                    f"{row['shark_common_name']}: {row['count']} incidents"
-                    if row["shark_common_name"]
-                    != f"others: {num_others} types"
-                    else others_text
-                )
-                for _, row in top_7_sharks.iterrows()
-            ]
-            top_7_sharks.loc[
-                top_7_sharks["shark_common_name"]
-                == f"others: {num_others} types",
-                "hover_text",
-            ] = others_text
-
-            top_7_sharks["hover_text"] = top_7_sharks["hover_text"].fillna(
-                top_7_sharks["shark_common_name"]
-                + ": "
-                + top_7_sharks["count"].astype(str)
-                + " incidents"
+    def get_top_sharks_fig(marginal, radio_value):
+        if radio_value == "together":
+            # Different than the regular bar graph functions because I am
+            # adding number of types in the end, like 18 shark types in
+            # others, for example. The others bar is always there.
+            shark_counts = get_count_frame(marginal["count"], sort=True)
+            shark_names, shark_totals, _, _ = get_top_n_with_others(
+                shark_counts["shark_common_name"].to_numpy(),
+                shark_counts["count"].to_numpy(),
+                TOP_SHARKS,
+                always_add_others=True,
             )
 
             top_sharks_fig = go.Figure()
 
             top_sharks_fig.add_trace(
                 go.Bar(
-                    x=top_7_sharks["shark_common_name"],
-                    y=top_7_sharks["count"],
+                    x=shark_names,
+                    y=shark_totals,
                     marker=dict(color="#26a69a"),
                 )
             )
 
             top_sharks_fig.update_layout(
-                title="Most Dangerous Sharks",
+                title=facet_titles["top-sharks-bar"],
                 legend=dict(
                     orientation="h",
                     x=0.5,
@@ -445,14 +520,315 @@ def main():
                 showlegend=False,
                 transition={"duration": 800, "easing": "sin-in-out"},
             )
+            return top_sharks_fig
+
+        provoked_sharks = get_count_frame(
+            marginal["provoked"], "provoked_count", sort=True
+        )
+        unprovoked_sharks = get_count_frame(
+            marginal["unprovoked"], "unprovoked_count", sort=True
+        )
+
+        combined_sharks = pd.merge(
+            provoked_sharks,
+            unprovoked_sharks,
+            on="shark_common_name",
+            how="outer",
+        ).fillna(0)
+
+        combined_sharks = combined_sharks.sort_values(
+            by=["provoked_count", "unprovoked_count"], ascending=False
+        ).head(TOP_SHARKS)
+
+        # Appended, .loc[len(...)] would overwrite the row labelled 7
+        others_row = {
+            "shark_common_name": "Others",
+            "provoked_count": provoked_sharks["provoked_count"]
+            .iloc[TOP_SHARKS:]
+            .sum(),
+            "unprovoked_count": unprovoked_sharks["unprovoked_count"]
+            .iloc[TOP_SHARKS:]
+            .sum(),
+        }
+        combined_sharks = pd.concat(
+            [combined_sharks, pd.DataFrame([others_row])], ignore_index=True
+        )
+
+        top_sharks_fig = go.Figure(
+            data=[
+                go.Bar(
+                    x=combined_sharks["shark_common_name"],
+                    y=combined_sharks["provoked_count"],
+                    name=split_labels["provoked"],
+                    marker_color="#26a69a",
+                ),
+                go.Bar(
+                    x=combined_sharks["shark_common_name"],
+                    y=combined_sharks["unprovoked_count"],
+                    name=split_labels["unprovoked"],
+                    marker_color="#ab47bc",
+                ),
+            ]
+        )
+
+        top_sharks_fig.update_layout(
+            # barmode="stack",
+            title=facet_titles["top-sharks-bar"],
+            legend=dict(
+                orientation="h",
+                x=0.5,
+                y=1.15,
+                xanchor="center",
+                yanchor="top",
+                font=dict(size=12, color="#ffd600"),
+            ),
+            font=dict(color="#ffd600", size=12),
+            plot_bgcolor="rgba(0,0,0,0)",
+            paper_bgcolor="rgba(0,0,0,0)",
+            # xaxis_title="Shark Type",
+            # yaxis_title="Number of Incidents",
+            xaxis=dict(showgrid=False),
+            yaxis=dict(showgrid=False),
+            transition={"duration": 800, "easing": "sin-in-out"},
+        )
+        return top_sharks_fig
+
+    # title, yaxis title and whether the bars are sorted by count
+    bar_chart_options = {
+        "victim-injury-bar": (facet_titles["victim-injury-bar"], None, True),
+        "site-category-bar": (facet_titles["site-category-bar"], None, True),
+        "injury-severity-bar": (
+            facet_titles["injury-severity-bar"],
+            None,
+            True,
+        ),
+        # months stay in calendar order
+        "monthly-incidents-bar": (
+            "Monthly Incidents",
+            "Number of Incidents",
+            False,
+        ),
+    }
+
+    # Timings per stage (filter, aggregate, build, serialize) on /metrics
+    metrics = Metrics(enabled=METRICS_ENABLED)
+    metrics.register_endpoint(app.server)
+
+    def get_marginal(graph_id, selection, radio_value, map_polygon=None):
+        # Only counts the one dimension this figure shows
+        column_name = DASHBOARD_CHARTS[graph_id][0]
+        split = "provoked_unprovoked" if radio_value == "separate" else None
+        isin, between = selection
+        if graph_id == "incident-trend":
+            column_name = get_trend_dimension(between)
+        if not map_polygon:
+            with metrics.time("filter", graph_id):
+                cells = count_cube.select(isin=isin, between=between)
+            with metrics.time("aggregate", graph_id):
+                return count_cube.marginals([column_name], cells, split)[
+                    column_name
+                ]
+
+        # A lasso/box on the map keeps the incidents inside it, the cube
+        # has no locations so these are counted per row from the quadtree
+        with metrics.time("filter", graph_id):
+            positions = geo_index.select_polygon(map_polygon)
+            positions = positions[
+                geo_index.select(isin=isin, between=between)[positions]
+            ]
+        with metrics.time("aggregate", graph_id):
+            return geo_index.marginals([column_name], positions, split)[
+                column_name
+            ]
+
+    def get_figure(graph_id, marginal, radio_value):
+        with metrics.time("build", graph_id):
+            if graph_id == "incident-trend":
+                return get_trend_fig(marginal, radio_value)
+            if graph_id == "top-sharks-bar":
+                return get_top_sharks_fig(marginal, radio_value)
+            return get_category_bar_fig(
+                marginal, radio_value, *bar_chart_options[graph_id]
+            )
+
+    # Same filters -> same figure, most users look at the default view
+    figure_cache = FigureCache(max_bytes=FIGURE_CACHE_BYTES)
+    metrics.add_gauges(
+        "figure_cache", "Figure cache counters", figure_cache.stats
+    )
+
+    def get_serialized_figure(
+        graph_id, selection, radio_value, map_polygon=None
+    ):
+        marginal = get_marginal(graph_id, selection, radio_value, map_polygon)
+        figure = get_figure(graph_id, marginal, radio_value)
+        with metrics.time("serialize", graph_id):
+            figure = serialize_figure(figure)
+            return [figure, get_figure_signature(figure)]
+
+    def get_cached_figure(graph_id, selection, radio_value, map_polygon):
+        # [figure, signature]
+        isin, between = selection
+        key = json.dumps(
+            [graph_id, radio_value, isin, between, map_polygon],
+            sort_keys=True,
+        )
+        return figure_cache.get_or_compute(
+            key,
+            lambda: get_serialized_figure(
+                graph_id, selection, radio_value, map_polygon
+            ),
+        )
+
+    def get_figure_templates():
+        # Layout and trace styling of every figure in both modes, for the
+        # clientside callbacks. The browser fills in x and y.
+        selection = get_selection(
+            list(categories["state_names"]), list(SPLIT_VALUES)
+        )
+        # The plotly theme is the same in every figure, sent once
+        layout_template = None
+        charts = {}
+        for graph_id, (column_name,) in DASHBOARD_CHARTS.items():
+            if graph_id == "incident-trend":
+                kind, sort = "line", False
+            elif graph_id == "top-sharks-bar":
+                kind, sort = "top", True
+            else:
+                kind, sort = "bar", bar_chart_options[graph_id][2]
+            figures = {}
+            for radio_value in ["together", "separate"]:
+                figure, _ = get_serialized_figure(
+                    graph_id, selection, radio_value
+                )
+                for trace in figure["data"]:
+                    trace.pop("x", None)
+                    trace.pop("y", None)
+                layout_template = figure["layout"].pop("template", None)
+                figures[radio_value] = figure
+            charts[graph_id] = {
+                "column": column_name,
+                "kind": kind,
+                "sort": sort,
+                "top_n": TOP_SHARKS,
+                "figures": figures,
+            }
+        return {"layout_template": layout_template, "charts": charts}
+
+    def get_map_view(map_relayout):
+        # Zoom and visible tiles from the map relayoutData, the whole
+        # world at the opening zoom until the user moves the map
+        if not map_relayout or "map.zoom" not in map_relayout:
+            return get_bin_level(dataset["map"]["zoom"]), None
+        level = get_bin_level(map_relayout["map.zoom"])
+        corners = map_relayout.get("map._derived", {}).get("coordinates")
+        if not corners:
+            return level, None
+        longitudes = [corner[0] for corner in corners]
+        latitudes = [corner[1] for corner in corners]
+        bounds = (
+            min(longitudes),
+            min(latitudes),
+            max(longitudes),
+            max(latitudes),
+        )
+        return level, get_view_tiles(bounds, level)
+
+    def get_serialized_map_figure(selection, level, view_tiles):
+        isin, between = selection
+        with metrics.time("filter", "incident-map"):
+            mask = geo_index.select(
+                isin=isin, between=between, view_tiles=view_tiles, level=level
+            )
+        with metrics.time("aggregate", "incident-map"):
+            bins = geo_index.bins(mask, level)
+        with metrics.time("build", "incident-map"):
+            figure = get_map_bins_fig(
+                bins,
+                "Incident Locations",
+                dataset["map"]["center"],
+                dataset["map"]["zoom"],
+            )
+        with metrics.time("serialize", "incident-map"):
+            return serialize_figure(figure)
+
+    if CLIENTSIDE_FILTERING:
+        app.layout.children.extend(
+            [
+                dcc.Store(id="cube-data", data=count_cube.to_columns()),
+                dcc.Store(id="figure-templates", data=get_figure_templates()),
+            ]
+        )
+
+    @app.callback(Output("page-content", "children"), Input("url", "pathname"))
+    def display_page(pathname):
+        return shared_layout(general_content())
+
+    # Callback - I did it one step at a time, did not have enough time to do multiple functions for each.
+    # I apologize for the huge functions.
+    # Turns the dropdown, checkboxes and clicks into the filter selection.
+    # The figures have their own callbacks below, they only run when the
+    # selection (or the radio) actually changes.
+    selection_outputs = [
+        Output("filter-selection", "data"),
+        Output("stored-bar-click", "data"),
+        Output("stored-site-category-click", "data"),
+        Output("stored-injury-severity-click", "data"),
+        Output("stored-monthly-click", "data"),
+        Output("stored-top-sharks-click", "data"),
+        Output("stored-line-relayout", "data"),
+    ]
+    selection_inputs = [
+        Input("dropdown-states", "value"),
+        Input("checkbox-items", "value"),
+        Input("victim-injury-bar", "clickData"),
+        Input("site-category-bar", "clickData"),
+        Input("injury-severity-bar", "clickData"),
+        Input("monthly-incidents-bar", "clickData"),
+        Input("top-sharks-bar", "clickData"),
+        Input("incident-trend", "relayoutData"),
+        Input("reset-button", "n_clicks"),
+        # Input("reset-filters-button", "n_clicks"),
+    ]
+    selection_states = [
+        State("stored-bar-click", "data"),
+        State("stored-site-category-click", "data"),
+        State("stored-injury-severity-click", "data"),
+        State("stored-monthly-click", "data"),
+        State("stored-top-sharks-click", "data"),
+        State("stored-line-relayout", "data"),
+        State("filter-selection", "data"),
+    ]
+
+    # Funciton that runs on callback. Updates the selection.
+    def update_selection(
+        selected_states,
+        checkbox_values,
+        bar_click,
+        site_category_click,
+        injury_severity_click,
+        monthly_click,
+        top_sharks_click,
+        trend_relayout,
+        reset_click,
+        stored_bar_click,
+        stored_site_category_click,
+        stored_injury_severity_click,
+        stored_monthly_click,
+        stored_top_sharks_click,
+        stored_line_relayout,
+        stored_selection,
+    ):
+        def if_changed(value, stored_value):
+            # Only send what changed back to the browser
+            return no_update if value == stored_value else value
+
+        ctx_id = ctx.triggered_id
+        if ctx_id == "reset-button":
+            selection = list(get_selection(selected_states, checkbox_values))
             # No clicks, so None
             return (
-                line_fig,
-                bar_fig,
-                site_category_bar_fig,
-                injury_severity_bar_fig,
-                monthly_bar_fig,
-                top_sharks_fig,
+                if_changed(selection, stored_selection),
                 None,
                 None,
                 None,
@@ -530,67 +906,43 @@ def main():
         # )
         stored_top_sharks_click = copy.deepcopy(top_sharks_click)
 
-        filtered_data = filter_data_by_states(df, selected_states)
-
-        if (
-            "provoked" in checkbox_values
-            and "unprovoked" not in checkbox_values
-        ):
-            filtered_data = filter_data_single_column_single_value(
-                filtered_data, "provoked_unprovoked", "provoked"
-            )
-        elif (
-            "unprovoked" in checkbox_values
-            and "provoked" not in checkbox_values
-        ):
-            filtered_data = filter_data_single_column_single_value(
-                filtered_data, "provoked_unprovoked", "unprovoked"
-            )
-        elif (
-            "provoked" not in checkbox_values
-            and "unprovoked" not in checkbox_values
-        ):
-            filtered_data = pd.DataFrame(columns=df_all_columns)
-        else:
-            filtered_data = filter_data_by_states(df, selected_states)
-
         # All commented code below is becasue:
         # Bug - clicks caused df to become empty over time
         # Recommended by the TA (forgot his name, he was awesome)
         # To make changes at the end.
         if bar_click and "points" in bar_click:
             selected_injury = [bar_click["points"][0]["x"]]
-            if selected_injury not in df["victim_injury"].unique():
-                selected_injury = list(df["victim_injury"].unique())
+            if selected_injury[0] not in categories["victim_injury"]:
+                selected_injury = list(categories["victim_injury"])
 
             # filtered_data = filter_data_by_states(df, selected_states)
             # filtered_data = filter_data_single_column_single_value(
             #     filtered_data, "victim_injury", selected_injury
             # )
         else:
-            selected_injury = list(df["victim_injury"].unique())
+            selected_injury = list(categories["victim_injury"])
         if site_category_click and "points" in site_category_click:
             site_category = [site_category_click["points"][0]["x"]]
-            if site_category not in df["site_category_cleaned"].unique():
-                site_category = list(df["site_category_cleaned"].unique())
+            if site_category[0] not in categories["site_category_cleaned"]:
+                site_category = list(categories["site_category_cleaned"])
             # filtered_data = filter_data_by_states(df, selected_states)
 
             # filtered_data = filter_data_single_column_single_value(
             #     filtered_data, "site_category_cleaned", site_category
             # )
         else:
-            site_category = list(df["site_category_cleaned"].unique())
+            site_category = list(categories["site_category_cleaned"])
         if injury_severity_click and "points" in injury_severity_click:
             injury_severity = [injury_severity_click["points"][0]["x"]]
-            if injury_severity not in df["injury_severity"].unique():
-                injury_severity = list(df["injury_severity"].unique())
+            if injury_severity[0] not in categories["injury_severity"]:
+                injury_severity = list(categories["injury_severity"])
             # filtered_data = filter_data_by_states(df, selected_states)
 
             # filtered_data = filter_data_single_column_single_value(
             #     filtered_data, "injury_severity", injury_severity
             # )
         else:
-            injury_severity = list(df["injury_severity"].unique())
+            injury_severity = list(categories["injury_severity"])
 
         # The below could also be a function.
         if monthly_click and "points" in monthly_click:
@@ -634,33 +986,33 @@ def main():
                 monthly_incidents = [x_value]
             else:
                 monthly_click = None
-                monthly_incidents = list(df["incident_month"].unique())
+                monthly_incidents = list(categories["incident_month"])
         else:
             monthly_click = None
-            monthly_incidents = list(df["incident_month"].unique())
+            monthly_incidents = list(categories["incident_month"])
 
         if top_sharks_click and "points" in top_sharks_click:
             selected_shark = [top_sharks_click["points"][0]["x"]]
-            if selected_shark not in df["shark_common_name"].unique():
-                selected_shark = list(df["shark_common_name"].unique())
+            if selected_shark[0] not in categories["shark_common_name"]:
+                selected_shark = list(categories["shark_common_name"])
             # filtered_data = filter_data_by_states(df, selected_states)
 
             # filtered_data = filter_data_single_column_single_value(
             #     filtered_data, "shark_common_name", selected_shark
             # )
         else:
-            selected_shark = list(df["shark_common_name"].unique())
+            selected_shark = list(categories["shark_common_name"])
         if (
             trend_relayout
             and "xaxis.range[0]" in trend_relayout
             and "xaxis.range[1]" in trend_relayout
         ):
-            start_year = int(float(trend_relayout["xaxis.range[0]"]))
-            end_year = int(float(trend_relayout["xaxis.range[1]"]))
-            if start_year not in df["incident_year"].unique():
-                start_year = df["incident_year"].min()
-            if end_year not in df["incident_year"].unique():
-                end_year = df["incident_year"].max()
+            start_year = get_axis_year(trend_relayout["xaxis.range[0]"])
+            end_year = get_axis_year(trend_relayout["xaxis.range[1]"])
+            if start_year not in categories["incident_year"]:
+                start_year = categories["incident_year"].min()
+            if end_year not in categories["incident_year"]:
+                end_year = categories["incident_year"].max()
             # filtered_data = filter_data_by_states(df, selected_states)
 
             # filtered_data = filtered_data[
@@ -668,8 +1020,8 @@ def main():
             #     & (filtered_data["incident_year"] <= end_year)
             # ]
         else:
-            start_year = df["incident_year"].min()
-            end_year = df["incident_year"].max()
+            start_year = categories["incident_year"].min()
+            end_year = categories["incident_year"].max()
 
         # This is here for debugging purposes. Can comment out if needed.
         # print(f"{stored_line_relayout=}")
@@ -689,434 +1041,165 @@ def main():
 
         # Do this in graph functions
         # filtered_data = map_months_for_graphs(filtered_data)
-        filtered_data = filtered_data.loc[
-            (filtered_data["incident_year"] >= start_year)
-            & (filtered_data["incident_year"] <= end_year)
-            & (filtered_data["victim_injury"].isin(selected_injury))
-            & (filtered_data["site_category_cleaned"].isin(site_category))
-            & (filtered_data["shark_common_name"].isin(selected_shark))
-            & (filtered_data["incident_month"].isin(monthly_incidents))
-            & (filtered_data["injury_severity"].isin(injury_severity))
-        ]
-
-        print(df.shape)
-        print(filtered_data.shape)
-        print("\n\n")
-        # filtered_data = map_months_for_graphs(filtered_data)
-
-        aggregated_data = groupby_count(
-            filtered_data, "incident_year", "count"
+        selection = get_selection(
+            selected_states,
+            checkbox_values,
+            isin={
+                "victim_injury": selected_injury,
+                "site_category_cleaned": site_category,
+                "shark_common_name": selected_shark,
+                "incident_month": monthly_incidents,
+                "injury_severity": injury_severity,
+            },
+            between={"incident_year": (start_year, end_year)},
         )
 
-        if radio_value == "together":
-            line_fig = get_single_line_plot(
-                aggregated_data,
-                "incident_year",
-                "count",
-                "Incidents Over Time",
-            )
-
-        else:
-            provoked_data = filter_data_single_column_single_value(
-                filtered_data, "provoked_unprovoked", "provoked"
-            )
-            unprovoked_data = filter_data_single_column_single_value(
-                filtered_data, "provoked_unprovoked", "unprovoked"
-            )
-
-            provoked_agg = groupby_count(
-                provoked_data, "incident_year", "provoked_count"
-            )
-
-            unprovoked_agg = groupby_count(
-                unprovoked_data, "incident_year", "unprovoked_count"
-            )
-
-            line_fig = get_double_line_fig(
-                df_first_agg=provoked_agg,
-                df_second_agg=unprovoked_agg,
-                xname="incident_year",
-                y1name="provoked_count",
-                y2name="unprovoked_count",
-                g1_name="Provoked Incidents",
-                g2_name="Unprovoked Incidents",
-                title="Incidents Over Time",
-                yaxis_title="Number of Incidents",
-            )
-
-        injury_counts = get_reset_value_counts(filtered_data, "victim_injury")
-
-        if radio_value == "together":
-            bar_fig = get_bar_fig(
-                injury_counts, "victim_injury", "count", "Injury Type", None
-            )
-
-        else:
-
-            provoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "provoked"
-                ),
-                "victim_injury",
-            )
-            unprovoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "unprovoked"
-                ),
-                "victim_injury",
-            )
-
-            provoked_counts.columns = ["victim_injury", "provoked_count"]
-            unprovoked_counts.columns = ["victim_injury", "unprovoked_count"]
-
-            combined_counts = pd.merge(
-                provoked_counts,
-                unprovoked_counts,
-                on="victim_injury",
-                how="outer",
-            ).fillna(0)
-
-            bar_fig = get_double_bar_fig(
-                combined_counts,
-                xname="victim_injury",
-                y1name="provoked_count",
-                y2name="unprovoked_count",
-                g1_name="Provoked",
-                g2_name="Unprovoked",
-                title="Injury Type",
-                yaxis_title=None,
-            )
-
-        site_category_counts = get_reset_value_counts(
-            filtered_data, "site_category_cleaned"
+        return (
+            if_changed(list(selection), stored_selection),
+            if_changed(bar_click, stored_bar_click),
+            if_changed(site_category_click, stored_site_category_click),
+            if_changed(injury_severity_click, stored_injury_severity_click),
+            if_changed(monthly_click, stored_monthly_click),
+            if_changed(top_sharks_click, stored_top_sharks_click),
+            if_changed(trend_relayout, stored_line_relayout),
         )
 
-        if radio_value == "together":
-            site_category_bar_fig = get_bar_fig(
-                site_category_counts,
-                "site_category_cleaned",
-                "count",
-                "Site Category",
-                None,
-            )
-
-        else:
-            provoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "provoked"
-                ),
-                "site_category_cleaned",
-            )
-            unprovoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "unprovoked"
-                ),
-                "site_category_cleaned",
-            )
-
-            provoked_counts.columns = [
-                "site_category_cleaned",
-                "provoked_count",
-            ]
-            unprovoked_counts.columns = [
-                "site_category_cleaned",
-                "unprovoked_count",
-            ]
-
-            combined_counts = pd.merge(
-                provoked_counts,
-                unprovoked_counts,
-                on="site_category_cleaned",
-                how="outer",
-            ).fillna(0)
-
-            site_category_bar_fig = get_double_bar_fig(
-                combined_counts,
-                xname="site_category_cleaned",
-                y1name="provoked_count",
-                y2name="unprovoked_count",
-                g1_name="Provoked",
-                g2_name="Unprovoked",
-                title="Site Category",
-                yaxis_title=None,
-            )
-
-        injury_severity_counts = get_reset_value_counts(
-            filtered_data, "injury_severity"
+    if CLIENTSIDE_FILTERING:
+        app.clientside_callback(
+            ClientsideFunction("crossfilter", "update_selection"),
+            selection_outputs,
+            selection_inputs,
+            selection_states + [State("cube-data", "data")],
         )
-
-        if radio_value == "together":
-            injury_severity_bar_fig = get_bar_fig(
-                injury_severity_counts,
-                "injury_severity",
-                "count",
-                "Injury Severity",
-                None,
-            )
-
-        else:
-            provoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "provoked"
-                ),
-                "injury_severity",
-            )
-            unprovoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "unprovoked"
-                ),
-                "injury_severity",
-            )
-
-            provoked_counts.columns = ["injury_severity", "provoked_count"]
-            unprovoked_counts.columns = ["injury_severity", "unprovoked_count"]
-
-            combined_counts = pd.merge(
-                provoked_counts,
-                unprovoked_counts,
-                on="injury_severity",
-                how="outer",
-            ).fillna(0)
-
-            injury_severity_bar_fig = get_double_bar_fig(
-                combined_counts,
-                xname="injury_severity",
-                y1name="provoked_count",
-                y2name="unprovoked_count",
-                g1_name="Provoked",
-                g2_name="Unprovoked",
-                title="Injury Severity",
-                yaxis_title=None,
-            )
-
-        monthly_counts = (
-            filtered_data.groupby("incident_month")
-            .size()
-            .reset_index(name="count")
+    else:
+        app.callback(selection_outputs, selection_inputs, selection_states)(
+            metrics.timed("selection")(update_selection)
         )
-        # monthly_counts = map_months_for_graphs(monthly_counts)
 
-        if radio_value == "together":
-            # monthly_counts = map_months_for_graphs(combined_counts)
-            monthly_bar_fig = get_bar_fig(
-                monthly_counts,
-                "incident_month",
-                "count",
-                "Monthly Incidents",
-                "Number of Incidents",
-            )
-        else:
-            provoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "provoked"
-                ),
-                "incident_month",
-            )
-            unprovoked_counts = get_reset_value_counts(
-                filter_data_single_column_single_value(
-                    filtered_data, "provoked_unprovoked", "unprovoked"
-                ),
-                "incident_month",
-            )
-
-            provoked_counts.columns = ["incident_month", "provoked_count"]
-            unprovoked_counts.columns = ["incident_month", "unprovoked_count"]
-
-            combined_counts = pd.merge(
-                provoked_counts,
-                unprovoked_counts,
-                on="incident_month",
-                how="outer",
-            ).fillna(0)
-            # combined_counts = map_months_for_graphs(combined_counts)
-            monthly_bar_fig = get_double_bar_fig(
-                combined_counts,
-                xname="incident_month",
-                y1name="provoked_count",
-                y2name="unprovoked_count",
-                g1_name="Provoked",
-                g2_name="Unprovoked",
-                title="Monthly Incidents",
-                yaxis_title="Number of Incidents",
+    def add_figure_callback(graph_id):
+        if CLIENTSIDE_FILTERING:
+            app.clientside_callback(
+                f"""
+                function(selection, radioValue, cube, templates) {{
+                    return window.dash_clientside.crossfilter.update_figure(
+                        "{graph_id}", selection, radioValue, cube, templates
+                    );
+                }}
+                """,
+                Output(graph_id, "figure"),
+                [
+                    Input("filter-selection", "data"),
+                    Input("radio-together-separate", "value"),
+                ],
+                [
+                    State("cube-data", "data"),
+                    State("figure-templates", "data"),
+                ],
             )
+            return
 
-        shark_counts = (
-            filtered_data["shark_common_name"].value_counts().reset_index()
-        )
-        shark_counts.columns = ["shark_common_name", "count"]
-
-        top_7_sharks = shark_counts.head(7)
-        others = shark_counts.iloc[7:]
-        num_others = others["shark_common_name"].nunique()
-        others_count = others["count"].sum()
-        others_row = {
-            "shark_common_name": f"others: {num_others} types",
-            "count": others_count,
-        }
-        top_7_sharks = pd.concat(
-            [top_7_sharks, pd.DataFrame([others_row])], ignore_index=True
-        )
-        others_text = "<br>".join(
+        @app.callback(
             [
-                f"{row['shark_common_name']}: {row['count']} incidents"
-                for _, row in others.iterrows()
-            ]
-        )
-        # hover_text = [
-        #     (
-        #         f"{row['shark_common_name']}: {row['count']} incidents"
-        #         if row["shark_common_name"] != f"others: {num_others} types"
-        #         else others_text
-        #     )
-        #     for _, row in top_7_sharks.iterrows()
-        # ]
-        top_7_sharks.loc[
-            top_7_sharks["shark_common_name"] == f"others: {num_others} types",
-            "hover_text",
-        ] = others_text
-
-        top_7_sharks["hover_text"] = top_7_sharks["hover_text"].fillna(
-            top_7_sharks["shark_common_name"]
-            + ": "
-            + top_7_sharks["count"].astype(str)
-            + " incidents"
+                Output(graph_id, "figure"),
+                Output(f"{graph_id}-signature", "data"),
+            ],
+            [
+                Input("filter-selection", "data"),
+                Input("radio-together-separate", "value"),
+                Input("map-selection", "data"),
+            ],
+            State(f"{graph_id}-signature", "data"),
         )
-        if radio_value == "together":
-
-            top_sharks_fig = go.Figure()
-
-            top_sharks_fig.add_trace(
-                go.Bar(
-                    x=top_7_sharks["shark_common_name"],
-                    y=top_7_sharks["count"],
-                    marker=dict(color="#26a69a"),
-                )
-            )
-
-            top_sharks_fig.update_layout(
-                title="Most Dangerous Sharks",
-                legend=dict(
-                    orientation="h",
-                    x=0.5,
-                    y=1.15,
-                    xanchor="center",
-                    yanchor="top",
-                    font=dict(size=12, color="#ffd600"),
-                ),
-                font=dict(color="#ffd600", size=12),
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                # xaxis_title="Shark Type",
-                # yaxis_title="Number of Incidents",
-                xaxis=dict(showgrid=False),
-                yaxis=dict(showgrid=False),
-                showlegend=False,
-                transition={"duration": 800, "easing": "sin-in-out"},
-            )
-        else:
-            provoked_sharks = (
-                provoked_data["shark_common_name"].value_counts().reset_index()
-            )
-            unprovoked_sharks = (
-                unprovoked_data["shark_common_name"]
-                .value_counts()
-                .reset_index()
+        @metrics.timed("callback", graph_id)
+        def update_figure(
+            selection, radio_value, map_polygon, shown_signature
+        ):
+            if selection is None:
+                raise PreventUpdate
+            figure, signature = get_cached_figure(
+                graph_id, selection, radio_value, map_polygon
             )
-            provoked_sharks.columns = ["shark_common_name", "provoked_count"]
-            unprovoked_sharks.columns = [
-                "shark_common_name",
-                "unprovoked_count",
+            # Same layout and traces as what the browser shows (a filter
+            # change, not a together/separate switch): only send the data
+            if signature == shown_signature:
+                return get_figure_patch(figure), no_update
+            return figure, signature
+
+    # One callback per figure, a click only resends the figures whose
+    # inputs changed instead of all six in one response
+    for graph_id in DASHBOARD_CHARTS:
+        add_figure_callback(graph_id)
+
+    def get_map_polygon(selected_data):
+        # Lasso points, or the two corners of a box, as a lon/lat polygon.
+        # Rounded (~1m) so the same selection gives the same cache key.
+        if not selected_data:
+            return None
+        if "map" in selected_data.get("lassoPoints", {}):
+            polygon = selected_data["lassoPoints"]["map"]
+        elif "map" in selected_data.get("range", {}):
+            (west, north), (east, south) = selected_data["range"]["map"]
+            polygon = [
+                [west, north],
+                [east, north],
+                [east, south],
+                [west, south],
             ]
+        else:
+            return None
+        return [[round(lon, 5), round(lat, 5)] for lon, lat in polygon]
 
-            combined_sharks = pd.merge(
-                provoked_sharks,
-                unprovoked_sharks,
-                on="shark_common_name",
-                how="outer",
-            ).fillna(0)
-
-            combined_sharks = combined_sharks.sort_values(
-                by=["provoked_count", "unprovoked_count"], ascending=False
-            ).head(7)
-
-            combined_sharks.loc[len(combined_sharks)] = {
-                "shark_common_name": "Others",
-                "provoked_count": provoked_sharks["provoked_count"]
-                .iloc[7:]
-                .sum(),
-                "unprovoked_count": unprovoked_sharks["unprovoked_count"]
-                .iloc[7:]
-                .sum(),
-            }
+    def add_map_callbacks():
+        # Map selections cross filter the other charts on the server, the
+        # browser cube of CLIENTSIDE_FILTERING has no locations
+        if not CLIENTSIDE_FILTERING:
 
-            top_sharks_fig = go.Figure(
-                data=[
-                    go.Bar(
-                        x=combined_sharks["shark_common_name"],
-                        y=combined_sharks["provoked_count"],
-                        name="Provoked",
-                        marker_color="#26a69a",
-                    ),
-                    go.Bar(
-                        x=combined_sharks["shark_common_name"],
-                        y=combined_sharks["unprovoked_count"],
-                        name="Unprovoked",
-                        marker_color="#ab47bc",
-                    ),
-                ]
+            @app.callback(
+                Output("map-selection", "data"),
+                [
+                    Input("incident-map", "selectedData"),
+                    Input("reset-button", "n_clicks"),
+                ],
+                State("map-selection", "data"),
             )
-
-            top_sharks_fig.update_layout(
-                # barmode="stack",
-                title="Most Dangerous Sharks",
-                legend=dict(
-                    orientation="h",
-                    x=0.5,
-                    y=1.15,
-                    xanchor="center",
-                    yanchor="top",
-                    font=dict(size=12, color="#ffd600"),
+            def update_map_selection(
+                selected_data, reset_click, stored_polygon
+            ):
+                map_polygon = None
+                if ctx.triggered_id == "incident-map":
+                    map_polygon = get_map_polygon(selected_data)
+                if map_polygon == stored_polygon:
+                    raise PreventUpdate
+                return map_polygon
+
+        # The map is binned on the server in both modes: it gets counts per
+        # bin of the visible area at the current zoom, never every incident
+        @app.callback(
+            Output("incident-map", "figure"),
+            [
+                Input("filter-selection", "data"),
+                Input("incident-map", "relayoutData"),
+            ],
+        )
+        @metrics.timed("callback", "incident-map")
+        def update_map(selection, map_relayout):
+            if selection is None:
+                raise PreventUpdate
+            level, view_tiles = get_map_view(map_relayout)
+            isin, between = selection
+            key = json.dumps(
+                ["incident-map", level, view_tiles, isin, between],
+                sort_keys=True,
+            )
+            return figure_cache.get_or_compute(
+                key,
+                lambda: get_serialized_map_figure(
+                    selection, level, view_tiles
                 ),
-                font=dict(color="#ffd600", size=12),
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                # xaxis_title="Shark Type",
-                # yaxis_title="Number of Incidents",
-                xaxis=dict(showgrid=False),
-                yaxis=dict(showgrid=False),
-                transition={"duration": 800, "easing": "sin-in-out"},
             )
 
-        # selected_states,
-        # checkbox_values,
-        # radio_value,
-        # bar_click,
-        # site_category_click,
-        # injury_severity_click,
-        # monthly_click,
-        # top_sharks_click,
-        # trend_relayout,
-        # reset_click,
-        # stored_bar_click,
-        # stored_site_category_click,
-        # stored_injury_severity_click,
-        # stored_monthly_click,
-        # stored_top_sharks_click,
-        # stored_line_relayout,
-        return (
-            line_fig,
-            bar_fig,
-            site_category_bar_fig,
-            injury_severity_bar_fig,
-            monthly_bar_fig,
-            top_sharks_fig,
-            trend_relayout,
-            bar_click,
-            site_category_click,
-            injury_severity_click,
-            monthly_click,
-            top_sharks_click,
-        )
+    if has_map:
+        add_map_callbacks()
 
     # Reset callbacks
     @app.callback(
@@ -1130,13 +1213,18 @@ def main():
     def reset_app(n_clicks):
         if n_clicks:
             return (
-                df["state_names"].unique().tolist(),
-                ["provoked", "unprovoked"],
+                list(states),
+                list(SPLIT_VALUES),
                 "together",
             )
         raise PreventUpdate
 
-    app.run_server(port=8080, debug=False)
+    return app
+
+
+def main():
+    # Development server, use wsgi.py + gunicorn.conf.py to serve for real
+    create_app().run(port=8080, debug=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+// Clientside cross filtering, used when app.py runs with
+// CLIENTSIDE_FILTERING=1. Mirrors update_selection and the figure callbacks
+// of app.py on the count cube cells in the cube-data store, so clicks never
+// go back to the server. Figures reuse the layout/styling of the templates
+// the server rendered once, only x and y are computed here.
+(function () {
+    var MONTHS = [
+        'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'
+    ];
+
+    function hasPoints(click) {
+        return Boolean(click && click.points);
+    }
+
+    // Clicked bar if it is a valid value, otherwise every value
+    function getClickedValues(click, categories) {
+        if (hasPoints(click)) {
+            var value = click.points[0].x;
+            if (categories.indexOf(value) >= 0) {
+                return [value];
+            }
+        }
+        return categories.slice();
+    }
+
+    function ifChanged(value, storedValue) {
+        if (JSON.stringify(value) === JSON.stringify(storedValue)) {
+            return window.dash_clientside.no_update;
+        }
+        return value;
+    }
+
+    function getCellMask(cube, selection) {
+        var isin = selection[0];
+        var between = selection[1];
+        var mask = new Uint8Array(cube.counts.length).fill(1);
+
+        function applyFilter(dim, accepts) {
+            var accepted = cube.categories[dim].map(accepts);
+            var codes = cube.codes[dim];
+            for (var i = 0; i < codes.length; i++) {
+                if (codes[i] < 0 || !accepted[codes[i]]) {
+                    mask[i] = 0;
+                }
+            }
+        }
+
+        Object.keys(isin).forEach(function (dim) {
+            var values = new Set(isin[dim]);
+            applyFilter(dim, function (value) {
+                return values.has(value);
+            });
+        });
+        Object.keys(between).forEach(function (dim) {
+            var low = between[dim][0];
+            var high = between[dim][1];
+            applyFilter(dim, function (value) {
+                return value >= low && value <= high;
+            });
+        });
+        return mask;
+    }
+
+    // Incident count per category of dim, only the provoked_unprovoked ==
+    // splitValue cells when a split value is given
+    function getCounts(cube, mask, dim, splitValue) {
+        var counts = new Array(cube.categories[dim].length).fill(0);
+        var codes = cube.codes[dim];
+        var splitCodes = cube.codes.provoked_unprovoked;
+        var splitCode = cube.categories.provoked_unprovoked.indexOf(splitValue);
+        for (var i = 0; i < codes.length; i++) {
+            if (!mask[i] || codes[i] < 0) {
+                continue;
+            }
+            if (splitValue !== undefined && splitCodes[i] !== splitCode) {
+                continue;
+            }
+            counts[codes[i]] += cube.counts[i];
+        }
+        return counts;
+    }
+
+    // [value, count] of the categories with incidents, like get_count_frame
+    function getCountPairs(categories, counts, sort) {
+        var pairs = [];
+        categories.forEach(function (value, code) {
+            if (counts[code] > 0) {
+                pairs.push([value, counts[code]]);
+            }
+        });
+        if (sort) {
+            pairs.sort(function (a, b) {
+                return b[1] - a[1];
+            });
+        }
+        return pairs;
+    }
+
+    function getLabel(dim, value) {
+        return dim === 'incident_month' ? MONTHS[value - 1] : value;
+    }
+
+    function getTraces(spec, cube, mask, radioValue) {
+        var dim = spec.column;
+        var categories = cube.categories[dim];
+        var sort = spec.sort;
+
+        if (radioValue === 'together') {
+            var pairs = getCountPairs(
+                categories, getCounts(cube, mask, dim), sort
+            );
+            if (spec.kind === 'top') {
+                var others = pairs.slice(spec.top_n);
+                var othersCount = others.reduce(function (total, pair) {
+                    return total + pair[1];
+                }, 0);
+                pairs = pairs.slice(0, spec.top_n).concat(
+                    [['others: ' + others.length + ' types', othersCount]]
+                );
+            }
+            return [{
+                x: pairs.map(function (pair) { return getLabel(dim, pair[0]); }),
+                y: pairs.map(function (pair) { return pair[1]; })
+            }];
+        }
+
+        var provoked = getCounts(cube, mask, dim, 'provoked');
+        var unprovoked = getCounts(cube, mask, dim, 'unprovoked');
+        if (spec.kind === 'line') {
+            return [provoked, unprovoked].map(function (counts) {
+                var pairs = getCountPairs(categories, counts, false);
+                return {
+                    x: pairs.map(function (pair) { return pair[0]; }),
+                    y: pairs.map(function (pair) { return pair[1]; })
+                };
+            });
+        }
+
+        var rows = [];
+        categories.forEach(function (value, code) {
+            if (provoked[code] > 0 || unprovoked[code] > 0) {
+                rows.push([value, provoked[code], unprovoked[code]]);
+            }
+        });
+        if (spec.kind === 'top') {
+            // outer merge of both top lists (sorted by name), then by
+            // provoked and unprovoked count, the rest summed into Others
+            rows.sort(function (a, b) {
+                return a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0;
+            });
+            rows.sort(function (a, b) {
+                return b[1] - a[1] || b[2] - a[2];
+            });
+            rows = rows.slice(0, spec.top_n);
+            rows.push(['Others'].concat(
+                [provoked, unprovoked].map(function (counts) {
+                    return getCountPairs(categories, counts, true)
+                        .slice(spec.top_n)
+                        .reduce(function (total, pair) {
+                            return total + pair[1];
+                        }, 0);
+                })
+            ));
+        }
+        var x = rows.map(function (row) { return getLabel(dim, row[0]); });
+        return [1, 2].map(function (column) {
+            return {
+                x: x,
+                y: rows.map(function (row) { return row[column]; })
+            };
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        crossfilter: {
+            update_selection: function (
+                selectedStates,
+                checkboxValues,
+                barClick,
+                siteCategoryClick,
+                injurySeverityClick,
+                monthlyClick,
+                topSharksClick,
+                trendRelayout,
+                resetClick,
+                storedBarClick,
+                storedSiteCategoryClick,
+                storedInjurySeverityClick,
+                storedMonthlyClick,
+                storedTopSharksClick,
+                storedLineRelayout,
+                storedSelection,
+                cube
+            ) {
+                var categories = cube.categories;
+                var triggered = window.dash_clientside.callback_context
+                    .triggered.map(function (trigger) {
+                        return trigger.prop_id.split('.')[0];
+                    });
+                var ctxId = triggered[0];
+                var provokedValues = ['provoked', 'unprovoked'].filter(
+                    function (value) {
+                        return (checkboxValues || []).indexOf(value) >= 0;
+                    }
+                );
+                var years = categories.incident_year;
+                var startYear = years[0];
+                var endYear = years[years.length - 1];
+                var isin = {
+                    state_names: selectedStates || [],
+                    provoked_unprovoked: provokedValues
+                };
+
+                if (ctxId === 'reset-button') {
+                    return [
+                        ifChanged(
+                            [isin, {incident_year: [startYear, endYear]}],
+                            storedSelection
+                        ),
+                        null, null, null, null, null, null
+                    ];
+                }
+
+                barClick = ctxId === 'victim-injury-bar' ?
+                    barClick : storedBarClick;
+                siteCategoryClick = ctxId === 'site-category-bar' ?
+                    siteCategoryClick : storedSiteCategoryClick;
+                injurySeverityClick = ctxId === 'injury-severity-bar' ?
+                    injurySeverityClick : storedInjurySeverityClick;
+                trendRelayout = ctxId === 'incident-trend' ?
+                    trendRelayout : storedLineRelayout;
+                monthlyClick = ctxId === 'monthly-incidents-bar' ?
+                    monthlyClick : storedMonthlyClick;
+                topSharksClick = ctxId === 'top-sharks-bar' ?
+                    topSharksClick : storedTopSharksClick;
+
+                isin.victim_injury = getClickedValues(
+                    barClick, categories.victim_injury
+                );
+                isin.site_category_cleaned = getClickedValues(
+                    siteCategoryClick, categories.site_category_cleaned
+                );
+                isin.injury_severity = getClickedValues(
+                    injurySeverityClick, categories.injury_severity
+                );
+                isin.shark_common_name = getClickedValues(
+                    topSharksClick, categories.shark_common_name
+                );
+
+                isin.incident_month = categories.incident_month.slice();
+                if (hasPoints(monthlyClick)) {
+                    var month = monthlyClick.points[0].x;
+                    if (MONTHS.indexOf(month) >= 0) {
+                        month = MONTHS.indexOf(month) + 1;
+                    }
+                    // same check as str(x_value) in valid_months
+                    if (month >= 1 && month <= 12 &&
+                        String(month) === String(Math.trunc(month))) {
+                        isin.incident_month = [month];
+                    } else {
+                        monthlyClick = null;
+                    }
+                } else {
+                    monthlyClick = null;
+                }
+
+                if (trendRelayout &&
+                    'xaxis.range[0]' in trendRelayout &&
+                    'xaxis.range[1]' in trendRelayout) {
+                    var start = Math.trunc(
+                        parseFloat(trendRelayout['xaxis.range[0]'])
+                    );
+                    var end = Math.trunc(
+                        parseFloat(trendRelayout['xaxis.range[1]'])
+                    );
+                    startYear = years.indexOf(start) >= 0 ? start : startYear;
+                    endYear = years.indexOf(end) >= 0 ? end : endYear;
+                }
+
+                return [
+                    ifChanged(
+                        [isin, {incident_year: [startYear, endYear]}],
+                        storedSelection
+                    ),
+                    ifChanged(barClick, storedBarClick),
+                    ifChanged(siteCategoryClick, storedSiteCategoryClick),
+                    ifChanged(injurySeverityClick, storedInjurySeverityClick),
+                    ifChanged(monthlyClick, storedMonthlyClick),
+                    ifChanged(topSharksClick, storedTopSharksClick),
+                    ifChanged(trendRelayout, storedLineRelayout)
+                ];
+            },
+
+            update_figure: function (
+                graphId, selection, radioValue, cube, templates
+            ) {
+                if (!selection) {
+                    return window.dash_clientside.no_update;
+                }
+                var spec = templates.charts[graphId];
+                var figure = JSON.parse(
+                    JSON.stringify(spec.figures[radioValue])
+                );
+                figure.layout.template = templates.layout_template;
+                var traces = getTraces(
+                    spec, cube, getCellMask(cube, selection), radioValue
+                );
+                traces.forEach(function (trace, traceNumber) {
+                    figure.data[traceNumber].x = trace.x;
+                    figure.data[traceNumber].y = trace.y;
+                });
+                return figure;
+            }
+        }
+    });
+})();
@@ -0,0 +1,177 @@
+"""
+Latency per click of the cross filter in update_graphs:
+the old pandas mask chain vs the FilterIndex bitmaps.
+
+The shark data is resampled (with replacement) up to each size, so the
+value distributions match the real data.
+
+Usage (from the repo root):
+    python benchmarks/bench_filter_index.py
+    python benchmarks/bench_filter_index.py --sizes 1000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common_functions import (
+    filter_data_by_states,
+    filter_data_single_column_single_value,
+    get_dashboard_columns,
+    prepare_data,
+)
+from filter_index import FilterIndex
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "new_cleaned_updated_data.csv"
+)
+CATEGORICAL_FILTERS = [
+    "state_names",
+    "provoked_unprovoked",
+    "victim_injury",
+    "site_category_cleaned",
+    "shark_common_name",
+    "incident_month",
+    "injury_severity",
+]
+
+
+def scale_data(df: pd.DataFrame, n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(df), n_rows)
+    return df.iloc[rows].reset_index(drop=True)
+
+
+def get_clicks(df: pd.DataFrame) -> dict:
+    """Filter state after a few typical interactions"""
+    states = df["state_names"].unique().tolist()
+    all_values = {
+        column_name: list(df[column_name].unique())
+        for column_name in CATEGORICAL_FILTERS[2:]
+    }
+    year_range = (df["incident_year"].min(), df["incident_year"].max())
+
+    def click(**selected):
+        return {
+            "states": selected.pop("states", states),
+            "checkbox": selected.pop("checkbox", ["provoked", "unprovoked"]),
+            "values": {**all_values, **selected.pop("values", {})},
+            "years": selected.pop("years", year_range),
+        }
+
+    return {
+        "default": click(),
+        "injury click": click(values={"victim_injury": ["fatal"]}),
+        "provoked, 2 states": click(checkbox=["provoked"], states=states[:2]),
+        "month + zoom": click(
+            values={"incident_month": [1]}, years=(1950, 2000)
+        ),
+    }
+
+
+def pandas_filter(df: pd.DataFrame, click: dict) -> pd.DataFrame:
+    # The chain update_graphs used before the bitmap index
+    filtered_data = filter_data_by_states(df, click["states"])
+    checkbox_values = click["checkbox"]
+    if "provoked" in checkbox_values and "unprovoked" not in checkbox_values:
+        filtered_data = filter_data_single_column_single_value(
+            filtered_data, "provoked_unprovoked", "provoked"
+        )
+    elif "unprovoked" in checkbox_values and "provoked" not in checkbox_values:
+        filtered_data = filter_data_single_column_single_value(
+            filtered_data, "provoked_unprovoked", "unprovoked"
+        )
+    values = click["values"]
+    start_year, end_year = click["years"]
+    return filtered_data.loc[
+        (filtered_data["incident_year"] >= start_year)
+        & (filtered_data["incident_year"] <= end_year)
+        & (filtered_data["victim_injury"].isin(values["victim_injury"]))
+        & (
+            filtered_data["site_category_cleaned"].isin(
+                values["site_category_cleaned"]
+            )
+        )
+        & (
+            filtered_data["shark_common_name"].isin(
+                values["shark_common_name"]
+            )
+        )
+        & (filtered_data["incident_month"].isin(values["incident_month"]))
+        & (filtered_data["injury_severity"].isin(values["injury_severity"]))
+    ]
+
+
+def index_filter(
+    df: pd.DataFrame, filter_index: FilterIndex, click: dict
+) -> pd.DataFrame:
+    mask = filter_index.select(
+        isin={
+            "state_names": click["states"],
+            "provoked_unprovoked": click["checkbox"],
+            **click["values"],
+        },
+        between={"incident_year": click["years"]},
+    )
+    return df[mask]
+
+
+def time_call(function, *args, repeat: int = 5) -> float:
+    """Median wall time in ms"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 100_000, 10_000_000],
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base_df = prepare_data(DATA_PATH, columns=get_dashboard_columns())
+
+    print(
+        f"{'rows':>10} {'click':<20} {'pandas ms':>10} {'bitmap ms':>10}"
+        f" {'speedup':>8}"
+    )
+    for n_rows in args.sizes:
+        df = scale_data(base_df, n_rows)
+
+        start = time.perf_counter()
+        filter_index = FilterIndex.from_frame(
+            df, CATEGORICAL_FILTERS, range_columns=["incident_year"]
+        )
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for name, click in get_clicks(df).items():
+            expected = pandas_filter(df, click)
+            assert len(index_filter(df, filter_index, click)) == len(expected)
+
+            pandas_ms = time_call(pandas_filter, df, click, repeat=args.repeat)
+            bitmap_ms = time_call(
+                index_filter, df, filter_index, click, repeat=args.repeat
+            )
+            print(
+                f"{n_rows:>10} {name:<20} {pandas_ms:>10.2f}"
+                f" {bitmap_ms:>10.2f} {pandas_ms / bitmap_ms:>7.1f}x"
+            )
+        print(f"{n_rows:>10} {'(index build)':<20} {'':>10} {build_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
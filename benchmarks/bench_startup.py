@@ -0,0 +1,183 @@
+"""
+Cold start time of the dash app and of graph_functions (streamlit app).
+
+Every run is a fresh python process, like a new container or worker:
+interpreter start, `import app`, create_app() and the first figure
+callback. One warm up run first builds the data caches (columnar store),
+so the timings are for a deploy where those already exist.
+
+--importtime prints the slowest imports of `import app` from
+python -X importtime (cumulative, including what they import).
+Results can be saved and compared like run_benchmarks.py.
+
+Usage (from the repo root):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --importtime
+    python benchmarks/bench_startup.py --save startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import compare
+
+# Runs in the child process, prints the timings of each phase as json
+APP_STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+dash_app = app.create_app()
+created = time.perf_counter()
+response = dash_app.server.test_client().post(
+    "/_dash-update-component", json=json.loads({payload!r})
+)
+assert response.status_code == 200, response.status_code
+first_figure = time.perf_counter()
+print(json.dumps({{
+    "import_app": imported - start,
+    "create_app": created - imported,
+    "first_figure": first_figure - created,
+}}))
+"""
+GRAPH_FUNCTIONS_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import graph_functions
+print(json.dumps({"import_graph_functions": time.perf_counter() - start}))
+"""
+
+
+def get_first_figure_payload() -> str:
+    from load_test import get_payload
+
+    # Selection of the untouched dashboard (everything selected)
+    return json.dumps(get_payload("incident-trend", [{}, {}], "together"))
+
+
+def run_child(script: str, total_name: str) -> dict:
+    """Timings printed by the script, plus its process wall time"""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings[total_name] = time.perf_counter() - start
+    return timings
+
+
+def run(repeat: int) -> dict:
+    scripts = [
+        (
+            APP_STARTUP_SCRIPT.format(payload=get_first_figure_payload()),
+            "app_process",
+        ),
+        (GRAPH_FUNCTIONS_SCRIPT, "graph_functions_process"),
+    ]
+    timings = {}
+    for script, total_name in scripts:
+        run_child(script, total_name)
+        for _ in range(repeat):
+            for name, seconds in run_child(script, total_name).items():
+                timings.setdefault(f"startup.{name}", []).append(seconds)
+
+    results = {}
+    for name, seconds in timings.items():
+        results[name] = {
+            "median_s": float(np.median(seconds)),
+            "min_s": float(np.min(seconds)),
+        }
+        print(
+            f"{name:<40} {results[name]['median_s'] * 1000:>10.1f}"
+            f" {results[name]['min_s'] * 1000:>10.1f}",
+            flush=True,
+        )
+    return results
+
+
+def print_slowest_imports(module: str, top: int) -> None:
+    """Slowest imports by cumulative time, from python -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header line
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    print(f"\nslowest imports of {module}")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--importtime", action="store_true", help="print slowest imports"
+    )
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--save", help="write the results to this json")
+    parser.add_argument("--compare", help="baseline json to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown vs the baseline, 0.2 = 20%%",
+    )
+    args = parser.parse_args()
+
+    print(f"{'phase':<40} {'median ms':>10} {'min ms':>10}")
+    results = run(args.repeat)
+
+    if args.importtime:
+        print_slowest_imports("app", args.top)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "machine": {
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "processor": platform.processor(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print(f"\n{'phase':<60} {'vs baseline':>9}")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Throughput of the dashboard under gunicorn for different worker counts.
+
+Starts `gunicorn -c gunicorn.conf.py wsgi:server` once per worker count and
+hammers the figure callbacks with concurrent requests for random filter
+selections (so most of them miss the figure cache), then prints requests
+per second, latency and the memory of a worker (proportional set size,
+shared pages split between the processes that map them, Linux only).
+
+Needs gunicorn (pip install gunicorn). Scaling stops at the number of cores.
+
+Usage (from the repo root):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workers 1 2 4 8 --duration 20
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+from common_functions import (
+    DASHBOARD_CHARTS,
+    get_dashboard_columns,
+    prepare_data,
+)
+
+DATA_PATH = os.path.join(REPO_DIR, "data", "new_cleaned_updated_data.csv")
+
+
+def get_payload(
+    graph_id: str,
+    selection: list,
+    radio_value: str,
+    signature: str = None,
+    map_polygon: list = None,
+) -> dict:
+    # Request body the browser sends for a figure callback
+    return {
+        "output": f"..{graph_id}.figure...{graph_id}-signature.data..",
+        "outputs": [
+            {"id": graph_id, "property": "figure"},
+            {"id": f"{graph_id}-signature", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "filter-selection", "property": "data", "value": selection},
+            {
+                "id": "radio-together-separate",
+                "property": "value",
+                "value": radio_value,
+            },
+            {"id": "map-selection", "property": "data", "value": map_polygon},
+        ],
+        "state": [
+            {
+                "id": f"{graph_id}-signature",
+                "property": "data",
+                "value": signature,
+            }
+        ],
+        "changedPropIds": ["filter-selection.data"],
+    }
+
+
+def get_payloads(n_payloads: int, seed: int = 0) -> list:
+    """Figure callback bodies for random states/provoked/year selections"""
+    rng = random.Random(seed)
+    df = prepare_data(DATA_PATH, columns=get_dashboard_columns())
+    states = sorted(df["state_names"].dropna().unique().tolist())
+    years = sorted(df["incident_year"].dropna().unique().tolist())
+    payloads = []
+    for _ in range(n_payloads):
+        start_year, end_year = sorted(rng.sample(years, 2))
+        selection = [
+            {
+                "state_names": sorted(
+                    rng.sample(states, rng.randint(1, len(states)))
+                ),
+                "provoked_unprovoked": rng.choice(
+                    [["provoked"], ["unprovoked"], ["provoked", "unprovoked"]]
+                ),
+            },
+            {"incident_year": [start_year, end_year]},
+        ]
+        payloads.append(
+            json.dumps(
+                get_payload(
+                    rng.choice(list(DASHBOARD_CHARTS)),
+                    selection,
+                    rng.choice(["together", "separate"]),
+                )
+            ).encode()
+        )
+    return payloads
+
+
+def start_server(n_workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(n_workers), PORT=str(port))
+    server = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "wsgi:server"],
+        cwd=REPO_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/_dash-layout"
+    for _ in range(600):
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited, is it installed?")
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def get_worker_memory(server_pid: int) -> float:
+    """Mean PSS of the gunicorn workers in MB, nan if /proc is missing"""
+    children_path = f"/proc/{server_pid}/task/{server_pid}/children"
+    if not os.path.exists(children_path):
+        return float("nan")
+    with open(children_path) as f:
+        worker_pids = f.read().split()
+    pss_mb = []
+    for worker_pid in worker_pids:
+        with open(f"/proc/{worker_pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss_mb.append(int(line.split()[1]) / 1024)
+    return float(np.mean(pss_mb)) if pss_mb else float("nan")
+
+
+def run_load(
+    url: str, payloads: list, concurrency: int, duration: float
+) -> list:
+    """Latency (s) of every successful request, concurrency clients"""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client(client_number):
+        n_requests = 0
+        while time.perf_counter() < deadline:
+            body = payloads[(client_number + n_requests) % len(payloads)]
+            n_requests += concurrency
+            request = urllib.request.Request(
+                url, data=body, headers={"Content-Type": "application/json"}
+            )
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout=30).read()
+            except (urllib.error.URLError, ConnectionError) as error:
+                errors.append(error)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    clients = [
+        threading.Thread(target=client, args=(client_number,))
+        for client_number in range(concurrency)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    if errors:
+        print(f"  {len(errors)} failed requests, e.g. {errors[0]}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    payloads = get_payloads(2000)
+    url = f"http://127.0.0.1:{args.port}/_dash-update-component"
+
+    print(
+        f"{'workers':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8}"
+        f" {'p95 ms':>8} {'worker MB':>10}"
+    )
+    for n_workers in args.workers:
+        server = start_server(n_workers, args.port)
+        try:
+            # warm up: imports, first callbacks
+            run_load(url, payloads, args.concurrency, 1.0)
+            latencies = run_load(
+                url, payloads, args.concurrency, args.duration
+            )
+            worker_mb = get_worker_memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        latencies_ms = np.array(latencies) * 1000
+        print(
+            f"{n_workers:>8} {len(latencies):>9}"
+            f" {len(latencies) / args.duration:>8.1f}"
+            f" {np.percentile(latencies_ms, 50):>8.1f}"
+            f" {np.percentile(latencies_ms, 95):>8.1f}"
+            f" {worker_mb:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
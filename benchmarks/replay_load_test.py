@@ -0,0 +1,407 @@
+"""
+End to end load test replaying dashboard sessions against
+/_dash-update-component.
+
+Every virtual user behaves like a browser tab: it loads the page (selection
+plus all six figure callbacks), then replays a session of interactions
+(state dropdown changes, provoked checkbox toggles, bar clicks, year range
+zooms on the trend line, together/separate switches, resets). Each
+interaction sends the selection callback with the stores the tab holds,
+then the figure callbacks with the signatures of the figures it shows, so
+the server sees the same requests (and Patch responses) as with real users.
+
+Sessions are random by default. --save-sessions writes them to json, and
+--sessions replays a json file of sessions, saved or written by hand
+(a list of sessions, each a list of steps, see get_sessions).
+
+Reports requests per second and p50/p95/p99 latency of the selection and
+figure requests and of whole interactions.
+
+Usage (from the repo root):
+    python benchmarks/replay_load_test.py --workers 4 --concurrency 16
+    python benchmarks/replay_load_test.py --save-sessions sessions.json
+    python benchmarks/replay_load_test.py --sessions sessions.json
+    python benchmarks/replay_load_test.py --url http://127.0.0.1:8080
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common_functions import (
+    DASHBOARD_CHARTS,
+    get_dashboard_columns,
+    prepare_data,
+)
+from load_test import DATA_PATH, get_payload, start_server
+
+# Bar chart -> store that keeps its last click
+CLICK_STORES = {
+    "victim-injury-bar": "stored-bar-click",
+    "site-category-bar": "stored-site-category-click",
+    "injury-severity-bar": "stored-injury-severity-click",
+    "monthly-incidents-bar": "stored-monthly-click",
+    "top-sharks-bar": "stored-top-sharks-click",
+}
+SELECTION_STORES = ["filter-selection"] + list(CLICK_STORES.values())
+SELECTION_STORES.append("stored-line-relayout")
+PROVOKED_VALUES = ["provoked", "unprovoked"]
+# Relative frequency of each kind of step in random sessions
+STEP_WEIGHTS = {
+    "click": 45,
+    "states": 15,
+    "relayout": 15,
+    "checkbox": 10,
+    "reset": 10,
+    "radio": 5,
+}
+
+
+def get_sessions(
+    df: pd.DataFrame, n_sessions: int, n_steps: int, seed: int = 0
+) -> list:
+    """
+    Random sessions over the values in the data
+
+    Args:
+        df (pd.DataFrame): dashboard data, see prepare_data
+        n_sessions (int): number of sessions
+        n_steps (int): interactions per session
+        seed (int): random seed. Defaults to 0.
+
+    Returns:
+        list: sessions, each a list of steps like
+            {"action": "states", "value": [...]},
+            {"action": "checkbox", "value": ["provoked"]},
+            {"action": "click", "graph": "top-sharks-bar", "x": "White"},
+            {"action": "relayout", "range": [1950.2, 2001.7]},
+            {"action": "radio", "value": "separate"},
+            {"action": "reset"}
+    """
+    rng = random.Random(seed)
+    states = sorted(df["state_names"].dropna().unique().tolist())
+    first_year = int(df["incident_year"].min())
+    last_year = int(df["incident_year"].max())
+    click_values = {
+        graph_id: sorted(
+            df[DASHBOARD_CHARTS[graph_id][0]].dropna().unique().tolist()
+        )
+        for graph_id in CLICK_STORES
+    }
+
+    def get_step():
+        action = rng.choices(
+            list(STEP_WEIGHTS), weights=list(STEP_WEIGHTS.values())
+        )[0]
+        if action == "click":
+            graph_id = rng.choice(list(CLICK_STORES))
+            return {
+                "action": action,
+                "graph": graph_id,
+                "x": rng.choice(click_values[graph_id]),
+            }
+        if action == "states":
+            return {
+                "action": action,
+                "value": rng.sample(states, rng.randint(1, len(states))),
+            }
+        if action == "relayout":
+            # plotly sends the zoomed range as floats
+            return {
+                "action": action,
+                "range": sorted(
+                    round(rng.uniform(first_year, last_year), 1)
+                    for _ in range(2)
+                ),
+            }
+        if action == "checkbox":
+            return {
+                "action": action,
+                "value": rng.sample(PROVOKED_VALUES, rng.randint(1, 2)),
+            }
+        if action == "radio":
+            return {
+                "action": action,
+                "value": rng.choice(["together", "separate"]),
+            }
+        return {"action": action}
+
+    return [[get_step() for _ in range(n_steps)] for _ in range(n_sessions)]
+
+
+class DashboardSession:
+    """What one browser tab holds: component values, stores, signatures"""
+
+    def __init__(self, url: str, states: list):
+        """
+        Args:
+            url (str): server root, e.g. http://127.0.0.1:8080
+            states (list): all states, the dropdown starts with all of them
+        """
+        self.url = url + "/_dash-update-component"
+        self.states = list(states)
+        self.checkbox = list(PROVOKED_VALUES)
+        self.radio = "together"
+        self.click_data = {graph_id: None for graph_id in CLICK_STORES}
+        self.relayout = None
+        self.reset_clicks = None
+        self.stores = {store_id: None for store_id in SELECTION_STORES}
+        self.signatures = {graph_id: None for graph_id in DASHBOARD_CHARTS}
+        # (kind, seconds) of every request
+        self.timings = []
+        self.errors = []
+
+    def post(self, kind: str, payload: dict) -> dict:
+        """Send one callback request, the response outputs ({} if none)"""
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = response.read()
+        except (urllib.error.URLError, ConnectionError) as error:
+            self.errors.append(error)
+            return {}
+        self.timings.append((kind, time.perf_counter() - start))
+        # 204: the callback prevented the update
+        return json.loads(body)["response"] if body else {}
+
+    def get_selection_payload(self, changed_prop_id: str) -> dict:
+        inputs = [
+            ("dropdown-states", "value", self.states),
+            ("checkbox-items", "value", self.checkbox),
+        ]
+        inputs += [
+            (graph_id, "clickData", click)
+            for graph_id, click in self.click_data.items()
+        ]
+        inputs += [
+            ("incident-trend", "relayoutData", self.relayout),
+            ("reset-button", "n_clicks", self.reset_clicks),
+        ]
+        # stores first, the selection last (same order as the app)
+        state = [
+            (store_id, "data", self.stores[store_id])
+            for store_id in SELECTION_STORES[1:] + SELECTION_STORES[:1]
+        ]
+        return {
+            "output": "..%s.."
+            % "...".join(f"{store_id}.data" for store_id in SELECTION_STORES),
+            "outputs": [
+                {"id": store_id, "property": "data"}
+                for store_id in SELECTION_STORES
+            ],
+            "inputs": [
+                {"id": id_, "property": prop, "value": value}
+                for id_, prop, value in inputs
+            ],
+            "state": [
+                {"id": id_, "property": prop, "value": value}
+                for id_, prop, value in state
+            ],
+            "changedPropIds": [changed_prop_id] if changed_prop_id else [],
+        }
+
+    def update_selection(self, changed_prop_id: str) -> bool:
+        """Selection callback, True if the selection changed"""
+        response = self.post(
+            "selection", self.get_selection_payload(changed_prop_id)
+        )
+        for store_id, outputs in response.items():
+            self.stores[store_id] = outputs["data"]
+        return "filter-selection" in response
+
+    def update_figures(self) -> None:
+        for graph_id in DASHBOARD_CHARTS:
+            response = self.post(
+                "figure",
+                get_payload(
+                    graph_id,
+                    self.stores["filter-selection"],
+                    self.radio,
+                    self.signatures[graph_id],
+                ),
+            )
+            signature_id = f"{graph_id}-signature"
+            if signature_id in response:
+                self.signatures[graph_id] = response[signature_id]["data"]
+
+    def load(self) -> None:
+        """Initial page load, every callback fires once"""
+        self.update_selection(None)
+        self.update_figures()
+
+    def apply(self, step: dict) -> None:
+        """One interaction, see get_sessions for the steps"""
+        action = step["action"]
+        if action == "radio":
+            self.radio = step["value"]
+            self.update_figures()
+            return
+        if action == "states":
+            self.states = step["value"]
+            changed_prop_id = "dropdown-states.value"
+        elif action == "checkbox":
+            self.checkbox = step["value"]
+            changed_prop_id = "checkbox-items.value"
+        elif action == "click":
+            self.click_data[step["graph"]] = {
+                "points": [{"curveNumber": 0, "x": step["x"]}]
+            }
+            changed_prop_id = f"{step['graph']}.clickData"
+        elif action == "relayout":
+            self.relayout = {
+                "xaxis.range[0]": step["range"][0],
+                "xaxis.range[1]": step["range"][1],
+            }
+            changed_prop_id = "incident-trend.relayoutData"
+        elif action == "reset":
+            self.reset_clicks = (self.reset_clicks or 0) + 1
+            changed_prop_id = "reset-button.n_clicks"
+        else:
+            raise ValueError(f"Unknown action {action}")
+        if self.update_selection(changed_prop_id):
+            self.update_figures()
+
+
+def run_replay(
+    url: str,
+    sessions: list,
+    states: list,
+    concurrency: int,
+    duration: float,
+) -> tuple:
+    """
+    Virtual users replaying the sessions round robin until the duration
+    is up
+
+    Returns:
+        tuple: (kind, seconds) per request, seconds per interaction,
+            failed requests
+    """
+    timings, interactions, errors = [], [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(user_number):
+        n_sessions = 0
+        while time.perf_counter() < deadline:
+            session = DashboardSession(url, states)
+            session.load()
+            steps = sessions[
+                (user_number + n_sessions * concurrency) % len(sessions)
+            ]
+            n_sessions += 1
+            user_interactions = []
+            for step in steps:
+                if time.perf_counter() >= deadline:
+                    break
+                start = time.perf_counter()
+                session.apply(step)
+                user_interactions.append(time.perf_counter() - start)
+            with lock:
+                timings.extend(session.timings)
+                interactions.extend(user_interactions)
+                errors.extend(session.errors)
+
+    users = [
+        threading.Thread(target=user, args=(user_number,))
+        for user_number in range(concurrency)
+    ]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    return timings, interactions, errors
+
+
+def print_report(
+    timings: list, interactions: list, errors: list, duration: float
+) -> None:
+    print(
+        f"{'':<12} {'count':>8} {'per s':>8} {'p50 ms':>8}"
+        f" {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    rows = {
+        kind: [
+            seconds for timing_kind, seconds in timings if timing_kind == kind
+        ]
+        for kind in ["selection", "figure"]
+    }
+    rows["all requests"] = [seconds for _, seconds in timings]
+    rows["interaction"] = interactions
+    for name, seconds in rows.items():
+        if not seconds:
+            continue
+        milliseconds = np.array(seconds) * 1000
+        p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+        print(
+            f"{name:<12} {len(seconds):>8} {len(seconds) / duration:>8.1f}"
+            f" {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}"
+        )
+    if errors:
+        print(f"{len(errors)} failed requests, e.g. {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument(
+        "--url", help="running server to test, else gunicorn is started"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--sessions", help="json file of sessions to replay")
+    parser.add_argument("--save-sessions", help="write the sessions here")
+    parser.add_argument("--n-sessions", type=int, default=200)
+    parser.add_argument("--n-steps", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = prepare_data(DATA_PATH, columns=get_dashboard_columns())
+    # dropdown starts with every state, in order of appearance
+    states = df["state_names"].dropna().unique().tolist()
+    if args.sessions:
+        with open(args.sessions) as f:
+            sessions = json.load(f)
+    else:
+        sessions = get_sessions(df, args.n_sessions, args.n_steps, args.seed)
+    if args.save_sessions:
+        with open(args.save_sessions, "w") as f:
+            json.dump(sessions, f, indent=1)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.workers, args.port)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        # warm up: imports, first callbacks
+        run_replay(url, sessions, states, args.concurrency, 1.0)
+        timings, interactions, errors = run_replay(
+            url, sessions, states, args.concurrency, args.duration
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print_report(timings, interactions, errors, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Benchmarks of the common_functions and graph_functions hot paths.
+
+Every case runs on the shark data resampled (with replacement) up to each
+size, so the value distributions match the real data. Timings are the
+median/min wall time over --repeat runs after one warm up run.
+
+Results can be saved as a JSON baseline and later runs compared against
+it, the script exits with 1 if any case got slower than the tolerance.
+
+Usage (from the repo root):
+    python benchmarks/run_benchmarks.py --sizes 1000 100000
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --filter graph_functions
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import common_functions as cf
+import graph_functions as gf
+from bench_filter_index import scale_data
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+# The dash app data (typed, see prepare_data) and the streamlit app data
+DASH_DATA_PATH = os.path.join(DATA_DIR, "new_cleaned_updated_data.csv")
+STREAMLIT_DATA_PATH = os.path.join(DATA_DIR, "filtered_cleaned_shark_data.csv")
+STREAMLIT_COLUMNS = [
+    "incident_year",
+    "incident_month",
+    "injury_severity",
+    "site_category_cleaned",
+    "state_names",
+    "victim_injury",
+    "provoked_unprovoked",
+    "victim_activity",
+    "shark_common_name",
+]
+
+
+def get_common_cases(df: pd.DataFrame) -> dict:
+    """name -> no argument callable, for the dash app df"""
+    states = df["state_names"].unique().tolist()[:3]
+    year_counts = cf.groupby_count(df, "incident_year", "count")
+    provoked = cf.groupby_count(
+        df[df["provoked_unprovoked"] == "provoked"], "incident_year", "p"
+    )
+    unprovoked = cf.groupby_count(
+        df[df["provoked_unprovoked"] == "unprovoked"], "incident_year", "u"
+    )
+    shark_counts = cf.get_reset_value_counts(df, "shark_common_name")
+    injury_counts = cf.get_reset_value_counts(df, "victim_injury")
+    split_counts = cf.get_split_count_frame(
+        cf.get_marginal_counts(
+            df, ["victim_injury"], split_column="provoked_unprovoked"
+        )["victim_injury"]
+    )
+    return {
+        "filter_data_by_states": lambda: cf.filter_data_by_states(df, states),
+        "groupby_count": lambda: cf.groupby_count(
+            df, "incident_year", "count"
+        ),
+        "get_reset_value_counts": lambda: cf.get_reset_value_counts(
+            df, "shark_common_name"
+        ),
+        "get_marginal_counts": lambda: cf.get_marginal_counts(
+            df,
+            cf.get_dashboard_columns()[2:],
+            split_column="provoked_unprovoked",
+        ),
+        "prepare_top_n_data": lambda: cf.prepare_top_n_data(
+            shark_counts.copy(), "shark_common_name", 7
+        ),
+        "get_single_line_plot": lambda: cf.get_single_line_plot(
+            year_counts, "incident_year", "count", "Incidents Over Time"
+        ),
+        "get_double_line_fig": lambda: cf.get_double_line_fig(
+            provoked,
+            unprovoked,
+            "incident_year",
+            "p",
+            "u",
+            "Provoked",
+            "Unprovoked",
+            "Incidents Over Time",
+            "Number of Incidents",
+        ),
+        "get_bar_fig": lambda: cf.get_bar_fig(
+            injury_counts, "victim_injury", "count", "Injury Type"
+        ),
+        "get_double_bar_fig": lambda: cf.get_double_bar_fig(
+            split_counts,
+            "victim_injury",
+            "provoked_count",
+            "unprovoked_count",
+            "Provoked",
+            "Unprovoked",
+            "Injury Type",
+        ),
+        "get_pie_chart": lambda: cf.get_pie_chart(
+            injury_counts, "victim_injury", "count", "Injury Type"
+        ),
+    }
+
+
+def get_graph_cases(df: pd.DataFrame) -> dict:
+    """name -> no argument callable, for the streamlit app df"""
+    return {
+        "get_incidents_over_time": lambda: gf.get_incidents_over_time(df),
+        "get_incidents_over_time_by_injury": lambda: (
+            gf.get_incidents_over_time_by_injury(df)
+        ),
+        "get_incidents_over_time_by_provoked": lambda: (
+            gf.get_incidents_over_time_by_provoked(df)
+        ),
+        "create_top_sharks_chart": lambda: gf.create_top_sharks_chart(df),
+        "create_incident_by_shark_chart": lambda: (
+            gf.create_incident_by_shark_chart(df)
+        ),
+        "compare_victim_activity_vs_provoked": lambda: (
+            gf.compare_victim_activity_vs_provoked(df)
+        ),
+        "create_attack_severity_chart": lambda: (
+            gf.create_attack_severity_chart(df)
+        ),
+    }
+
+
+def time_case(function, repeat: int) -> dict:
+    """Median and min wall time in seconds, stdout muted (some print)"""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return {
+        "median_s": float(np.median(timings)),
+        "min_s": float(np.min(timings)),
+    }
+
+
+def run(sizes: list, repeat: int, name_filter: str = None) -> dict:
+    dash_df = cf.prepare_data(DASH_DATA_PATH)
+    streamlit_df = pd.read_csv(STREAMLIT_DATA_PATH, usecols=STREAMLIT_COLUMNS)
+
+    results = {}
+    for n_rows in sizes:
+        cases = {
+            f"common_functions.{name}": case
+            for name, case in get_common_cases(
+                scale_data(dash_df, n_rows)
+            ).items()
+        }
+        cases.update(
+            {
+                f"graph_functions.{name}": case
+                for name, case in get_graph_cases(
+                    scale_data(streamlit_df, n_rows)
+                ).items()
+            }
+        )
+        for name, case in cases.items():
+            if name_filter and name_filter not in name:
+                continue
+            key = f"{name}[{n_rows}]"
+            results[key] = time_case(case, repeat)
+            print(
+                f"{key:<60} {results[key]['median_s'] * 1000:>10.2f}"
+                f" {results[key]['min_s'] * 1000:>10.2f}",
+                flush=True,
+            )
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Cases whose median got slower than baseline * (1 + tolerance)"""
+    regressions = []
+    for key, timing in results.items():
+        if key not in baseline:
+            continue
+        ratio = timing["median_s"] / baseline[key]["median_s"]
+        marker = ""
+        if ratio > 1 + tolerance:
+            marker = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:<60} {ratio:>8.2f}x{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 100_000, 1_000_000, 10_000_000],
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="only cases containing this")
+    parser.add_argument("--save", help="write the results to this json")
+    parser.add_argument("--compare", help="baseline json to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown vs the baseline, 0.2 = 20%%",
+    )
+    args = parser.parse_args()
+
+    print(f"{'case':<60} {'median ms':>10} {'min ms':>10}")
+    results = run(args.sizes, args.repeat, args.filter)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "machine": {
+                        "python": platform.python_version(),
+                        "pandas": pd.__version__,
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                        "processor": platform.processor(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print(f"\n{'case':<60} {'vs baseline':>9}")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Synthetic shark incident data with the schema and distributions of the
+dashboard data, at any size, for the benchmarks and load tests.
+
+The model is learned from data/new_cleaned_updated_data.csv: every column
+is drawn from its distribution conditioned on a few parent columns
+(MODEL_COLUMNS), e.g. the shark given the state and provoked, the injury
+given the shark, the severity given the injury. So the marginals of every
+column and the pairs the dashboard cross filters on follow the real data.
+Coordinates are real incident locations of the sampled state, jittered.
+
+Rows are generated and written chunk by chunk (csv, or parquet with
+pyarrow), so memory stays at one chunk whatever the size.
+
+Usage (from the repo root):
+    python benchmarks/synthetic_data.py --rows 10000000 --out big.csv
+    python benchmarks/synthetic_data.py --rows 1000000 --out big.parquet
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+DATA_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "new_cleaned_updated_data.csv"
+)
+# column -> parent columns it is conditioned on, in sampling order
+# (parents always come before their children)
+MODEL_COLUMNS = {
+    "state_names": [],
+    "incident_year": ["state_names"],
+    "incident_month": ["state_names"],
+    "provoked_unprovoked": ["state_names"],
+    "site_category_cleaned": ["state_names"],
+    "shark_common_name": ["state_names", "provoked_unprovoked"],
+    "victim_activity": ["site_category_cleaned", "provoked_unprovoked"],
+    "victim_gender": ["victim_activity"],
+    "victim_injury": ["shark_common_name", "provoked_unprovoked"],
+    "injury_severity": ["victim_injury"],
+}
+# standard deviation (degrees) of the noise added to real coordinates
+COORDINATE_JITTER = 0.05
+
+
+def parse_coordinate(series: pd.Series) -> pd.Series:
+    """
+    Numeric latitude/longitude, the csv has a few values with stray
+    non breaking spaces or a trailing dot
+
+    Args:
+        series (pd.Series): raw latitude or longitude column
+
+    Returns:
+        pd.Series: float column, NaN where there is no number
+    """
+    return pd.to_numeric(
+        series.astype(str).str.extract(r"(-?\d+(?:\.\d+)?)")[0],
+        errors="coerce",
+    )
+
+
+def get_parent_keys(
+    codes: Dict[str, np.ndarray],
+    parents: List[str],
+    sizes: Dict[str, int],
+    n_rows: int,
+) -> np.ndarray:
+    """One int64 per row for the combination of the parent codes"""
+    keys = np.zeros(n_rows, dtype=np.int64)
+    for parent in parents:
+        keys = keys * sizes[parent] + codes[parent]
+    return keys
+
+
+class SyntheticIncidentModel:
+    """
+    Conditional distributions of the MODEL_COLUMNS (missing values
+    included, as their own code) plus the real coordinates per state
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Args:
+            df (pd.DataFrame): raw incident data, see from_csv
+        """
+        # missing values get the last code, one past the real values
+        self.values = {}
+        codes = {}
+        for column_name in MODEL_COLUMNS:
+            column_codes, values = pd.factorize(df[column_name], sort=True)
+            column_codes[column_codes == -1] = len(values)
+            codes[column_name], self.values[column_name] = column_codes, values
+        self.sizes = {
+            column_name: len(values) + 1
+            for column_name, values in self.values.items()
+        }
+
+        # column -> (observed parent keys sorted, cdf per key + one last
+        # row with the marginal cdf for keys that were never observed)
+        self.tables = {}
+        for column_name, parents in MODEL_COLUMNS.items():
+            keys, key_numbers = np.unique(
+                get_parent_keys(codes, parents, self.sizes, len(df)),
+                return_inverse=True,
+            )
+            counts = np.zeros((len(keys) + 1, self.sizes[column_name]))
+            np.add.at(counts, (key_numbers, codes[column_name]), 1)
+            counts[-1] = counts[:-1].sum(axis=0)
+            cdf = np.cumsum(counts, axis=1)
+            self.tables[column_name] = (keys, cdf / cdf[:, -1:])
+
+        # coordinates grouped by state: pairs sorted by state code, plus
+        # start offset / number of pairs / share of rows without a pair
+        latitude = parse_coordinate(df["latitude"]).to_numpy()
+        longitude = parse_coordinate(df["longitude"]).to_numpy()
+        state_codes = codes["state_names"]
+        has_location = ~(np.isnan(latitude) | np.isnan(longitude))
+        order = np.argsort(state_codes[has_location], kind="stable")
+        self.locations = np.column_stack(
+            [latitude[has_location][order], longitude[has_location][order]]
+        )
+        n_states = self.sizes["state_names"]
+        self.location_counts = np.bincount(
+            state_codes[has_location], minlength=n_states
+        )
+        self.location_starts = np.concatenate(
+            [[0], np.cumsum(self.location_counts)[:-1]]
+        )
+        self.missing_location_share = 1 - self.location_counts / np.maximum(
+            np.bincount(state_codes, minlength=n_states), 1
+        )
+
+    @classmethod
+    def from_csv(cls, path: str = DATA_PATH) -> "SyntheticIncidentModel":
+        """Learn the model from an incident csv"""
+        return cls(
+            pd.read_csv(
+                path, usecols=list(MODEL_COLUMNS) + ["latitude", "longitude"]
+            )
+        )
+
+    def sample_codes(
+        self,
+        column_name: str,
+        codes: Dict[str, np.ndarray],
+        n_rows: int,
+        rng,
+    ) -> np.ndarray:
+        """Draw one column given the already drawn parent codes"""
+        keys, cdf = self.tables[column_name]
+        parent_keys = get_parent_keys(
+            codes, MODEL_COLUMNS[column_name], self.sizes, n_rows
+        )
+        key_numbers = np.searchsorted(keys, parent_keys)
+        key_numbers[key_numbers == len(keys)] = 0
+        key_numbers[keys[key_numbers] != parent_keys] = len(keys)
+
+        # inverse cdf per group of rows with the same parents
+        uniform = rng.random(len(parent_keys))
+        sampled = np.empty(len(parent_keys), dtype=np.int64)
+        order = np.argsort(key_numbers, kind="stable")
+        group_keys, group_starts = np.unique(
+            key_numbers[order], return_index=True
+        )
+        group_ends = np.append(group_starts[1:], len(order))
+        for key_number, start, end in zip(
+            group_keys, group_starts, group_ends
+        ):
+            rows = order[start:end]
+            sampled[rows] = np.searchsorted(
+                cdf[key_number], uniform[rows], side="right"
+            )
+        return np.minimum(sampled, self.sizes[column_name] - 1)
+
+    def sample_locations(
+        self, state_codes: np.ndarray, rng
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitude and longitude per row, a jittered real incident location
+        of the same state, NaN as often as in the real data"""
+        counts = self.location_counts[state_codes]
+        picks = self.location_starts[state_codes] + (
+            rng.random(len(state_codes)) * counts
+        ).astype(np.int64)
+        locations = self.locations[np.minimum(picks, len(self.locations) - 1)]
+        locations = locations + rng.normal(
+            0, COORDINATE_JITTER, size=locations.shape
+        )
+        missing = (counts == 0) | (
+            rng.random(len(state_codes))
+            < self.missing_location_share[state_codes]
+        )
+        locations[missing] = np.nan
+        return locations[:, 0].round(6), locations[:, 1].round(6)
+
+    def sample(self, n_rows: int, rng=None) -> pd.DataFrame:
+        """
+        Generate rows with the dashboard schema
+
+        Args:
+            n_rows (int): number of rows
+            rng (np.random.Generator, optional): random generator.
+                Defaults to a fresh unseeded one.
+
+        Returns:
+            pd.DataFrame: synthetic incidents
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        codes = {}
+        for column_name in MODEL_COLUMNS:
+            codes[column_name] = self.sample_codes(
+                column_name, codes, n_rows, rng
+            )
+
+        # categoricals, not object columns: a chunk is a few bytes per cell
+        df = pd.DataFrame(
+            {
+                column_name: pd.Categorical.from_codes(
+                    np.where(
+                        column_codes == len(self.values[column_name]),
+                        -1,
+                        column_codes,
+                    ),
+                    categories=self.values[column_name],
+                )
+                for column_name, column_codes in codes.items()
+            }
+        )
+        df["latitude"], df["longitude"] = self.sample_locations(
+            codes["state_names"], rng
+        )
+        # formatted once per year/month pair, not per row
+        month_codes = np.unique(
+            get_parent_keys(
+                codes, ["incident_year", "incident_month"], self.sizes, n_rows
+            ),
+            return_inverse=True,
+        )[1]
+        first_rows = np.unique(month_codes, return_index=True)[1]
+        df["month_year"] = pd.Categorical.from_codes(
+            month_codes,
+            categories=[
+                f"{year}-{month:02d}-01"
+                for year, month in zip(
+                    df["incident_year"].take(first_rows),
+                    df["incident_month"].take(first_rows),
+                )
+            ],
+        )
+        return df
+
+
+def write_synthetic_data(
+    model: SyntheticIncidentModel,
+    out_path: str,
+    n_rows: int,
+    chunk_size: int = 500_000,
+    seed: int = 0,
+) -> None:
+    """
+    Generate n_rows into a csv or parquet file (by extension), one chunk
+    in memory at a time
+
+    Args:
+        model (SyntheticIncidentModel): learned model
+        out_path (str): .csv or .parquet file to write
+        n_rows (int): total rows
+        chunk_size (int): rows per chunk. Defaults to 500_000.
+        seed (int): random seed, same seed gives the same file.
+            Defaults to 0.
+    """
+    is_parquet = out_path.endswith(".parquet")
+    if not is_parquet and not out_path.endswith(".csv"):
+        raise ValueError(f"Expected a .csv or .parquet path, got {out_path}")
+    rng = np.random.default_rng(seed)
+    writer = None
+    try:
+        for chunk_start in range(0, n_rows, chunk_size):
+            chunk = model.sample(min(chunk_size, n_rows - chunk_start), rng)
+            if is_parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                else:
+                    # dictionary index widths can differ between chunks
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(
+                    out_path,
+                    mode="w" if chunk_start == 0 else "a",
+                    header=chunk_start == 0,
+                    index=False,
+                )
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--out", required=True, help=".csv or .parquet")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", default=DATA_PATH, help="csv to learn")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = SyntheticIncidentModel.from_csv(args.source)
+    write_synthetic_data(
+        model, args.out, args.rows, args.chunk_size, args.seed
+    )
+    print(
+        f"{args.rows} rows -> {args.out}"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+
+from common_functions import (
+    CACHE_SCHEMA_VERSION,
+    get_file_hash,
+    is_source_unchanged,
+    prepare_data,
+)
+from filter_index import get_codes_and_categories
+
+# Serving data as plain numpy files, memory mapped read only.
+# Every column is stored as integer codes + a sorted array of its values
+# (fixed width unicode for text), so there are no python objects anywhere:
+# the pages come straight from the OS page cache and are shared by every
+# process that maps them, and nothing writes to them (no refcounts), so
+# forked workers never get a private copy.
+
+
+def get_store_path(path: str) -> str:
+    """
+    Location of the columnar store for a csv, a directory next to the csv
+
+    Args:
+        path (str): path to the csv file
+
+    Returns:
+        str: path to the store directory
+    """
+    return os.path.splitext(path)[0] + ".columns"
+
+
+def get_code_dtype(n_categories: int) -> np.dtype:
+    """Smallest signed int dtype for codes 0..n_categories-1 and -1"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def encode_column(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Codes and values of a column without object dtypes
+
+    Args:
+        series (pd.Series): column to encode
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: codes per row (-1 = missing),
+            sorted values (numeric or fixed width unicode)
+    """
+    codes, categories = get_codes_and_categories(series)
+    if categories.dtype == object:
+        categories = np.asarray(categories.tolist(), dtype=str)
+    return codes.astype(get_code_dtype(len(categories))), categories
+
+
+def decode_float_column(
+    codes: np.ndarray, categories: np.ndarray
+) -> np.ndarray:
+    """
+    Value per row of a numeric column, NaN where missing
+
+    Args:
+        codes (np.ndarray): codes per row
+        categories (np.ndarray): numeric value of each code
+
+    Returns:
+        np.ndarray: float64 values
+    """
+    values = np.asarray(categories, dtype=float)
+    if len(values) == 0:
+        return np.full(len(codes), np.nan)
+    return np.where(codes >= 0, values[np.maximum(codes, 0)], np.nan)
+
+
+def write_columnar_store(
+    df: pd.DataFrame, path: str, store_path: str, columns: List[str]
+) -> None:
+    """
+    Write some columns of the typed df as .npy code/value files, tagged
+    with the csv mtime and hash.
+
+    Args:
+        df (pd.DataFrame): typed df
+        path (str): path to the csv file
+        store_path (str): path to the store directory
+        columns (List[str]): columns to store
+    """
+    # Build in a temp directory first so a crash never leaves half a store
+    temp_path = store_path + ".tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for column_name in columns:
+        codes, categories = encode_column(df[column_name])
+        np.save(os.path.join(temp_path, f"{column_name}.codes.npy"), codes)
+        np.save(
+            os.path.join(temp_path, f"{column_name}.categories.npy"),
+            categories,
+        )
+    with open(os.path.join(temp_path, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "schema_version": CACHE_SCHEMA_VERSION,
+                "source_mtime_ns": str(os.stat(path).st_mtime_ns),
+                "source_sha256": get_file_hash(path),
+                "n_rows": len(df),
+                "columns": list(columns),
+            },
+            f,
+        )
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(temp_path, store_path)
+
+
+def read_store_meta(store_path: str) -> dict:
+    """meta.json of a store, None if there is no store"""
+    meta_path = os.path.join(store_path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def read_columnar_store(
+    path: str, store_path: str, columns: List[str]
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Memory map the store if it is still valid for the csv and has every
+    requested column
+
+    Args:
+        path (str): path to the csv file
+        store_path (str): path to the store directory
+        columns (List[str]): columns to map
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: read only
+            codes and values per column, None if missing or stale
+    """
+    meta = read_store_meta(store_path)
+    if meta is None or meta.get("schema_version") != CACHE_SCHEMA_VERSION:
+        return None
+    if not set(columns) <= set(meta.get("columns", [])):
+        return None
+    if not is_source_unchanged(
+        path, meta.get("source_mtime_ns", ""), meta.get("source_sha256", "")
+    ):
+        return None
+
+    codes, categories = {}, {}
+    for column_name in columns:
+        codes[column_name] = np.load(
+            os.path.join(store_path, f"{column_name}.codes.npy"),
+            mmap_mode="r",
+        )
+        categories[column_name] = np.load(
+            os.path.join(store_path, f"{column_name}.categories.npy"),
+            mmap_mode="r",
+        )
+    return codes, categories
+
+
+def prepare_columnar_data(
+    path: str,
+    columns: List[str],
+    read_frame: Callable[[str], pd.DataFrame] = prepare_data,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Serving data as memory mapped codes + values per column. The first
+    load builds the store from read_frame, later loads (and every
+    worker process) only map the files. Falls back to in memory arrays
+    if the store can't be written.
+
+    Args:
+        path (str): path to the source file
+        columns (List[str]): columns to load, see get_dashboard_columns
+        read_frame (Callable[[str], pd.DataFrame]): reads the typed df
+            from path. Defaults to prepare_data (the cleaned csv), see
+            datasets.py for other sources.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: codes per
+            row (-1 = missing) and sorted values, per column
+    """
+    store_path = get_store_path(path)
+    stored = read_columnar_store(path, store_path, columns)
+    if stored is not None:
+        return stored
+
+    # Keep what an existing store already has, so callers asking for
+    # different columns don't keep rebuilding it
+    meta = read_store_meta(store_path) or {}
+    store_columns = list(
+        dict.fromkeys(list(meta.get("columns", [])) + list(columns))
+    )
+    df = read_frame(path)
+    try:
+        write_columnar_store(df, path, store_path, store_columns)
+    except OSError:
+        # read only deployments, just serve from memory
+        encoded = {
+            column_name: encode_column(df[column_name])
+            for column_name in columns
+        }
+        return (
+            {column_name: encoded[column_name][0] for column_name in columns},
+            {column_name: encoded[column_name][1] for column_name in columns},
+        )
+    return read_columnar_store(path, store_path, columns)
+
+
+def get_unique_values(codes: np.ndarray, categories: np.ndarray) -> list:
+    """
+    Values in order of first appearance, like pd.Series.unique()
+    without the missing values
+
+    Args:
+        codes (np.ndarray): codes per row
+        categories (np.ndarray): value of each code
+
+    Returns:
+        list: python values
+    """
+    first_codes = pd.unique(np.asarray(codes))
+    return categories[first_codes[first_codes >= 0]].tolist()
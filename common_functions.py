@@ -1,12 +1,283 @@
+import hashlib
+import os
+
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+from filter_index import get_codes_and_categories
+
+# Typed schema for the cleaned incident data.
+# Low cardinality text columns are stored as categoricals, everything
+# not listed here is left as pandas parses it.
+CATEGORICAL_COLUMNS = [
+    "injury_severity",
+    "shark_behaviour_generic",
+    "site_category_cleaned",
+    "state_names",
+    "victim_injury",
+    "provoked_unprovoked",
+    "victim_gender",
+    "victim_activity",
+    "shark_common_name",
+    "shark_scientific_name",
+    "injury_location",
+    "data_source",
+    "shark_identification_method",
+]
+INTEGER_COLUMNS = {
+    "incident_month": "int8",
+    "incident_year": "int16",
+}
+# Degrees, the csv has a few with stray non breaking spaces or a
+# trailing dot, those are parsed to floats too
+COORDINATE_COLUMNS = ["latitude", "longitude"]
+
+# Bump when the schema above changes so old caches get rebuilt
+CACHE_SCHEMA_VERSION = "2"
+
+# Columns read by each chart of the dash app, keyed by graph id.
+# Every chart is cross filtered by the others, so the serving df needs
+# the union of the charts in use plus the global filter columns.
+DASHBOARD_CHARTS = {
+    "incident-trend": ["incident_year"],
+    "victim-injury-bar": ["victim_injury"],
+    "site-category-bar": ["site_category_cleaned"],
+    "injury-severity-bar": ["injury_severity"],
+    "monthly-incidents-bar": ["incident_month"],
+    "top-sharks-bar": ["shark_common_name"],
+}
+DASHBOARD_FILTER_COLUMNS = ["state_names", "provoked_unprovoked"]
+# Location of each incident for the map, binned on the server
+DASHBOARD_MAP_COLUMNS = ["latitude", "longitude"]
+# Granularities of the incident trend, widest first: name, count cube
+# dimension and width in years. The trend shows the finest one that fits
+# its points budget for the visible years, see get_trend_resolution.
+# Month and day values are counted from year 0 and 1970-01-01.
+TREND_RESOLUTIONS = [
+    ("decade", "incident_decade", 10.0),
+    ("year", "incident_year", 1.0),
+    ("month", "incident_month_year", 1 / 12),
+    ("day", "incident_day", 1 / 365.25),
+]
+
+
+def get_dashboard_columns(chart_ids: List[str] = None) -> List[str]:
+    """
+    Columns needed to serve a set of dashboard charts
+
+    Args:
+        chart_ids (List[str]): graph ids from DASHBOARD_CHARTS.
+            Defaults to None (all charts).
+
+    Returns:
+        List[str]: filter columns followed by the chart columns, no duplicates
+    """
+    if chart_ids is None:
+        chart_ids = list(DASHBOARD_CHARTS)
+    columns = list(DASHBOARD_FILTER_COLUMNS)
+    for chart_id in chart_ids:
+        for column_name in DASHBOARD_CHARTS[chart_id]:
+            if column_name not in columns:
+                columns.append(column_name)
+    return columns
+
+
+def parse_coordinates(series: pd.Series) -> pd.Series:
+    """
+    Numeric latitude/longitude from the raw text
 
+    Args:
+        series (pd.Series): latitude or longitude as parsed from the csv
+
+    Returns:
+        pd.Series: float column, NaN where there is no number
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return pd.to_numeric(
+        series.astype(str).str.extract(r"(-?\d+(?:\.\d+)?)")[0],
+        errors="coerce",
+    )
+
+
+def apply_data_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns of the incident data to their typed schema
 
-def prepare_data(path: str) -> pd.DataFrame:
+    Args:
+        df (pd.DataFrame): df as parsed from the csv
 
-    df = pd.read_csv(path)
+    Returns:
+        pd.DataFrame: df with categorical, downcast integer and float
+            coordinate columns
+    """
+    for column_name in CATEGORICAL_COLUMNS:
+        if column_name in df.columns:
+            df[column_name] = df[column_name].astype("category")
+    for column_name, dtype in INTEGER_COLUMNS.items():
+        if column_name in df.columns:
+            df[column_name] = df[column_name].astype(dtype)
+    for column_name in COORDINATE_COLUMNS:
+        if column_name in df.columns:
+            df[column_name] = parse_coordinates(df[column_name])
+    return df
+
+
+def get_cache_path(path: str) -> str:
+    """
+    Location of the columnar cache for a csv, next to the csv itself
+
+    Args:
+        path (str): path to the csv file
+
+    Returns:
+        str: path to the feather cache
+    """
+    return os.path.splitext(path)[0] + ".feather"
+
+
+def get_file_hash(path: str) -> str:
+    """
+    sha256 of a file, read in blocks
+
+    Args:
+        path (str): path to the file
+
+    Returns:
+        str: hex digest
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def is_source_unchanged(path: str, mtime_ns: str, sha256: str) -> bool:
+    """
+    Whether a cache written from path is still valid. Checks the mtime
+    first and only hashes the file if that changed (git checkout, touch etc.).
+
+    Args:
+        path (str): path to the source file
+        mtime_ns (str): st_mtime_ns recorded when the cache was written
+        sha256 (str): hash recorded when the cache was written
+
+    Returns:
+        bool: True if the source has the same content
+    """
+    if mtime_ns == str(os.stat(path).st_mtime_ns):
+        return True
+    return sha256 == get_file_hash(path)
+
+
+def read_data_cache(
+    path: str, cache_path: str, columns: List[str] = None
+) -> pd.DataFrame:
+    """
+    Memory map the feather cache if it is still valid for the csv
+    (see is_source_unchanged).
+
+    Args:
+        path (str): path to the csv file
+        cache_path (str): path to the feather cache
+        columns (List[str]): columns to read. Defaults to None (all).
+
+    Returns:
+        pd.DataFrame: cached df, None if missing or stale
+    """
+    from pyarrow import feather, ipc
+
+    if not os.path.exists(cache_path):
+        return None
+    with ipc.open_file(cache_path) as reader:
+        metadata = reader.schema.metadata or {}
+    if metadata.get(b"schema_version", b"").decode() != CACHE_SCHEMA_VERSION:
+        return None
+    if not is_source_unchanged(
+        path,
+        metadata.get(b"source_mtime_ns", b"").decode(),
+        metadata.get(b"source_sha256", b"").decode(),
+    ):
+        return None
+
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def write_data_cache(df: pd.DataFrame, path: str, cache_path: str) -> None:
+    """
+    Write the typed df as an uncompressed feather file (so it can be memory
+    mapped), tagged with the csv mtime and hash.
+
+    Args:
+        df (pd.DataFrame): typed df
+        path (str): path to the csv file
+        cache_path (str): path to the feather cache
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **table.schema.metadata,
+            "schema_version": CACHE_SCHEMA_VERSION,
+            "source_mtime_ns": str(os.stat(path).st_mtime_ns),
+            "source_sha256": get_file_hash(path),
+        }
+    )
+    # Write to a temp file first so a crash never leaves a half written cache
+    temp_path = cache_path + ".tmp"
+    feather.write_feather(table, temp_path, compression="uncompressed")
+    os.replace(temp_path, cache_path)
+
+
+def prepare_data(
+    path: str, columns: List[str] = None, use_cache: bool = True
+) -> pd.DataFrame:
+    """
+    Load the incident csv with its typed schema.
+    The first load parses the csv and writes a feather cache next to it,
+    later loads memory map the cache instead of parsing the csv again.
+    The cache always holds every column, only the requested ones are read
+    from it. Falls back to the csv if pyarrow is missing or the cache
+    can't be written.
+
+    Args:
+        path (str): path to the csv file
+        columns (List[str]): columns to load, see get_dashboard_columns.
+            Defaults to None (all columns).
+        use_cache (bool): read/write the feather cache. Defaults to True.
+
+    Returns:
+        pd.DataFrame: typed df
+    """
+    if use_cache:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            use_cache = False
+
+    if not use_cache:
+        return apply_data_schema(pd.read_csv(path, usecols=columns))
+
+    cache_path = get_cache_path(path)
+    df = read_data_cache(path, cache_path, columns)
+    if df is not None:
+        return df
+
+    # Stale or missing cache, this is the only time every column is parsed
+    df = apply_data_schema(pd.read_csv(path))
+    try:
+        write_data_cache(df, path, cache_path)
+    except OSError:
+        # read only deployments, just serve from memory
+        pass
+    if columns is not None:
+        df = df[columns]
     return df
 
 
@@ -84,8 +355,12 @@ def groupby_count(
     Returns:
         pd.DataFrame.groupby: groupby object df
     """
-    # no sorting
-    return df.groupby(column_name).size().reset_index(name=index_name)
+    # no sorting, observed so categoricals don't add empty groups
+    return (
+        df.groupby(column_name, observed=True)
+        .size()
+        .reset_index(name=index_name)
+    )
 
 
 def get_reset_value_counts(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
@@ -100,12 +375,292 @@ def get_reset_value_counts(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
         pd.DataFrame: value counts df
     """
     # sorting + faster no smol data
-    return df[column_name].value_counts().reset_index()
+    value_counts = df[column_name].value_counts()
+    if isinstance(value_counts.index, pd.CategoricalIndex):
+        # categoricals report unused categories with a count of 0
+        value_counts = value_counts[value_counts > 0]
+        value_counts.index = value_counts.index.astype(object)
+    return value_counts.reset_index()
+
+
+def count_codes(
+    codes: Dict[str, np.ndarray],
+    n_categories: Dict[str, int],
+    split_codes: np.ndarray = None,
+    n_split: int = 1,
+    weights: np.ndarray = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Marginal counts of several integer coded columns with a single
+    np.bincount. Every column gets its own slot range in one key space, so
+    all the charts are counted in one pass instead of a groupby/value_counts
+    (and a provoked/unprovoked filter) per chart.
+
+    Args:
+        codes (Dict[str, np.ndarray]): codes per column, -1 = missing
+        n_categories (Dict[str, int]): number of categories per column
+        split_codes (np.ndarray): codes of a column to split every count
+            by (provoked_unprovoked). Defaults to None.
+        n_split (int): number of categories of the split column.
+            Defaults to 1.
+        weights (np.ndarray): count of each row, for preaggregated rows
+            like count cube cells. Defaults to None (1 per row).
+
+    Returns:
+        Dict[str, np.ndarray]: counts per category, (n_split x categories)
+            when split_codes is given
+    """
+    keys, key_weights, slots = [], [], {}
+    offset = 0
+    if split_codes is not None:
+        split_codes = split_codes.astype(np.int64)
+    for column_name, column_codes in codes.items():
+        # categorical codes can be int8, widen before building keys
+        column_codes = column_codes.astype(np.int64)
+        column_size = n_categories[column_name]
+        valid = column_codes >= 0
+        column_keys = column_codes
+        if split_codes is not None:
+            valid &= split_codes >= 0
+            column_keys = split_codes * column_size + column_codes
+        keys.append(column_keys[valid] + offset)
+        if weights is not None:
+            key_weights.append(weights[valid])
+        slots[column_name] = (offset, column_size)
+        offset += n_split * column_size
+
+    totals = np.bincount(
+        np.concatenate(keys),
+        weights=np.concatenate(key_weights) if weights is not None else None,
+        minlength=offset,
+    ).astype(np.int64)
+
+    counts = {}
+    for column_name, (offset, column_size) in slots.items():
+        column_counts = totals[offset : offset + n_split * column_size]
+        if split_codes is not None:
+            column_counts = column_counts.reshape(n_split, column_size)
+        counts[column_name] = column_counts
+    return counts
+
+
+def get_marginal_frame(
+    counts: np.ndarray,
+    categories: np.ndarray,
+    column_name: str,
+    split_categories: np.ndarray = None,
+) -> pd.DataFrame:
+    """
+    Wrap the counts of one column (from count_codes) in a df
+
+    Args:
+        counts (np.ndarray): counts per category, or (split x categories)
+        categories (np.ndarray): category values
+        column_name (str): name of the category column
+        split_categories (np.ndarray): values of the split column.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: indexed by category, a "count" column or one column
+            per split value
+    """
+    index = pd.Index(categories, name=column_name)
+    if split_categories is None:
+        return pd.DataFrame({"count": counts}, index=index)
+    return pd.DataFrame(counts.T, index=index, columns=list(split_categories))
+
+
+def get_marginal_counts(
+    df: pd.DataFrame, column_names: List[str], split_column: str = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Every marginal count of a (filtered) df in a single pass
+
+    Args:
+        df (pd.DataFrame): filtered df
+        column_names (List[str]): columns to count
+        split_column (str): column to split the counts by, e.g.
+            provoked_unprovoked. Defaults to None.
+
+    Returns:
+        Dict[str, pd.DataFrame]: marginal df per column, see
+            get_marginal_frame
+    """
+    codes, categories = {}, {}
+    for column_name in column_names:
+        codes[column_name], categories[column_name] = get_codes_and_categories(
+            df[column_name]
+        )
+    split_codes, split_categories = None, None
+    if split_column is not None:
+        split_codes, split_categories = get_codes_and_categories(
+            df[split_column]
+        )
+
+    counts = count_codes(
+        codes,
+        {column_name: len(categories[column_name]) for column_name in codes},
+        split_codes=split_codes,
+        n_split=len(split_categories) if split_column is not None else 1,
+    )
+    return {
+        column_name: get_marginal_frame(
+            counts[column_name],
+            categories[column_name],
+            column_name,
+            split_categories,
+        )
+        for column_name in column_names
+    }
+
+
+def get_count_frame(
+    counts: pd.Series, index_name: str = "count", sort: bool = False
+) -> pd.DataFrame:
+    """
+    Turn one column of a marginal df into the same df as groupby_count
+    (sort=False) or get_reset_value_counts (sort=True).
+    Categories with a count of 0 are dropped.
+
+    Args:
+        counts (pd.Series): counts indexed by category
+        index_name (str): name of the count column. Defaults to "count".
+        sort (bool): sort by count, descending. Defaults to False.
+
+    Returns:
+        pd.DataFrame: counts df
+    """
+    counts = counts[counts > 0].rename(index_name)
+    if sort:
+        counts = counts.sort_values(ascending=False)
+    return counts.reset_index()
+
+
+def get_split_count_frame(
+    marginal: pd.DataFrame,
+    first_value: str = "provoked",
+    second_value: str = "unprovoked",
+) -> pd.DataFrame:
+    """
+    Side by side counts for the double bar graphs, like an outer merge of
+    two value counts: categories with no count in either are dropped.
+
+    Args:
+        marginal (pd.DataFrame): marginal df split by a column
+        first_value (str): split value of the first group.
+            Defaults to "provoked".
+        second_value (str): split value of the second group.
+            Defaults to "unprovoked".
+
+    Returns:
+        pd.DataFrame: combined counts df with <value>_count columns
+    """
+    first_name, second_name = f"{first_value}_count", f"{second_value}_count"
+    combined_counts = marginal[[first_value, second_value]].rename(
+        columns={first_value: first_name, second_value: second_name}
+    )
+    return combined_counts[
+        (combined_counts[first_name] > 0) | (combined_counts[second_name] > 0)
+    ].reset_index()
+
+
+# Label of the bar that sums everything past the top N, and the hover
+# text of every bar (the others bar lists the ones it sums)
+OTHERS_LABEL_TEMPLATE = "others: {} types"
+HOVER_TEXT_SUFFIX = " incidents"
+
+
+def get_top_n_with_others(
+    names: np.ndarray,
+    counts: np.ndarray,
+    top_n: int,
+    always_add_others: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, str]:
+    """
+    Top N bars plus one "others: K types" bar summing the rest, with the
+    hover text of each bar. Vectorized, no loop over the rows.
+
+    Args:
+        names (np.ndarray): category per bar, sorted by count descending
+        counts (np.ndarray): count per bar
+        top_n (int): number of bars to keep
+        always_add_others (bool): add the others bar even when nothing is
+            left over ("others: 0 types", count 0). Defaults to False.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, str]: bar labels, bar
+            counts, bar hover texts, and the hover text of the others bar
+    """
+    names = np.asarray(names, dtype=object)
+    counts = np.asarray(counts)
+    hover_text = (
+        pd.Series(names, dtype=str)
+        .str.cat(pd.Series(counts).astype(str), sep=": ")
+        .add(HOVER_TEXT_SUFFIX)
+        .to_numpy(dtype=object)
+    )
+    others_text = "<br>".join(hover_text[top_n:].tolist())
+
+    num_others = max(len(names) - top_n, 0)
+    if num_others == 0 and not always_add_others:
+        return names, counts, hover_text, others_text
+    return (
+        np.append(names[:top_n], OTHERS_LABEL_TEMPLATE.format(num_others)),
+        np.append(counts[:top_n], counts[top_n:].sum()),
+        np.append(hover_text[:top_n], others_text),
+        others_text,
+    )
+
+
+def bucket_values(
+    series: pd.Series, keep_values: List, other_label: str
+) -> pd.Series:
+    """
+    Replace every value not in keep_values (missing values too) by
+    other_label. Works on the distinct values (codes) instead of per row,
+    and returns a new series, the input is not changed.
+
+    Args:
+        series (pd.Series): values to bucket
+        keep_values (List): values to keep as they are
+        other_label (str): label for everything else
+
+    Returns:
+        pd.Series: bucketed values, same index and name
+    """
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Index(uniques)
+    labels = np.where(
+        uniques.isin(keep_values), uniques.astype(object), other_label
+    )
+    # code -1 (missing) picks the last label
+    labels = np.append(labels, other_label).astype(object)
+    return pd.Series(labels[codes], index=series.index, name=series.name)
+
+
+def bucket_top_k(
+    series: pd.Series, top_k: int, other_label: str = "other"
+) -> pd.Series:
+    """
+    Keep the top_k most frequent values, everything else becomes
+    other_label. See bucket_values.
+
+    Args:
+        series (pd.Series): values to bucket
+        top_k (int): number of values to keep
+        other_label (str): label for everything else. Defaults to "other".
+
+    Returns:
+        pd.Series: bucketed values, same index and name
+    """
+    return bucket_values(
+        series, series.value_counts().index[:top_k], other_label
+    )
 
 
 def prepare_top_n_data(
     value_counts: pd.DataFrame, column_name: str, top_n: int
-) -> Tuple[List, str]:
+) -> Tuple[pd.DataFrame, str]:
     """
     function to get the top N data from value count df
 
@@ -115,47 +670,199 @@ def prepare_top_n_data(
         top_n (int): number of top entries to include
 
     Returns:
-        Tuple[List, str]: A tuple containing:
-            - A list of the top N values from the specified column.
-            - A string message summarizing the extracted top N values.
+        Tuple[pd.DataFrame, str]: A tuple containing:
+            - The top N rows plus an others row, with a hover_text column.
+            - The hover text of the others row (one line per value).
     """
-    top_categories = value_counts.head(top_n)
-    others = value_counts.iloc[top_n:]
+    names, counts, hover_text, others_text = get_top_n_with_others(
+        value_counts[column_name].to_numpy(),
+        value_counts["count"].to_numpy(),
+        top_n,
+    )
+    top_categories = pd.DataFrame(
+        {column_name: names, "count": counts, "hover_text": hover_text}
+    )
+    return top_categories, others_text
 
-    num_others = others[column_name].nunique()
-    others_count = others["count"].sum()
 
-    if num_others > 0:
-        others_row = {
-            column_name: f"others: {num_others} types",
-            "count": others_count,
-        }
-        top_categories = pd.concat(
-            [top_categories, pd.DataFrame([others_row])], ignore_index=True
-        )
+def downsample_line(
+    df: pd.DataFrame, x_name: str, y_name: str, max_points: int
+) -> pd.DataFrame:
+    """
+    Thin out a line for drawing: the x range is cut into equal width
+    buckets (about one per 2 pixels for max_points ~ chart width) and
+    only the lowest and highest point of each bucket are kept, plus the
+    first and last point. Peaks and dips survive, unlike every nth point.
 
-    others_text = "<br>".join(
-        [
-            f"{row[column_name]}: {row['count']} incidents"
-            for _, row in others.iterrows()
-        ]
+    Args:
+        df (pd.DataFrame): line points, sorted by x
+        x_name (str): x column (numbers or dates)
+        y_name (str): y column
+        max_points (int): most points returned
+
+    Returns:
+        pd.DataFrame: the kept rows, in x order. df itself if it is
+            already small enough.
+    """
+    if len(df) <= max_points or max_points < 4:
+        return df
+    x = pd.to_numeric(df[x_name]).to_numpy(dtype=float)
+    y = df[y_name].to_numpy()
+    n_buckets = (max_points - 2) // 2
+    span = max(x[-1] - x[0], np.finfo(float).tiny)
+    buckets = np.minimum(
+        ((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1
     )
+    # sorted by bucket then y: the first of a bucket is its min, the last
+    # its max
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    starts = np.flatnonzero(
+        np.concatenate([[True], sorted_buckets[1:] != sorted_buckets[:-1]])
+    )
+    ends = np.append(starts[1:], len(order)) - 1
+    keep = np.unique(
+        np.concatenate([order[starts], order[ends], [0, len(df) - 1]])
+    )
+    return df.iloc[keep]
 
-    hover_text = [
-        (
-            f"{row[column_name]}: {row['count']} incidents"
-            if row[column_name] != f"others: {num_others} types"
-            else others_text
-        )
-        for _, row in top_categories.iterrows()
+
+def encode_values(
+    values: np.ndarray, valid: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Codes and sorted unique values of an array, like
+    get_codes_and_categories for plain numpy values
+
+    Args:
+        values (np.ndarray): value per row
+        valid (np.ndarray): False where the value is missing
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int32 codes per row (-1 = missing),
+            sorted values
+    """
+    categories, inverse = np.unique(values[valid], return_inverse=True)
+    codes = np.full(len(values), -1, dtype=np.int32)
+    codes[valid] = inverse
+    return codes, categories
+
+
+def get_time_rollups(
+    codes: Dict[str, np.ndarray], categories: Dict[str, np.ndarray]
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Decade and month codes per row from the incident_year and
+    incident_month codes, the coarser and finer trend resolutions (see
+    TREND_RESOLUTIONS). Both are a function of year and month, so adding
+    them to the count cube adds no cells.
+
+    Args:
+        codes (Dict[str, np.ndarray]): codes per row, with incident_year
+            and incident_month
+        categories (Dict[str, np.ndarray]): sorted value of each code
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: codes and
+            values of incident_decade and incident_month_year
+    """
+    year_codes = np.asarray(codes["incident_year"])
+    month_codes = np.asarray(codes["incident_month"])
+    years = np.asarray(categories["incident_year"], dtype=np.int64)[
+        np.maximum(year_codes, 0)
+    ]
+    months = np.asarray(categories["incident_month"], dtype=np.int64)[
+        np.maximum(month_codes, 0)
     ]
-    top_categories["hover_text"] = hover_text
+    has_year = year_codes >= 0
+    rollup_codes, rollup_categories = {}, {}
+    (
+        rollup_codes["incident_decade"],
+        rollup_categories["incident_decade"],
+    ) = encode_values(years // 10 * 10, has_year)
+    (
+        rollup_codes["incident_month_year"],
+        rollup_categories["incident_month_year"],
+    ) = encode_values(years * 12 + months - 1, has_year & (month_codes >= 0))
+    return rollup_codes, rollup_categories
 
-    return top_categories, others_text
+
+def get_trend_resolution(
+    n_years: float, dimensions: List[str], max_points: int
+) -> Tuple[str, str]:
+    """
+    Finest trend resolution whose points for the visible years fit in
+    max_points, decade -> year -> month -> day as the user zooms in
+
+    Args:
+        n_years (float): visible years
+        dimensions (List[str]): resolutions that can be served (cube
+            dimensions), see TREND_RESOLUTIONS
+        max_points (int): points budget of the chart
+
+    Returns:
+        Tuple[str, str]: resolution name and its cube dimension
+    """
+    available = [
+        (name, dim, width)
+        for name, dim, width in TREND_RESOLUTIONS
+        if dim in dimensions
+    ]
+    for name, dim, width in reversed(available):
+        if n_years / width <= max_points:
+            return name, dim
+    return available[0][:2]
+
+
+def get_trend_x_values(values: pd.Index, resolution: str) -> pd.Index:
+    """
+    Trend x values to plot: years and decades as they are, months and
+    days as dates
+
+    Args:
+        values (pd.Index): values of the resolution's dimension
+        resolution (str): name from TREND_RESOLUTIONS
+
+    Returns:
+        pd.Index: x values, same name
+    """
+    if resolution == "month":
+        months = np.asarray(values, dtype=np.int64)
+        dates = pd.to_datetime(
+            pd.DataFrame(
+                {"year": months // 12, "month": months % 12 + 1, "day": 1}
+            )
+        )
+        return pd.Index(dates, name=values.name)
+    if resolution == "day":
+        dates = np.asarray(values, dtype=np.int64).astype("datetime64[D]")
+        return pd.Index(dates, name=values.name)
+    return values
+
+
+def get_axis_year(value) -> int:
+    """
+    Year of an x axis range value from relayoutData, a number on a year
+    axis or a date string on a month/day axis
+
+    Args:
+        value: xaxis.range[0] or xaxis.range[1]
+
+    Returns:
+        int: year
+    """
+    try:
+        return int(float(value))
+    except ValueError:
+        return pd.Timestamp(value).year
 
 
 def get_single_line_plot(
-    df: pd.DataFrame, xaxis_name: str, yaxis_name: str, title: str
+    df: pd.DataFrame,
+    xaxis_name: str,
+    yaxis_name: str,
+    title: str,
+    max_points: int = None,
 ) -> go.Figure:
     """
     get single line plot graph object
@@ -165,10 +872,14 @@ def get_single_line_plot(
         xaxis_name (str): xaxis name
         yaxis_name (str): yaxis name
         title (str): title of graph
+        max_points (int): downsample the line to at most this many
+            points, see downsample_line. Defaults to None (every point).
 
     Returns:
         go.Figure: output figure
     """
+    if max_points is not None:
+        df = downsample_line(df, xaxis_name, yaxis_name, max_points)
     line_fig = go.Figure(
         data=[
             go.Scatter(
@@ -202,6 +913,7 @@ def get_double_line_fig(
     g2_name: str,
     title: str,
     yaxis_title: str,
+    max_points: int = None,
 ):
     """
     generates a dual-line plotly figure to compare two datasets.
@@ -216,10 +928,17 @@ def get_double_line_fig(
         g2_name (str): legend name for the second line
         title (str): title of the graph
         yaxis_title (str): label for the y-axis
+        max_points (int): downsample each line to at most this many
+            points, see downsample_line. Defaults to None (every point).
 
     returns:
         go.Figure: a plotly figure with two line plots
     """
+    if max_points is not None:
+        df_first_agg = downsample_line(df_first_agg, xname, y1name, max_points)
+        df_second_agg = downsample_line(
+            df_second_agg, xname, y2name, max_points
+        )
 
     line_fig = go.Figure(
         data=[
@@ -410,3 +1129,52 @@ def get_pie_chart(
         plot_bgcolor="rgba(0,0,0,0)",
     )
     return pie_chart
+
+
+def get_map_bins_fig(
+    bins: pd.DataFrame,
+    title: str,
+    center: Dict[str, float],
+    zoom: float,
+) -> go.Figure:
+    """
+    Map of incident counts per bin, one marker per bin sized and colored
+    by its count
+
+    Args:
+        bins (pd.DataFrame): latitude, longitude and count per bin
+        title (str): title of the map
+        center (Dict[str, float]): lat/lon the map opens at
+        zoom (float): zoom the map opens at
+
+    Returns:
+        go.Figure: scatter map figure
+    """
+    largest_count = max(bins["count"].max(), 1) if len(bins) else 1
+    map_fig = go.Figure(
+        data=[
+            go.Scattermap(
+                lat=bins["latitude"],
+                lon=bins["longitude"],
+                mode="markers",
+                marker=dict(
+                    size=6 + 24 * np.sqrt(bins["count"] / largest_count),
+                    color=bins["count"],
+                    colorscale=[[0, "#26a69a"], [1, "#ffd600"]],
+                    opacity=0.8,
+                ),
+                text=bins["count"],
+                hovertemplate="%{text} incidents<extra></extra>",
+            )
+        ]
+    )
+    map_fig.update_layout(
+        title=title,
+        font=dict(color="#ffd600", size=12),
+        paper_bgcolor="rgba(0,0,0,0)",
+        map=dict(style="carto-darkmatter", center=center, zoom=zoom),
+        margin=dict(l=10, r=10, t=40, b=10),
+        # keeps the user's pan/zoom when the bins are updated
+        uirevision="incident-map",
+    )
+    return map_fig
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+from common_functions import count_codes, get_marginal_frame
+from filter_index import FilterIndex, get_codes_and_categories
+
+
+class CountCube:
+    """
+    Preaggregated incident counts over every dashboard dimension.
+
+    Stored sparse: one entry per observed combination of category codes
+    (a cell) with its row count, which is far smaller than the dense
+    state x provoked x year x ... array. Charts are answered by filtering
+    cells through a FilterIndex built over them and summing the counts
+    with np.bincount, so the cost depends on the number of cells and not
+    on the number of incidents.
+    """
+
+    def __init__(
+        self,
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, np.ndarray],
+        range_dimensions: List[str] = None,
+    ):
+        """
+        Args:
+            codes (Dict[str, np.ndarray]): integer codes per row and
+                dimension, -1 = missing
+            categories (Dict[str, np.ndarray]): sorted value of each code
+            range_dimensions (List[str]): dimensions filtered by range.
+                Defaults to None.
+        """
+        self.dimensions = list(codes)
+        self.categories = categories
+        self.n_rows = len(codes[self.dimensions[0]])
+
+        # Missing values (-1) get their own slot after the real categories
+        shape = [len(categories[dim]) + 1 for dim in self.dimensions]
+        row_codes = [
+            np.where(codes[dim] >= 0, codes[dim], len(categories[dim]))
+            for dim in self.dimensions
+        ]
+        if np.prod(shape, dtype=float) < 2**62:
+            flat_codes = np.ravel_multi_index(row_codes, shape)
+            cells, self.counts = np.unique(flat_codes, return_counts=True)
+            cell_codes = np.unravel_index(cells, shape)
+        else:
+            cells, self.counts = np.unique(
+                np.stack(row_codes, axis=1), axis=0, return_counts=True
+            )
+            cell_codes = cells.T
+
+        self.codes = {}
+        for dim, dim_codes in zip(self.dimensions, cell_codes):
+            dim_codes = dim_codes.astype(np.int32)
+            dim_codes[dim_codes == len(categories[dim])] = -1
+            self.codes[dim] = dim_codes
+        self.n_cells = len(self.counts)
+        self.index = FilterIndex(self.codes, categories, range_dimensions)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        dimensions: List[str],
+        range_dimensions: List[str] = None,
+    ) -> "CountCube":
+        """
+        Aggregate a df into a cube
+
+        Args:
+            df (pd.DataFrame): row level data
+            dimensions (List[str]): categorical dimensions
+            range_dimensions (List[str]): numeric dimensions filtered by
+                range (years). Defaults to None.
+
+        Returns:
+            CountCube: the cube
+        """
+        range_dimensions = range_dimensions or []
+        codes, categories = {}, {}
+        for dim in list(dimensions) + list(range_dimensions):
+            codes[dim], categories[dim] = get_codes_and_categories(df[dim])
+        return cls(codes, categories, range_dimensions)
+
+    def select(
+        self,
+        isin: Dict[str, list] = None,
+        between: Dict[str, Tuple] = None,
+    ) -> np.ndarray:
+        """
+        Cells matching every filter, same arguments as FilterIndex.select
+
+        Args:
+            isin (Dict[str, list]): dimension -> accepted values.
+                Defaults to None.
+            between (Dict[str, Tuple]): dimension -> (low, high).
+                Defaults to None.
+
+        Returns:
+            np.ndarray: boolean cell mask
+        """
+        return self.index.select(isin=isin, between=between)
+
+    def to_columns(self) -> dict:
+        """
+        The cells as plain columnar lists, small enough to ship to the
+        browser in a dcc.Store (see assets/crossfilter.js)
+
+        Returns:
+            dict: dimensions, categories and codes per dimension, counts
+        """
+        return {
+            "dimensions": self.dimensions,
+            "categories": {
+                dim: self.categories[dim].tolist() for dim in self.dimensions
+            },
+            "codes": {dim: self.codes[dim].tolist() for dim in self.dimensions},
+            "counts": self.counts.tolist(),
+        }
+
+    def marginals(
+        self,
+        dimensions: List[str],
+        mask: np.ndarray = None,
+        split: str = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Incident count per category of several dimensions over the selected
+        cells, all summed in a single pass (see count_codes)
+
+        Args:
+            dimensions (List[str]): dimensions to count
+            mask (np.ndarray): boolean cell mask from select().
+                Defaults to None (every cell).
+            split (str): dimension to split the counts by.
+                Defaults to None.
+
+        Returns:
+            Dict[str, pd.DataFrame]: marginal df per dimension, see
+                get_marginal_frame
+        """
+        if mask is None:
+            mask = np.ones(self.n_cells, dtype=bool)
+        split_categories = None
+        split_codes = None
+        if split is not None:
+            split_categories = self.categories[split]
+            split_codes = self.codes[split][mask]
+
+        counts = count_codes(
+            {dim: self.codes[dim][mask] for dim in dimensions},
+            {dim: len(self.categories[dim]) for dim in dimensions},
+            split_codes=split_codes,
+            n_split=len(split_categories) if split is not None else 1,
+            weights=self.counts[mask],
+        )
+        return {
+            dim: get_marginal_frame(
+                counts[dim], self.categories[dim], dim, split_categories
+            )
+            for dim in dimensions
+        }
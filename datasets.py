@@ -0,0 +1,477 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+from columnar_store import prepare_columnar_data
+from common_functions import (
+    DASHBOARD_CHARTS,
+    DASHBOARD_MAP_COLUMNS,
+    apply_data_schema,
+    get_dashboard_columns,
+    parse_coordinates,
+)
+
+# Declarative adapters: which columns of a dataset play each role of the
+# dashboard, so the same filter/aggregate/figure pipeline serves any of
+# them. The dashboard columns keep the names of the shark data it was
+# built for (see DASHBOARD_CHARTS), an adapter fills them from its own:
+#   time: year + month (+ day) columns, or one date column
+#   region: the dropdown filter (state_names)
+#   split: two values shown together or separately, the checkboxes
+#       (provoked_unprovoked, values[0] -> provoked, values[1] ->
+#       unprovoked)
+#   facets: the category bar charts, keyed by graph id
+#   geo: latitude/longitude for the incident map, optional
+# A role is a column name, or a list of columns with a derive function
+# turning them into one series, plus optional labels for coded values
+# (unlabelled codes become "unknown").
+#
+# The source is read once, only the role columns, into the memory mapped
+# columnar store next to it (see columnar_store.py). The app then only
+# maps codes and counts cube cells, whatever the size of the dataset.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.path.join("data", "JBI100_Data_2024_2025")
+SPLIT_VALUES = ["provoked", "unprovoked"]
+SOURCE_EXTENSIONS = [".parquet", ".csv"]
+
+# The railroad data has numeric state (FIPS) codes
+US_STATE_FIPS = {
+    1: "Alabama",
+    2: "Alaska",
+    4: "Arizona",
+    5: "Arkansas",
+    6: "California",
+    8: "Colorado",
+    9: "Connecticut",
+    10: "Delaware",
+    11: "District of Columbia",
+    12: "Florida",
+    13: "Georgia",
+    15: "Hawaii",
+    16: "Idaho",
+    17: "Illinois",
+    18: "Indiana",
+    19: "Iowa",
+    20: "Kansas",
+    21: "Kentucky",
+    22: "Louisiana",
+    23: "Maine",
+    24: "Maryland",
+    25: "Massachusetts",
+    26: "Michigan",
+    27: "Minnesota",
+    28: "Mississippi",
+    29: "Missouri",
+    30: "Montana",
+    31: "Nebraska",
+    32: "Nevada",
+    33: "New Hampshire",
+    34: "New Jersey",
+    35: "New Mexico",
+    36: "New York",
+    37: "North Carolina",
+    38: "North Dakota",
+    39: "Ohio",
+    40: "Oklahoma",
+    41: "Oregon",
+    42: "Pennsylvania",
+    44: "Rhode Island",
+    45: "South Carolina",
+    46: "South Dakota",
+    47: "Tennessee",
+    48: "Texas",
+    49: "Utah",
+    50: "Vermont",
+    51: "Virginia",
+    53: "Washington",
+    54: "West Virginia",
+    55: "Wisconsin",
+    56: "Wyoming",
+    72: "Puerto Rico",
+}
+# FRA Form 54 codes, see the railroad readme for the source
+RAILROAD_ACCIDENT_TYPES = {
+    1: "Derailment",
+    2: "Head on collision",
+    3: "Rear end collision",
+    4: "Side collision",
+    5: "Raking collision",
+    6: "Broken train collision",
+    7: "Highway-rail crossing",
+    8: "RR grade crossing",
+    9: "Obstruction",
+    10: "Explosive-detonation",
+    11: "Fire/violent rupture",
+    12: "Other impacts",
+    13: "Other",
+}
+RAILROAD_CAUSE_GROUPS = {
+    "E": "Equipment",
+    "H": "Human factors",
+    "M": "Miscellaneous",
+    "S": "Signal and communication",
+    "T": "Track",
+}
+RAILROAD_WEATHER = {
+    1: "Clear",
+    2: "Cloudy",
+    3: "Rain",
+    4: "Fog",
+    5: "Sleet",
+    6: "Snow",
+}
+
+# OSHA ITA codes, from case_detail_data_dictionary.pdf
+OSHA_INCIDENT_OUTCOMES = {
+    1: "Death",
+    2: "Days away from work",
+    3: "Job transfer or restriction",
+    4: "Other recordable case",
+}
+OSHA_INCIDENT_TYPES = {
+    1: "Injury",
+    2: "Skin disorder",
+    3: "Respiratory condition",
+    4: "Poisoning",
+    5: "Hearing loss",
+    6: "Other illness",
+}
+OSHA_ESTABLISHMENT_SIZES = {
+    1: "< 20",
+    2: "20-249",
+    21: "20-99",
+    22: "100-249",
+    3: "250+",
+}
+
+
+def get_cause_group(causes: pd.Series) -> pd.Series:
+    """First letter of the FRA cause code, the cause group"""
+    return causes.astype("string").str.strip().str[:1].str.upper()
+
+
+def get_casualty_split(casualties: pd.DataFrame) -> pd.Series:
+    """casualties if anyone was killed or injured, no casualties otherwise"""
+    total = casualties.apply(pd.to_numeric, errors="coerce").sum(axis=1)
+    return pd.Series(
+        np.where(total > 0, "casualties", "no casualties"),
+        index=casualties.index,
+    )
+
+
+def get_injury_illness_split(incident_types: pd.Series) -> pd.Series:
+    """injury for type 1, illness for the other OSHA incident types"""
+    incident_types = pd.to_numeric(incident_types, errors="coerce")
+    return pd.Series(
+        np.where(incident_types == 1, "injury", "illness"),
+        index=incident_types.index,
+    ).where(incident_types.notna())
+
+
+SHARK_DATASET = {
+    "title": "Australian Shark Incidents Analysis",
+    "path": os.path.join("data", "new_cleaned_updated_data.csv"),
+    "time": {"year": "incident_year", "month": "incident_month"},
+    "region": "state_names",
+    "split": {"column": "provoked_unprovoked", "values": SPLIT_VALUES},
+    "facets": {
+        "victim-injury-bar": {
+            "column": "victim_injury",
+            "title": "Injury Type",
+        },
+        "site-category-bar": {
+            "column": "site_category_cleaned",
+            "title": "Site Category",
+        },
+        "injury-severity-bar": {
+            "column": "injury_severity",
+            "title": "Injury Severity",
+        },
+        "top-sharks-bar": {
+            "column": "shark_common_name",
+            "title": "Most Dangerous Sharks",
+        },
+    },
+    "geo": {"latitude": "latitude", "longitude": "longitude"},
+    "map": {"center": {"lat": -27.0, "lon": 134.0}, "zoom": 3},
+}
+RAILROAD_DATASET = {
+    "title": "Railroad Equipment Accidents Analysis",
+    # the csv from data.transportation.gov, or the parquet of
+    # Notebooks/1_1_Convert_csv_to_parquet.ipynb
+    "path": os.path.join(
+        DATASETS_DIR,
+        "Railroad_Incidents",
+        "Railroad_Equipment_Accident_Incident_Source_Data__Form_54_*",
+    ),
+    "time": {"year": "YEAR4", "month": "MONTH", "day": "DAY"},
+    "region": {"column": "STATE", "labels": US_STATE_FIPS},
+    "split": {
+        "column": ["TOTKLD", "TOTINJ"],
+        "derive": get_casualty_split,
+        "values": ["casualties", "no casualties"],
+    },
+    "facets": {
+        "victim-injury-bar": {
+            "column": "TYPE",
+            "labels": RAILROAD_ACCIDENT_TYPES,
+            "title": "Accident Type",
+        },
+        "site-category-bar": {
+            "column": "CAUSE",
+            "derive": get_cause_group,
+            "labels": RAILROAD_CAUSE_GROUPS,
+            "title": "Cause",
+        },
+        "injury-severity-bar": {
+            "column": "WEATHER",
+            "labels": RAILROAD_WEATHER,
+            "title": "Weather",
+        },
+        "top-sharks-bar": {
+            "column": "RAILROAD",
+            "title": "Railroads With Most Accidents",
+        },
+    },
+    "geo": {"latitude": "Latitude", "longitude": "Longitud"},
+    "map": {"center": {"lat": 39.8, "lon": -98.6}, "zoom": 3},
+}
+OSHA_DATASET = {
+    "title": "Work Related Injury and Illness Analysis",
+    "path": os.path.join(
+        DATASETS_DIR, "Work_related_Injury_and_Illness", "ITA Case Detail*"
+    ),
+    "time": {"date": "date_of_incident"},
+    "region": "state",
+    "split": {
+        "column": "type_of_incident",
+        "derive": get_injury_illness_split,
+        "values": ["injury", "illness"],
+    },
+    "facets": {
+        "victim-injury-bar": {
+            "column": "incident_outcome",
+            "labels": OSHA_INCIDENT_OUTCOMES,
+            "title": "Incident Outcome",
+        },
+        "site-category-bar": {
+            "column": "type_of_incident",
+            "labels": OSHA_INCIDENT_TYPES,
+            "title": "Incident Type",
+        },
+        "injury-severity-bar": {
+            "column": "size",
+            "labels": OSHA_ESTABLISHMENT_SIZES,
+            "title": "Establishment Size",
+        },
+        "top-sharks-bar": {
+            "column": "industry_description",
+            "title": "Industries With Most Cases",
+        },
+    },
+    # establishments only have a street address, no map
+}
+DATASETS = {
+    "shark": SHARK_DATASET,
+    "railroad": RAILROAD_DATASET,
+    "osha": OSHA_DATASET,
+}
+
+
+def get_role(role) -> dict:
+    """A role as a dict, a plain column name is {"column": name}"""
+    if isinstance(role, str):
+        return {"column": role}
+    return role
+
+
+def get_source_columns(dataset: dict) -> List[str]:
+    """
+    Columns of the source file the adapter reads
+
+    Args:
+        dataset (dict): adapter, see DATASETS
+
+    Returns:
+        List[str]: column names, no duplicates
+    """
+    roles = [dataset["region"], dataset["split"], *dataset["facets"].values()]
+    columns = list(dataset["time"].values())
+    for role in roles:
+        column = get_role(role)["column"]
+        columns.extend([column] if isinstance(column, str) else column)
+    columns.extend(dataset.get("geo", {}).values())
+    return list(dict.fromkeys(columns))
+
+
+def get_dataset_columns(dataset: dict) -> List[str]:
+    """
+    Dashboard columns an adapter provides: the chart and filter columns,
+    the day if it has dates and the coordinates if it has geo
+
+    Args:
+        dataset (dict): adapter, see DATASETS
+
+    Returns:
+        List[str]: column names
+    """
+    columns = get_dashboard_columns()
+    if "day" in dataset["time"] or "date" in dataset["time"]:
+        columns = columns + ["incident_day"]
+    if "geo" in dataset:
+        columns = columns + DASHBOARD_MAP_COLUMNS
+    return columns
+
+
+def get_dataset_path(dataset: dict) -> str:
+    """
+    Source file of an adapter, parquet over csv when both are there
+
+    Args:
+        dataset (dict): adapter, see DATASETS
+
+    Returns:
+        str: path to the file
+    """
+    paths = glob.glob(os.path.join(REPO_DIR, dataset["path"]))
+    for extension in SOURCE_EXTENSIONS:
+        matches = sorted(
+            path
+            for path in paths
+            if os.path.splitext(path)[1].lower() == extension
+        )
+        if matches:
+            return matches[-1]
+    raise FileNotFoundError(
+        f"No data for {dataset['title']}, expected a "
+        f"{' or '.join(SOURCE_EXTENSIONS)} file at {dataset['path']}"
+    )
+
+
+def read_source(path: str, columns: List[str]) -> pd.DataFrame:
+    """Only the given columns of a parquet or csv file"""
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, low_memory=False)
+
+
+def get_role_values(source: pd.DataFrame, role) -> pd.Series:
+    """
+    Values of one role from the source columns
+
+    Args:
+        source (pd.DataFrame): source df
+        role: column name or role dict, see DATASETS
+
+    Returns:
+        pd.Series: value per row
+    """
+    role = get_role(role)
+    values = source[role["column"]]
+    if "derive" in role:
+        values = role["derive"](values)
+    if "labels" not in role:
+        return values
+    if all(isinstance(code, int) for code in role["labels"]):
+        # codes come as numbers or as zero padded text
+        values = pd.to_numeric(values, errors="coerce")
+    return values.map(role["labels"]).fillna("unknown")
+
+
+def get_dashboard_frame(dataset: dict, source: pd.DataFrame) -> pd.DataFrame:
+    """
+    Dashboard columns from the source columns of an adapter, typed like
+    the cleaned shark data. Rows without a year or month are dropped,
+    every chart needs them.
+
+    Args:
+        dataset (dict): adapter, see DATASETS
+        source (pd.DataFrame): source df, see get_source_columns
+
+    Returns:
+        pd.DataFrame: the columns of get_dataset_columns
+    """
+    time = dataset["time"]
+    df = pd.DataFrame(index=source.index)
+    if "date" in time:
+        dates = pd.to_datetime(source[time["date"]], errors="coerce")
+        df["incident_year"] = dates.dt.year
+        df["incident_month"] = dates.dt.month
+    else:
+        df["incident_year"] = pd.to_numeric(
+            source[time["year"]], errors="coerce"
+        )
+        df["incident_month"] = pd.to_numeric(
+            source[time["month"]], errors="coerce"
+        )
+        dates = None
+        if "day" in time:
+            dates = pd.to_datetime(
+                pd.DataFrame(
+                    {
+                        "year": df["incident_year"],
+                        "month": df["incident_month"],
+                        "day": pd.to_numeric(
+                            source[time["day"]], errors="coerce"
+                        ),
+                    }
+                ),
+                errors="coerce",
+            )
+    if dates is not None:
+        # days since 1970-01-01, see TREND_RESOLUTIONS
+        df["incident_day"] = (
+            dates - pd.Timestamp("1970-01-01")
+        ).dt.days.astype(float)
+
+    df["state_names"] = get_role_values(source, dataset["region"])
+    split = dataset["split"]
+    df["provoked_unprovoked"] = get_role_values(source, split).map(
+        dict(zip(split["values"], SPLIT_VALUES))
+    )
+    for graph_id, facet in dataset["facets"].items():
+        df[DASHBOARD_CHARTS[graph_id][0]] = get_role_values(source, facet)
+
+    if "geo" in dataset:
+        latitude = parse_coordinates(source[dataset["geo"]["latitude"]])
+        longitude = parse_coordinates(source[dataset["geo"]["longitude"]])
+        # 0, 0 and out of range are how missing locations are written
+        valid = (
+            latitude.between(-90, 90)
+            & longitude.between(-180, 180)
+            & ~((latitude == 0) & (longitude == 0))
+        )
+        df["latitude"] = latitude.where(valid)
+        df["longitude"] = longitude.where(valid)
+
+    df = df.dropna(subset=["incident_year", "incident_month"])
+    return apply_data_schema(df.reset_index(drop=True))
+
+
+def prepare_dataset(
+    dataset: dict,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Dashboard columns of a dataset as memory mapped codes + values. The
+    first load reads the role columns of the source and builds the
+    columnar store next to it, later loads only map the files.
+
+    Args:
+        dataset (dict): adapter, see DATASETS
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: codes per
+            row (-1 = missing) and sorted values, per column
+    """
+    path = get_dataset_path(dataset)
+    return prepare_columnar_data(
+        path,
+        get_dataset_columns(dataset),
+        read_frame=lambda path: get_dashboard_frame(
+            dataset, read_source(path, get_source_columns(dataset))
+        ),
+    )
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import plotly.io as pio
+from dash import Patch
+
+# Trace properties that change with the filters. Everything else in a
+# figure (layout, colors, trace names) only depends on the chart and mode.
+DATA_KEYS = ("x", "y")
+
+
+def serialize_figure(figure) -> dict:
+    """
+    JSON ready dict of a plotly figure, the form dash sends to the browser
+
+    Args:
+        figure (go.Figure): figure to serialize
+
+    Returns:
+        dict: figure dict with plain python/typed array values
+    """
+    return json.loads(pio.to_json(figure, validate=False))
+
+
+def get_figure_signature(figure: dict) -> str:
+    """
+    Hash of everything in a serialized figure except the trace data.
+    Two figures with the same signature only differ in their x/y arrays.
+
+    Args:
+        figure (dict): serialized figure
+
+    Returns:
+        str: hex digest
+    """
+    static_parts = {
+        "data": [
+            {
+                key: True if key in DATA_KEYS else value
+                for key, value in trace.items()
+            }
+            for trace in figure.get("data", [])
+        ],
+        "layout": figure.get("layout", {}),
+    }
+    return hashlib.sha1(
+        json.dumps(static_parts, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def get_figure_patch(figure: dict) -> Patch:
+    """
+    Patch that turns a figure with the same signature into this one,
+    only the x/y arrays of each trace are sent
+
+    Args:
+        figure (dict): serialized figure
+
+    Returns:
+        Patch: partial update for dcc.Graph.figure
+    """
+    patch = Patch()
+    for trace_number, trace in enumerate(figure.get("data", [])):
+        for key in DATA_KEYS:
+            if key in trace:
+                patch["data"][trace_number][key] = trace[key]
+    return patch
+
+
+def get_size_in_bytes(value) -> int:
+    """Size of a serialized value once encoded as JSON"""
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+class FigureCache:
+    """
+    Thread safe LRU cache for serialized figures, bounded by total size.
+
+    Keys should be canonical (normalized filter state), values are anything
+    JSON serializable. The least recently used entries are evicted until
+    the cache fits in max_bytes, entries bigger than the budget are never
+    stored.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): byte budget for all entries. Defaults to 64MB.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """
+        Cached value for a key, marks it as recently used
+
+        Args:
+            key (Hashable): cache key
+
+        Returns:
+            cached value, None on a miss
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def set(self, key: Hashable, value) -> None:
+        """
+        Store a value, evicting least recently used entries to stay in budget
+
+        Args:
+            key (Hashable): cache key
+            value: JSON serializable value
+        """
+        n_bytes = get_size_in_bytes(value)
+        if n_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, n_bytes)
+            self.current_bytes += n_bytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable):
+        """
+        Cached value for a key, computing and storing it on a miss
+
+        Args:
+            key (Hashable): cache key
+            compute (Callable): no argument function returning the value
+
+        Returns:
+            cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters and memory use
+
+        Returns:
+            dict: hits, misses, hit_rate, evictions, entries, bytes, max_bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
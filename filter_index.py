@@ -0,0 +1,285 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+# Bitmaps are packed into 64 bit words, bit i of the index is row i.
+# Padding bits past the last row are always 0 in every bitmap we store.
+WORD_BITS = 64
+
+
+def pack_bits(mask: np.ndarray) -> np.ndarray:
+    """
+    Pack a boolean row mask into a bitmap of 64 bit words
+
+    Args:
+        mask (np.ndarray): boolean array, one entry per row
+
+    Returns:
+        np.ndarray: uint64 bitmap
+    """
+    n_words = -(-len(mask) // WORD_BITS)
+    padded = np.zeros(n_words * WORD_BITS, dtype=bool)
+    padded[: len(mask)] = mask
+    return np.packbits(padded, bitorder="little").view(np.uint64)
+
+
+def unpack_bits(bitmap: np.ndarray, n_rows: int) -> np.ndarray:
+    """
+    Unpack a bitmap back into a boolean row mask
+
+    Args:
+        bitmap (np.ndarray): uint64 bitmap
+        n_rows (int): number of rows the bitmap covers
+
+    Returns:
+        np.ndarray: boolean array of length n_rows
+    """
+    return np.unpackbits(
+        bitmap.view(np.uint8), count=n_rows, bitorder="little"
+    ).view(bool)
+
+
+def get_codes_and_categories(
+    series: pd.Series,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Integer codes and their (sorted) values for a column.
+    Missing values get the code -1.
+
+    Args:
+        series (pd.Series): column to encode
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: codes per row, value per code
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if not series.cat.ordered:
+            series = series.cat.reorder_categories(
+                series.cat.categories.sort_values()
+            )
+        return (
+            series.cat.codes.to_numpy(),
+            series.cat.categories.to_numpy(),
+        )
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, np.asarray(categories)
+
+
+class FilterIndex:
+    """
+    Precomputed bitmap index for cross filtering.
+
+    Categorical columns keep one bitmap per value, so an isin filter is an
+    OR of a few bitmaps. Range columns (years) are bit sliced: one bitmap per
+    bit of the sorted value code, so a between filter costs ~2 * bits ANDs
+    no matter how many values fall in the range.
+    A whole filter combination is then an AND of the column bitmaps.
+    """
+
+    def __init__(
+        self,
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, np.ndarray],
+        range_columns: List[str] = None,
+    ):
+        """
+        Args:
+            codes (Dict[str, np.ndarray]): integer codes per column, -1 = missing
+            categories (Dict[str, np.ndarray]): sorted value of each code
+            range_columns (List[str]): columns queried with between().
+                Defaults to None.
+        """
+        range_columns = range_columns or []
+        self.n_rows = len(next(iter(codes.values()))) if codes else 0
+        self.categories = categories
+        self.all_rows = pack_bits(np.ones(self.n_rows, dtype=bool))
+
+        self.value_bitmaps = {}
+        self.value_lookup = {}
+        self.bit_slices = {}
+        self.exists = {}
+        self.complete = {}
+        for column_name, column_codes in codes.items():
+            self.value_lookup[column_name] = {
+                value: code
+                for code, value in enumerate(categories[column_name].tolist())
+            }
+            self.exists[column_name] = pack_bits(column_codes >= 0)
+            self.complete[column_name] = bool(np.all(column_codes >= 0))
+            if column_name in range_columns:
+                self._add_bit_slices(column_name, column_codes)
+            else:
+                self.value_bitmaps[column_name] = [
+                    pack_bits(column_codes == code)
+                    for code in range(len(categories[column_name]))
+                ]
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        columns: List[str],
+        range_columns: List[str] = None,
+    ) -> "FilterIndex":
+        """
+        Build the index for some columns of a df
+
+        Args:
+            df (pd.DataFrame): df to index, row order is kept
+            columns (List[str]): categorical filter columns
+            range_columns (List[str]): numeric columns filtered by range.
+                Defaults to None.
+
+        Returns:
+            FilterIndex: the index
+        """
+        range_columns = range_columns or []
+        codes, categories = {}, {}
+        for column_name in list(columns) + list(range_columns):
+            codes[column_name], categories[column_name] = (
+                get_codes_and_categories(df[column_name])
+            )
+        return cls(codes, categories, range_columns)
+
+    def _add_bit_slices(self, column_name: str, column_codes: np.ndarray):
+        n_bits = max(
+            int(len(self.categories[column_name]) - 1).bit_length(), 1
+        )
+        safe_codes = np.where(column_codes >= 0, column_codes, 0)
+        self.bit_slices[column_name] = [
+            pack_bits((safe_codes >> bit) & 1 == 1) for bit in range(n_bits)
+        ]
+
+    def _less_equal(self, column_name: str, code: int) -> np.ndarray:
+        # O'Neil & Quass bit sliced comparison, walks from the top bit down
+        exists = self.exists[column_name]
+        if code < 0:
+            return np.zeros_like(exists)
+        if code >= len(self.categories[column_name]) - 1:
+            return exists.copy()
+        less = np.zeros_like(exists)
+        equal = exists.copy()
+        for bit in reversed(range(len(self.bit_slices[column_name]))):
+            bit_slice = self.bit_slices[column_name][bit]
+            if (code >> bit) & 1:
+                less |= equal & ~bit_slice
+                equal &= bit_slice
+            else:
+                equal &= ~bit_slice
+        return less | equal
+
+    def isin(self, column_name: str, values: list) -> np.ndarray:
+        """
+        Bitmap of the rows whose value is in values.
+        Values that don't exist in the column are ignored.
+
+        Args:
+            column_name (str): indexed categorical column
+            values (list): accepted values
+
+        Returns:
+            np.ndarray: uint64 bitmap
+        """
+        lookup = self.value_lookup[column_name]
+        value_codes = {lookup[value] for value in values if value in lookup}
+        if len(value_codes) == len(lookup):
+            return self.exists[column_name].copy()
+        bitmap = np.zeros_like(self.all_rows)
+        for code in value_codes:
+            bitmap |= self.value_bitmaps[column_name][code]
+        return bitmap
+
+    def between(self, column_name: str, low, high) -> np.ndarray:
+        """
+        Bitmap of the rows with low <= value <= high
+
+        Args:
+            column_name (str): indexed range column
+            low: lower bound, inclusive
+            high: upper bound, inclusive
+
+        Returns:
+            np.ndarray: uint64 bitmap
+        """
+        categories = self.categories[column_name]
+        low_code = int(np.searchsorted(categories, low, side="left"))
+        high_code = int(np.searchsorted(categories, high, side="right")) - 1
+        if high_code < low_code:
+            return np.zeros_like(self.all_rows)
+        return self._less_equal(column_name, high_code) & ~self._less_equal(
+            column_name, low_code - 1
+        )
+
+    def normalize(
+        self,
+        isin: Dict[str, list] = None,
+        between: Dict[str, Tuple] = None,
+    ) -> Tuple[Dict[str, list], Dict[str, list]]:
+        """
+        Canonical form of a filter combination, usable as a cache key.
+        Values that don't exist are dropped and the rest sorted, ranges are
+        snapped to existing values, and filters that keep every row are
+        removed. Selecting with the result gives the same rows.
+
+        Args:
+            isin (Dict[str, list]): column -> accepted values. Defaults to None.
+            between (Dict[str, Tuple]): column -> (low, high). Defaults to None.
+
+        Returns:
+            Tuple[Dict[str, list], Dict[str, list]]: normalized isin and
+                between, with plain python values
+        """
+        normalized_isin = {}
+        for column_name, values in (isin or {}).items():
+            lookup = self.value_lookup[column_name]
+            value_codes = sorted(
+                {lookup[value] for value in values if value in lookup}
+            )
+            if len(value_codes) == len(lookup) and self.complete[column_name]:
+                continue
+            normalized_isin[column_name] = self.categories[column_name][
+                value_codes
+            ].tolist()
+
+        normalized_between = {}
+        for column_name, (low, high) in (between or {}).items():
+            categories = self.categories[column_name]
+            low_code = int(np.searchsorted(categories, low, side="left"))
+            high_code = (
+                int(np.searchsorted(categories, high, side="right")) - 1
+            )
+            if high_code < low_code:
+                # nothing in range, any empty range will do
+                normalized_between[column_name] = [1, 0]
+            elif (
+                low_code > 0
+                or high_code < len(categories) - 1
+                or not self.complete[column_name]
+            ):
+                normalized_between[column_name] = [
+                    categories[low_code].item(),
+                    categories[high_code].item(),
+                ]
+        return normalized_isin, normalized_between
+
+    def select(
+        self,
+        isin: Dict[str, list] = None,
+        between: Dict[str, Tuple] = None,
+    ) -> np.ndarray:
+        """
+        Rows matching every filter
+
+        Args:
+            isin (Dict[str, list]): column -> accepted values. Defaults to None.
+            between (Dict[str, Tuple]): column -> (low, high). Defaults to None.
+
+        Returns:
+            np.ndarray: boolean row mask
+        """
+        bitmap = self.all_rows.copy()
+        for column_name, values in (isin or {}).items():
+            bitmap &= self.isin(column_name, values)
+        for column_name, (low, high) in (between or {}).items():
+            bitmap &= self.between(column_name, low, high)
+        return unpack_bits(bitmap, self.n_rows)
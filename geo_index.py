@@ -0,0 +1,449 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+from common_functions import count_codes, get_marginal_frame
+from filter_index import FilterIndex
+
+# Web mercator tiles, like the map tiles: at level z the world is
+# 2**z x 2**z tiles, a map at zoom z draws them 256px wide. Every located
+# row keeps its tile at MAX_LEVEL (~2m) as one morton code (x and y bits
+# interleaved), and rows are sorted by it. Dropping the last 2 * k bits
+# gives the tile k levels up, and the rows of any tile at any level are
+# one contiguous run: a quadtree with nothing to store but the order.
+MAX_LEVEL = 24
+MAX_LATITUDE = 85.05112878
+# Bins are drawn 2**BIN_LEVEL_OFFSET times smaller than a tile, ~32px
+BIN_LEVEL_OFFSET = 3
+# Upper bound on the bins sent for one view, coarser levels past that
+MAX_BINS = 2000
+# A lasso is covered by about this many tiles across: rows of tiles
+# inside it are taken whole, only the tiles its edges cross are tested
+POLYGON_GRID_TILES = 64
+# Up to this many edges (a box) every point is tested against every
+# edge, sorting the points first only pays off for more
+FEW_EDGES = 8
+
+
+def get_mercator_coordinates(
+    latitude: np.ndarray, longitude: np.ndarray, level: int = MAX_LEVEL
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Web mercator x/y of coordinates, in tiles of a zoom level
+
+    Args:
+        latitude (np.ndarray): degrees, clipped to the mercator range
+        longitude (np.ndarray): degrees, -180..180
+        level (int): tile level. Defaults to MAX_LEVEL.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: float x and y, y grows southwards
+    """
+    n_tiles = 2**level
+    latitude = np.radians(np.clip(latitude, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(longitude, dtype=float) + 180) / 360 * n_tiles
+    y = (1 - np.arcsinh(np.tan(latitude)) / np.pi) / 2 * n_tiles
+    return x, y
+
+
+def get_tile_coordinates(
+    latitude: np.ndarray, longitude: np.ndarray, level: int = MAX_LEVEL
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Web mercator tile x/y of coordinates at a zoom level
+
+    Args:
+        latitude (np.ndarray): degrees, clipped to the mercator range
+        longitude (np.ndarray): degrees, -180..180
+        level (int): tile level. Defaults to MAX_LEVEL.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: uint32 tile x and y
+    """
+    n_tiles = 2**level
+    x, y = get_mercator_coordinates(latitude, longitude, level)
+    return (
+        np.clip(x, 0, n_tiles - 1).astype(np.uint32),
+        np.clip(y, 0, n_tiles - 1).astype(np.uint32),
+    )
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """Put the bits of 32 bit values on the even bits of 64 bit ones"""
+    spread = values.astype(np.uint64)
+    for shift, bit_mask in [
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ]:
+        spread = (spread | (spread << np.uint64(shift))) & np.uint64(bit_mask)
+    return spread
+
+
+def get_quadkeys(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Morton codes of tiles, sorting by them sorts tiles along a z curve,
+    so every parent tile covers a contiguous range of its children
+
+    Args:
+        x (np.ndarray): tile x
+        y (np.ndarray): tile y
+
+    Returns:
+        np.ndarray: uint64 codes
+    """
+    return spread_bits(x) | (spread_bits(y) << np.uint64(1))
+
+
+def points_in_polygon(
+    x: np.ndarray, y: np.ndarray, polygon_x: np.ndarray, polygon_y: np.ndarray
+) -> np.ndarray:
+    """
+    Even-odd ray casting. For polygons with many edges (a lasso) points
+    are sorted by y once, so every edge only looks at the slice of points
+    within its own y range instead of all.
+
+    Args:
+        x (np.ndarray): point x
+        y (np.ndarray): point y
+        polygon_x (np.ndarray): vertex x, the polygon closes itself
+        polygon_y (np.ndarray): vertex y
+
+    Returns:
+        np.ndarray: boolean mask of the points inside
+    """
+    if len(polygon_x) <= FEW_EDGES:
+        inside = np.zeros(len(x), dtype=bool)
+        for start in range(len(polygon_x)):
+            x1, y1 = polygon_x[start - 1], polygon_y[start - 1]
+            x2, y2 = polygon_x[start], polygon_y[start]
+            if y1 != y2:
+                inside ^= ((y1 > y) != (y2 > y)) & (
+                    x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                )
+        return inside
+
+    order = np.argsort(y, kind="stable")
+    sorted_x, sorted_y = x[order], y[order]
+    start_x, start_y = np.roll(polygon_x, 1), np.roll(polygon_y, 1)
+    # points with min(y1, y2) <= y < max(y1, y2) cross the edge's row
+    lows = np.searchsorted(sorted_y, np.minimum(start_y, polygon_y))
+    highs = np.searchsorted(sorted_y, np.maximum(start_y, polygon_y))
+    slopes = (polygon_x - start_x) / np.where(
+        polygon_y != start_y, polygon_y - start_y, 1
+    )
+    inside = np.zeros(len(x), dtype=bool)
+    for edge in np.flatnonzero(highs > lows):
+        low, high = lows[edge], highs[edge]
+        inside[low:high] ^= (
+            sorted_x[low:high]
+            < start_x[edge]
+            + (sorted_y[low:high] - start_y[edge]) * slopes[edge]
+        )
+    result = np.empty(len(x), dtype=bool)
+    result[order] = inside
+    return result
+
+
+def get_range_positions(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Every position of several [start, end) ranges, without a loop"""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def get_bin_level(zoom: float) -> int:
+    """Tile level of the bins for a map zoom, see BIN_LEVEL_OFFSET"""
+    return int(np.clip(np.floor(zoom) + BIN_LEVEL_OFFSET, 0, MAX_LEVEL))
+
+
+def get_view_tiles(
+    bounds: Tuple[float, float, float, float], level: int
+) -> Tuple[int, int, int, int]:
+    """
+    Tiles of a level covering a map view. Whole tiles, so the bins at the
+    edge of the view have their full count, and views that only moved
+    within the same tiles give the same result (and cache key).
+
+    Args:
+        bounds (Tuple[float, float, float, float]): west, south, east,
+            north in degrees
+        level (int): tile level
+
+    Returns:
+        Tuple[int, int, int, int]: first and last tile x, first and last
+            tile y (north to south)
+    """
+    west, south, east, north = bounds
+    (west_x, east_x), (north_y, south_y) = get_tile_coordinates(
+        np.array([north, south]), np.array([west, east]), level
+    )
+    return int(west_x), int(east_x), int(north_y), int(south_y)
+
+
+class GeoIndex:
+    """
+    Quadtree over the incident locations, for counts per map bin.
+
+    Rows without a location are left out. The filter columns are indexed
+    for the located rows in their sorted order (a FilterIndex), so the
+    dashboard selection applies to the map like to every chart, and the
+    bins of a view are a single pass over the selected rows.
+    """
+
+    def __init__(
+        self,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, np.ndarray],
+        range_columns: List[str] = None,
+    ):
+        """
+        Args:
+            latitude (np.ndarray): degrees per row, NaN = unknown
+            longitude (np.ndarray): degrees per row, NaN = unknown
+            codes (Dict[str, np.ndarray]): integer codes per row of the
+                filter columns, -1 = missing
+            categories (Dict[str, np.ndarray]): sorted value of each code
+            range_columns (List[str]): columns filtered by range.
+                Defaults to None.
+        """
+        latitude = np.asarray(latitude, dtype=float)
+        longitude = np.asarray(longitude, dtype=float)
+        located = np.flatnonzero(~(np.isnan(latitude) | np.isnan(longitude)))
+        x, y = get_tile_coordinates(latitude[located], longitude[located])
+        quadkeys = get_quadkeys(x, y)
+        order = np.argsort(quadkeys, kind="stable")
+
+        # row ids into the full data, in quadtree order
+        self.row_ids = located[order]
+        self.quadkeys = quadkeys[order]
+        self.x, self.y = x[order], y[order]
+        self.latitude = latitude[self.row_ids]
+        self.longitude = longitude[self.row_ids]
+        self.n_rows = len(self.row_ids)
+        self.codes = {
+            column_name: np.asarray(column_codes)[self.row_ids]
+            for column_name, column_codes in codes.items()
+        }
+        self.categories = categories
+        self.index = FilterIndex(self.codes, categories, range_columns)
+
+    def select(
+        self,
+        isin: Dict[str, list] = None,
+        between: Dict[str, Tuple] = None,
+        view_tiles: Tuple[int, int, int, int] = None,
+        level: int = MAX_LEVEL,
+    ) -> np.ndarray:
+        """
+        Located rows matching every filter and inside the map view
+
+        Args:
+            isin (Dict[str, list]): column -> accepted values.
+                Defaults to None.
+            between (Dict[str, Tuple]): column -> (low, high).
+                Defaults to None.
+            view_tiles (Tuple[int, int, int, int]): tiles of the view at
+                level, see get_view_tiles. Defaults to None (the world).
+            level (int): level of view_tiles. Defaults to MAX_LEVEL.
+
+        Returns:
+            np.ndarray: boolean mask over the rows in quadtree order
+        """
+        mask = self.index.select(isin=isin, between=between)
+        if view_tiles is None:
+            return mask
+        shift = MAX_LEVEL - level
+        west_x, east_x, north_y, south_y = view_tiles
+        x, y = self.x >> shift, self.y >> shift
+        mask &= (y >= north_y) & (y <= south_y)
+        if west_x <= east_x:
+            mask &= (x >= west_x) & (x <= east_x)
+        else:
+            # view across the antimeridian
+            mask &= (x >= west_x) | (x <= east_x)
+        return mask
+
+    def bins(
+        self, mask: np.ndarray, level: int, max_bins: int = MAX_BINS
+    ) -> pd.DataFrame:
+        """
+        Incident count and mean location per tile of a level, over the
+        selected rows. Coarser levels are used until there are at most
+        max_bins, so the size of the result doesn't grow with the data.
+
+        Args:
+            mask (np.ndarray): boolean mask from select()
+            level (int): tile level, see get_bin_level
+            max_bins (int): most bins returned. Defaults to MAX_BINS.
+
+        Returns:
+            pd.DataFrame: latitude, longitude and count per bin
+        """
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return pd.DataFrame({"latitude": [], "longitude": [], "count": []})
+        quadkeys = self.quadkeys[rows]
+        for bin_level in range(min(level, MAX_LEVEL), -1, -1):
+            # rows stay sorted by tile, so a tile starts where the key changes
+            tiles = quadkeys >> np.uint64(2 * (MAX_LEVEL - bin_level))
+            starts = np.flatnonzero(
+                np.concatenate([[True], tiles[1:] != tiles[:-1]])
+            )
+            if len(starts) <= max_bins:
+                break
+        counts = np.diff(np.append(starts, len(rows)))
+        return pd.DataFrame(
+            {
+                "latitude": np.add.reduceat(self.latitude[rows], starts)
+                / counts,
+                "longitude": np.add.reduceat(self.longitude[rows], starts)
+                / counts,
+                "count": counts,
+            }
+        )
+
+    def select_polygon(self, polygon: List[Tuple[float, float]]) -> np.ndarray:
+        """
+        Rows inside a lasso or box drawn on the map. The polygon is
+        covered by a grid of tiles (POLYGON_GRID_TILES across): tiles that
+        no edge touches are either fully in or out, so the rows of the
+        inside ones are taken as whole quadtree runs, and only the rows
+        of tiles under an edge are tested against the polygon.
+
+        Args:
+            polygon (List[Tuple[float, float]]): lon/lat vertices, straight
+                edges on the map (mercator)
+
+        Returns:
+            np.ndarray: sorted positions of the rows, in quadtree order
+                (row_ids maps them to rows of the data)
+        """
+        if len(polygon) < 3 or self.n_rows == 0:
+            return np.zeros(0, dtype=np.int64)
+        longitude, latitude = np.asarray(polygon, dtype=float).T
+        polygon_x, polygon_y = get_mercator_coordinates(latitude, longitude)
+
+        # tile size (in MAX_LEVEL tiles) for the polygon to span the grid
+        span = max(np.ptp(polygon_x), np.ptp(polygon_y), 1.0)
+        shift = int(
+            np.clip(np.ceil(np.log2(span / POLYGON_GRID_TILES)), 0, MAX_LEVEL)
+        )
+        tile_size = 2**shift
+        n_tiles = 2 ** (MAX_LEVEL - shift)
+        first_x = int(np.clip(polygon_x.min() // tile_size, 0, n_tiles - 1))
+        first_y = int(np.clip(polygon_y.min() // tile_size, 0, n_tiles - 1))
+        last_x = int(np.clip(polygon_x.max() // tile_size, 0, n_tiles - 1))
+        last_y = int(np.clip(polygon_y.max() // tile_size, 0, n_tiles - 1))
+
+        # tiles under an edge: edges are cut in pieces no longer than a
+        # tile, so each piece touches at most the 2 x 2 tiles of its ends
+        on_edge = np.zeros(
+            (last_y - first_y + 1, last_x - first_x + 1), dtype=bool
+        )
+        end_x, end_y = polygon_x / tile_size, polygon_y / tile_size
+        start_x, start_y = np.roll(end_x, 1), np.roll(end_y, 1)
+        n_pieces = 1 + np.ceil(
+            np.maximum(np.abs(end_x - start_x), np.abs(end_y - start_y))
+        ).astype(np.int64)
+        edges = np.repeat(np.arange(len(polygon)), n_pieces)
+        piece_numbers = get_range_positions(
+            np.zeros(len(polygon), dtype=np.int64), n_pieces
+        )
+        piece_ends = []
+        for fraction in [
+            piece_numbers / n_pieces[edges],
+            (piece_numbers + 1) / n_pieces[edges],
+        ]:
+            piece_x = start_x[edges] + fraction * (end_x - start_x)[edges]
+            piece_y = start_y[edges] + fraction * (end_y - start_y)[edges]
+            piece_ends.append(
+                (
+                    np.clip(np.floor(piece_x), first_x, last_x) - first_x,
+                    np.clip(np.floor(piece_y), first_y, last_y) - first_y,
+                )
+            )
+        for _, piece_y in piece_ends:
+            for piece_x, _ in piece_ends:
+                on_edge[piece_y.astype(np.int64), piece_x.astype(np.int64)] = (
+                    True
+                )
+
+        tile_y, tile_x = np.indices(on_edge.shape)
+        tile_x, tile_y = tile_x.ravel() + first_x, tile_y.ravel() + first_y
+        on_edge = on_edge.ravel()
+        inside = np.zeros(len(on_edge), dtype=bool)
+        inside[~on_edge] = points_in_polygon(
+            (tile_x[~on_edge] + 0.5) * tile_size,
+            (tile_y[~on_edge] + 0.5) * tile_size,
+            polygon_x,
+            polygon_y,
+        )
+
+        # every row of the grid tiles in quadtree order (tiles sorted by
+        # key are runs in order), kept if its tile is inside or it is
+        tiles = np.flatnonzero(inside | on_edge)
+        first_keys = get_quadkeys(tile_x[tiles], tile_y[tiles]) << np.uint64(
+            2 * shift
+        )
+        tile_order = np.argsort(first_keys)
+        tiles, first_keys = tiles[tile_order], first_keys[tile_order]
+        starts = np.searchsorted(self.quadkeys, first_keys)
+        ends = np.searchsorted(self.quadkeys, first_keys + np.uint64(4**shift))
+        positions = get_range_positions(starts, ends)
+        keep = np.repeat(inside[tiles], ends - starts)
+        candidates = np.flatnonzero(~keep)
+        candidate_x, candidate_y = get_mercator_coordinates(
+            self.latitude[positions[candidates]],
+            self.longitude[positions[candidates]],
+        )
+        keep[candidates] = points_in_polygon(
+            candidate_x, candidate_y, polygon_x, polygon_y
+        )
+        return positions[keep]
+
+    def marginals(
+        self,
+        dimensions: List[str],
+        rows: np.ndarray = None,
+        split: str = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Incident count per category of several dimensions over some
+        located rows, like CountCube.marginals but per row
+
+        Args:
+            dimensions (List[str]): dimensions to count
+            rows (np.ndarray): boolean mask or positions of the rows, in
+                quadtree order. Defaults to None (every located row).
+            split (str): dimension to split the counts by.
+                Defaults to None.
+
+        Returns:
+            Dict[str, pd.DataFrame]: marginal df per dimension, see
+                get_marginal_frame
+        """
+        if rows is None:
+            rows = np.arange(self.n_rows)
+        split_categories = None
+        split_codes = None
+        if split is not None:
+            split_categories = self.categories[split]
+            split_codes = self.codes[split][rows]
+
+        counts = count_codes(
+            {dim: self.codes[dim][rows] for dim in dimensions},
+            {dim: len(self.categories[dim]) for dim in dimensions},
+            split_codes=split_codes,
+            n_split=len(split_categories) if split is not None else 1,
+        )
+        return {
+            dim: get_marginal_frame(
+                counts[dim], self.categories[dim], dim, split_categories
+            )
+            for dim in dimensions
+        }
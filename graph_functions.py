@@ -8,24 +8,24 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-from plotly.subplots import make_subplots
-import re
+from common_functions import bucket_values, get_top_n_with_others
 
 
 # Setup functions for common plot functions
 def get_top_victim_activities(local_df, top_index) -> pd.DataFrame:
+    # Returns a copy, the df passed in is shared by the other charts
     top_activities = (
         local_df["victim_activity"].value_counts().index[:top_index]
     )
-    print(top_activities)
-    local_df["victim_activity"] = local_df["victim_activity"].apply(
-        lambda x: x if x in top_activities else "unknown"
+    victim_activity = bucket_values(
+        local_df["victim_activity"], top_activities, "unknown"
     )
-    local_df["victim_activity_updated"] = np.nan
-    local_df["victim_activity_updated"] = local_df["victim_activity"].apply(
-        lambda x: (x if x in top_activities else "other_activities")
+    return local_df.assign(
+        victim_activity=victim_activity,
+        victim_activity_updated=bucket_values(
+            victim_activity, top_activities, "other_activities"
+        ),
     )
-    return local_df
 
 
 def prepare_incident_data(df):
@@ -217,6 +217,10 @@ def create_subplots_monthly_incident(
     Returns:
         go.Figure: The Plotly subplots figure.
     """
+    # Imported here, plotly.subplots is slow to import and only this chart
+    # needs it
+    from plotly.subplots import make_subplots
+
     injury_types = ["fatal", "injured", "uninjured", "unknown"]
     color_map = {
         "fatal": "#ab47bc",
@@ -354,40 +358,15 @@ def create_top_sharks_chart(df) -> px.bar:
     Returns:
         px.bar: The Plotly bar chart figure.
     """
-    shark_counts = df["shark_common_name"].value_counts().reset_index()
-    shark_counts.columns = ["shark_common_name", "count"]
-
-    top_5_sharks = shark_counts.head(7)
-    others = shark_counts.iloc[7:]
-    num_others = others["shark_common_name"].nunique()
-    others_count = others["count"].sum()
-    others_row = pd.DataFrame(
-        [
-            {
-                "shark_common_name": f"others: {num_others} types",
-                "count": others_count,
-            }
-        ]
+    shark_counts = df["shark_common_name"].value_counts()
+    names, counts, hover_text, _ = get_top_n_with_others(
+        shark_counts.index.to_numpy(),
+        shark_counts.to_numpy(),
+        7,
+        always_add_others=True,
     )
-    top_5_sharks = pd.concat([top_5_sharks, others_row], ignore_index=True)
-
-    others_text = "<br>".join(
-        [
-            f"{row['shark_common_name']}: {row['count']} incidents"
-            for _, row in others.iterrows()
-        ]
-    )
-
-    top_5_sharks.loc[
-        top_5_sharks["shark_common_name"] == f"others: {num_others} types",
-        "hover_text",
-    ] = others_text
-
-    top_5_sharks["hover_text"] = top_5_sharks["hover_text"].fillna(
-        top_5_sharks["shark_common_name"]
-        + ": "
-        + top_5_sharks["count"].astype(str)
-        + " incidents"
+    top_5_sharks = pd.DataFrame(
+        {"shark_common_name": names, "count": counts, "hover_text": hover_text}
     )
 
     colors = [
@@ -588,12 +567,11 @@ def compare_victim_activity_vs_provoked(df: pd.DataFrame) -> go.Figure:
         go.Figure: A Plotly figure object representing the grouped bar chart.
     """
 
-    df["victim_activity_updated"] = np.nan
-    df["victim_activity_updated"] = df["victim_activity"].apply(
-        lambda x: (
-            x
-            if x
-            in [
+    # New df, don't add columns to the one shared by the other charts
+    df = df[["provoked_unprovoked"]].assign(
+        victim_activity_updated=bucket_values(
+            df["victim_activity"],
+            [
                 "swimming",
                 "boarding",
                 "snorkelling",
@@ -602,8 +580,8 @@ def compare_victim_activity_vs_provoked(df: pd.DataFrame) -> go.Figure:
                 "fishing",
                 "unknown",
                 "unmotorised boating",
-            ]
-            else "other_activities"
+            ],
+            "other_activities",
         )
     )
 
@@ -775,6 +753,50 @@ def create_grouped_bar_chart(
     return bar_graph
 
 
+def create_custom_grouped_bar_chart(
+    df, x_col, y_col, color_col, title, x_label, y_label
+):
+    """
+    Grouped bar chart of the incident counts, with the user's own title
+    and axis labels (Custom Grouped Bar Charts page).
+
+    Parameters:
+        df (pd.DataFrame): The input DataFrame containing data.
+        x_col (str): The column to use for the x-axis.
+        y_col (str): The y-axis column, "count".
+        color_col (str): The column to use for bar colors.
+        title (str): The title of the chart.
+        x_label (str): The label for the x-axis.
+        y_label (str): The label for the y-axis.
+
+    Returns:
+        go.Figure: The Plotly bar chart figure.
+    """
+    bar_chart_data = (
+        df.groupby([x_col, color_col]).size().reset_index(name="count")
+    )
+
+    fig = px.bar(
+        bar_chart_data,
+        x=x_col,
+        y=y_col,
+        color=color_col,
+        title=title,
+        labels={x_col: x_label, y_col: y_label, color_col: "Category"},
+        barmode="group",
+        color_discrete_sequence=px.colors.qualitative.Safe,
+    )
+
+    fig.update_layout(
+        font=dict(color="#00796b", size=12),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=False),
+    )
+    return fig
+
+
 def line_chart_on_category(df, category_col, time_col):
     custom_data = (
         df.groupby([time_col, category_col])
@@ -0,0 +1,29 @@
+"""
+Multi worker gunicorn config for the dashboard:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+preload_app builds the app (data, count cube) once in the master, the
+workers are forked from it and share those pages copy on write. Each worker
+still keeps its own figure cache of FIGURE_CACHE_MB.
+
+The callbacks are CPU bound, so scale with workers rather than threads.
+Override with the usual env vars:
+    WEB_CONCURRENCY   number of workers, default 2 * cores + 1
+    GUNICORN_THREADS  threads per worker, default 1
+    PORT              default 8080
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = True
+timeout = 60
+# Restart workers now and then, bounds any slow memory growth
+max_requests = 10000
+max_requests_jitter = 1000
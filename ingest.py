@@ -0,0 +1,839 @@
+"""
+Incremental ingestion of the raw Australian Shark-Incident Database (xlsx)
+into the cleaned csvs in data/.
+
+The cleaning is the one from analysis/1_explore.ipynb (sanitized column
+names and labels, state names, site categories, shark behaviour groups,
+month_year) which gives data/filtered_cleaned_shark_data.csv (streamlit
+app), followed by the relabelling that gives
+data/new_cleaned_updated_data.csv (dash app). Every step only looks at
+its own row, so rows are cleaned independently: the cleaned rows are
+kept in a state file with a hash of their raw row, and a new release
+only cleans the rows whose uin is new or whose raw values changed.
+
+The dash data is written together with its feather cache and columnar
+store, so the dashboard maps it straight away instead of parsing the csv.
+
+Usage (from the repo root):
+    python ingest.py
+    python ingest.py --xlsx "path/to/new release.xlsx"
+    python ingest.py --full
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+from columnar_store import (
+    get_store_path,
+    read_store_meta,
+    write_columnar_store,
+)
+from common_functions import (
+    DASHBOARD_MAP_COLUMNS,
+    apply_data_schema,
+    get_cache_path,
+    get_dashboard_columns,
+    get_file_hash,
+    is_source_unchanged,
+    write_data_cache,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+RAW_DATA_PATH = os.path.join(
+    DATA_DIR, "Australian Shark-Incident Database Public Version.xlsx"
+)
+RAW_SHEET_NAME = "ASID"
+CLEANED_DATA_PATH = os.path.join(DATA_DIR, "filtered_cleaned_shark_data.csv")
+DASHBOARD_DATA_PATH = os.path.join(DATA_DIR, "new_cleaned_updated_data.csv")
+STATE_PATH = os.path.join(DATA_DIR, "ingest_state.feather")
+
+STATE_NAMES = {
+    "NSW": "New South Wales",
+    "WA": "Western Australia",
+    "TAS": "Tasmania",
+    "SA": "South Australia",
+    "QLD": "Queensland",
+    "VIC": "Victoria",
+    "NT": "Northern Territory",
+}
+# clean label -> raw shark_behaviour values, anything else is sanitized
+SHARK_BEHAVIOUR_GENERIC_MAPPING = {
+    "bit arm": [
+        "bit victim on arm",
+        "bit victim's arm",
+        "bit victim on arms",
+        "bit arm",
+        "bit victim on right arm",
+        "bit victim on left arm",
+        "bit forearm",
+        "bit hand & arm",
+        "bit victim on shoulder/arm",
+        "bit arm & board while resting",
+        "bite arm",
+    ],
+    "bit leg": [
+        "bit victim on leg",
+        "bit victim on leg - thigh",
+        "bit victim on thigh",
+        "bit victim on thigh & arm",
+        "bit victim on thigh while sitting on board",
+        "bit legs",
+        "bit leg off",
+        "bit leg - thigh",
+        "bit leg - left",
+        "bit victim on left leg",
+        "bit victim on right thigh",
+        "bit victim on upper thigh & torso",
+        "bit leg twice",
+        "bit victim s legs",
+        "bit victims leg",
+        "bit victims leg off",
+        "bit victim on leg - knee",
+    ],
+    "bit torso": [
+        "bit victim on torso",
+        "bit torso",
+        "bit victim on chest",
+        "bit victim on chest ",
+        "bit victim on torso & arm",
+        "bit diver on torso",
+    ],
+    "bit shoulder": [
+        "bit victim on shoulder",
+        "bit victim on shoulder & head",
+        "bit shoulder",
+        "bit victim on left arm & shoulder",
+    ],
+    "bit head": [
+        "bit head",
+        "bit victims head",
+        "bit victim on head",
+        "bit victim on head ",
+        "bit victim on head & chest",
+    ],
+    "bit foot": [
+        "bit victim on foot",
+        "bit victim on left foot",
+        "bit victim on flipper / foot",
+        "bit victim on ankle",
+        "bit foot",
+        "bit victim on knee",
+    ],
+    "bit multiple times": [
+        "bit victim multiple times",
+        "bit victim mutliple times",
+        "multiple bites",
+    ],
+    "bit other": [
+        "bit victim on back",
+        "bit victim on body",
+        "bit victim on body - buttock",
+        "bit victim on hip",
+        "bit victim on stomach",
+        "bit victim on face",
+        "bit victim on buttock",
+    ],
+    "grazed": [
+        "grazed leg with fin",
+        "grazed leg",
+        "grazed victim with fin",
+        "grazed victim on leg",
+        "grazed victim skin",
+        "grazed by close pass",
+        "grazed victim w/skin",
+    ],
+    "bumped": [
+        "bumped hull of craft",
+        "bumped canoe with nose",
+        "bumped victim with nose",
+        "bumped victim",
+        "bumped victim on arm",
+        "bumped board with nose",
+        "bumped board",
+        "bumped surfboard",
+        "bumped board from below",
+        "bumped kayak",
+        "bumped leg",
+        "bumped off his board and bitten",
+        "bumped ski",
+        "bumped ski from below",
+        "bumped into divers back",
+        "bumped into victim",
+        "bumped rowing scull",
+        "bumped surfboard into air",
+    ],
+    "circled": [
+        "circled diver",
+        "circled sunken boat",
+        "circled victim",
+        "circled victim on ski",
+        "circled & bumped board",
+        "circled surfer and then came back and knocked off the paddle boarder. ",
+    ],
+    "swam at victim": [
+        "swam at victim",
+        "swam towards victim",
+        "swam towards victim & horse",
+        "swam towards diver",
+        "swam between legs of victim",
+        "swam towards spearfisherman",
+        "swam from above in agitated manner, pectoral fins down",
+    ],
+    "swam away": [
+        "swam away after being disturbed",
+        "swam away - body in mouth",
+    ],
+    "attempted bite": [
+        "attempted to bite victim",
+        "attempted to bit legs",
+        "attempted to bite leg",
+        "attempted to bite arm",
+        "attempted to bit divers camera",
+    ],
+    "attacked": [
+        "attacked victim",
+        "bit victim",
+        "bit victim ",
+        "bit another person first",
+        "one shark bit the victim",
+        "aggressive towards victim",
+        "aggressive towards another person",
+        "aggressive towards diver",
+    ],
+    "bit object": [
+        "bit canoe",
+        "bit dress",
+        "bit lead shoe",
+        "bit scull in 2 pieces",
+        "bit clothing - pants",
+        "bit shoe",
+        "bit sock",
+        "bit trouser leg",
+        "bit spear held on victim",
+        "bit collecting bag",
+        "bit rubber dinghy",
+        "bit surfboard",
+        "bit board",
+        "bit surf ski",
+        "bit paddle board",
+        "bit kayak",
+        "bit spear & tangled in line",
+        "bit surfboard leg rope",
+        "bit boat hull",
+        "bit swim fin",
+        "bit body board being towed",
+        "bit surfboard, leg & hand",
+        "bit rear of surfboard",
+        "bit spear & tangled in line",
+    ],
+    "miscellaneous": [
+        "victim was bumped, not bitten",
+        "victim never saw shark",
+        "awaiting dpi investigation",
+        "shark never sighted",
+        "video online (graphic)",
+        "bit fish & fingers",
+        "bit fish on weight belt",
+        "bit surf ski paddle",
+        "bit scull near stern ",
+        "shark got caught in leg rope ",
+    ],
+}
+SHARK_BEHAVIOUR_SPECIFIC_MAPPING = {
+    "shark not seen": [
+        "victim never saw shark",
+        "awaiting dpi investigation",
+        "shark never sighted",
+        "victim was bumped, not bitten",
+    ],
+    "bit object": [
+        "bit victim’s camera",
+        "attempted to bit divers camera",
+        "bit spear & tangled in line",
+        "bit spear held on victim",
+        "bit fish on weight belt",
+        "bit collecting bag",
+    ],
+    "bit equipment": [
+        "bit canoe",
+        "bit kayak",
+        "bit paddle board",
+        "bit rubber dinghy",
+        "bit surfboard",
+        "bit surfboard leg rope",
+        "bit scull near stern",
+        "bit board",
+        "bit body board being towed",
+        "bit swim fin",
+        "bit boat hull",
+        "bit rear of surfboard",
+        # "bit board & surfer",
+    ],
+    "bumped into object": [
+        "bumped board with nose",
+        "bumped canoe with nose",
+        "bumped hull of craft",
+        "bumped kayak",
+        "bumped ski",
+        "bumped rowing scull",
+        "bumped surfboard",
+        "bumped board",
+        "bumped victim’s camera",
+        "bumped into victim",
+    ],
+    "bit head & chest": ["bit victim on head & chest"],
+    "bit torso & arm": ["bit victim on torso & arm"],
+    "bit thigh & arm": ["bit victim on thigh & arm"],
+    "bit leg & back": ["bit victim on leg & back"],
+    "bit shoulder & head": ["bit victim on shoulder & head"],
+    "bit leg & arm": ["bit victim on leg & arm"],
+    "bit flipper / foot": ["bit victim on flipper / foot"],
+    "bit arm": [
+        "bit victim on arm",
+        "bit victim's arm",
+        "bit victim on arms",
+        "bit arm",
+        "bit forearm",
+        "bit hand & arm",
+        "bit victim on shoulder/arm",
+        "bite arm",
+    ],
+    "bit leg": [
+        "bit victim on leg",
+        "bit legs",
+        "bit leg off",
+        "bit leg - thigh",
+        "bit victim on left leg",
+        "bit victim on right thigh",
+        "bit victim on leg - knee",
+        "bit leg - left",
+        "bit victim s legs",
+    ],
+    "bit torso": [
+        "bit victim on torso",
+        "bit torso",
+        "bit victim on chest",
+        "bit victim on chest ",
+    ],
+    "bit shoulder": ["bit victim on shoulder", "bit shoulder"],
+    "bit head": [
+        "bit head",
+        "bit victims head",
+        "bit victim on head",
+        "bit victim on head ",
+    ],
+    "bit foot": [
+        "bit victim on foot",
+        "bit victim on ankle",
+        "bit victim on knee",
+        "bit foot",
+    ],
+    "bit face": ["bit victim on face"],
+    "bit back": ["bit victim on back"],
+    "bit stomach": ["bit victim on stomach"],
+    "bit buttock": ["bit victim on body - buttock", "bit victim on buttock"],
+    "bit multiple times": [
+        "bit victim multiple times",
+        "bit victim mutliple times",
+        "multiple bites",
+    ],
+    "bit victim in half": ["bit victim in half"],
+    "bit victim & board": ["bit victim & board"],
+    "bit arm & board": ["bit arm & board while resting"],
+    "grazed": [
+        "grazed leg with fin",
+        "grazed leg",
+        "grazed victim with fin",
+        "grazed victim skin",
+        "grazed victim w/skin",
+    ],
+    "bumped": [
+        "bumped into divers back",
+        "bumped victim on arm",
+        "bumped victim",
+    ],
+    "swam at victim": [
+        "swam at victim",
+        "swam towards victim",
+        "swam towards diver",
+    ],
+    "swam between legs": ["swam between legs of victim"],
+    "swam away": [
+        "swam away after being disturbed",
+        "swam away - body in mouth",
+    ],
+    "attempted bite": [
+        "attempted to bite victim",
+        "attempted to bite arm",
+        "attempted to bite leg",
+    ],
+    "attacked": [
+        "attacked victim",
+        "aggressive towards victim",
+        "aggressive towards diver",
+    ],
+    "miscellaneous": ["video online (graphic)", "awaiting dpi investigation"],
+}
+FILL_UNKNOWN_COLUMNS = [
+    "victim_gender",
+    "victim_activity",
+    "shark_behaviour",
+    "data_source",
+    "shark_identification_method",
+    "location",
+    "provoked_unprovoked",
+    "injury_location",
+]
+# Columns of filtered_cleaned_shark_data.csv, in order
+CLEANED_COLUMNS = [
+    "incident_month",
+    "incident_year",
+    "injury_severity",
+    "latitude",
+    "longitude",
+    "month_year",
+    "shark_behaviour_generic",
+    "shark_behaviour_specific",
+    "site_category_cleaned",
+    "state_names",
+    "victim_injury",
+    "location",
+    "provoked_unprovoked",
+    "victim_gender",
+    "victim_activity",
+    "shark_common_name",
+    "shark_scientific_name",
+    "no_sharks",
+    "reference",
+    "injury_location",
+    "data_source",
+    "shark_identification_method",
+    "shark_behaviour",
+    "victim_age",
+]
+
+# Relabelling for the dash app, anything not listed goes to "Others"
+DASHBOARD_SITE_CATEGORIES = [
+    "coastal",
+    "island_open_ocean",
+    "estuary_harbour",
+    "river",
+]
+DASHBOARD_INJURY_SEVERITY = {
+    "major_lacerations": "Maj.Lacerations",
+    "minor_lacerations": "Min.Lacerations",
+}
+# shark_behaviour_generic -> dashboard group, everything else (the
+# bites) is a direct attack
+DASHBOARD_BEHAVIOUR_GROUPS = {
+    "unknown": ["unknown", "miscellaneous"],
+    "unseen": ["shark_not_seen_"],
+    "approached_victim": [
+        "after_watching_us_for_a_minute_or_two_he_was_instantly_interested"
+        "_in_our_catch_and_kept_charging_us_until_he_got_it_",
+        "bumped_grazed_victim",
+        "charged_at_speargun",
+        "charged_at_victim_no_contact",
+        "chasing_bait_fish",
+        "circled",
+        "close_passes",
+        "dorsal_fin_surfaced_near_victim",
+        "eating_captured_ray",
+        "followed_survivor",
+        "grazed",
+        "he_got_knocked_off_his_board_by_the_shark_and_then_it_circled"
+        "_back_around_and_grabbed_him",
+        "hit_board_from_underneath_and_lifted_surfer_off_board_and_then"
+        "_swam_away",
+        "shark_swam_aggitated_manner_toward_victim_approaching_really_fast"
+        "_toward_chest_stopped_",
+        "swam_at_victim",
+        "swam_away",
+        "swam_from_above_in_agitated_manner_pectoral_fins_down_",
+        "swam_past_victim",
+        "swam_towards_victim_horse_",
+        "swam_towards_victims",
+        "swam_under_victim_on_board",
+    ],
+    "contact_made": [
+        "brushed_past_victim",
+        "bumped",
+        "bumped_victim_board",
+        "bumped_victim_off_board",
+        "circling_and_trailling_diver",
+        "contacted_flipper",
+        "hit_board_from_below",
+        "hit_the_fins_and_spearguns_of_victims",
+        "knocked_victim_off_board",
+        "lunged_out_of_water_at_victim",
+        "other_people_near_by_on_surf_ski_s_and_paddle_boards",
+        "rushed_at_fisherman",
+        "shark_approached_from_right_hand_side_and_knocked_victim_off_board",
+        "shark_charging_diver_multiple_times_over_20_minute_period_",
+        "shark_ramming_into_the_diver",
+        "surfer_s_board_struck_by_2m_unknown_species",
+        "tore_wetsuit",
+    ],
+}
+DASHBOARD_DEFAULT_BEHAVIOUR_GROUP = "direct_attack"
+UNKNOWN_SHARK_NAMES = ["unknown", "shark_not_known"]
+
+
+def sanitize(input_str: str) -> str:
+    """
+    Replace every run of special characters with '_' and lowercase
+
+    Args:
+        input_str (str): string to sanitize
+
+    Returns:
+        str: sanitized string, str() of anything that is not a string
+    """
+    if not isinstance(input_str, str):
+        return str(input_str)
+    return re.sub(r"[^a-zA-Z0-9]+", "_", input_str).lower()
+
+
+def map_unique_values(series: pd.Series, function) -> pd.Series:
+    """Apply a value -> value function once per distinct value, not per row"""
+    values = series.dropna().unique()
+    return series.map(dict(zip(values, map(function, values))))
+
+
+def sanitize_labels(
+    series: pd.Series, mapping: Dict[str, List[str]] = None
+) -> pd.Series:
+    """
+    Sanitized labels, raw values listed in the mapping get their clean
+    label instead
+
+    Args:
+        series (pd.Series): raw text column
+        mapping (Dict[str, List[str]]): clean label -> raw values.
+            Defaults to None (only sanitize).
+
+    Returns:
+        pd.Series: sanitized labels, missing values stay missing
+    """
+    labels = {}
+    for clean_label, synonyms in (mapping or {}).items():
+        for synonym in synonyms:
+            # first label listing a value wins, like the notebook
+            labels.setdefault(synonym, sanitize(clean_label))
+    return map_unique_values(
+        series, lambda value: labels.get(value, sanitize(value))
+    )
+
+
+def read_raw_incidents(path: str = RAW_DATA_PATH) -> pd.DataFrame:
+    """
+    Read the incident sheet of the database release
+
+    Args:
+        path (str): path to the xlsx
+
+    Returns:
+        pd.DataFrame: raw rows, column names sanitized
+    """
+    df = pd.read_excel(path, sheet_name=RAW_SHEET_NAME)
+    return df.rename(columns=sanitize)
+
+
+def get_row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One uint64 per raw row, changes when any value of the row does"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def clean_incidents(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleaning and feature engineering of analysis/1_explore.ipynb
+
+    Args:
+        raw (pd.DataFrame): rows from read_raw_incidents
+
+    Returns:
+        pd.DataFrame: uin + CLEANED_COLUMNS, same rows and order
+    """
+    df = raw.copy()
+    df["state_names"] = df["state"].replace(STATE_NAMES)
+    df["site_category_cleaned"] = sanitize_labels(df["site_category"])
+    df["victim_injury"] = sanitize_labels(df["victim_injury"]).replace(
+        {"injury": "injured", "fatality": "fatal"}
+    )
+    df["injury_severity"] = sanitize_labels(df["injury_severity"]).replace(
+        {"injury": "injured", "fatal": "fatality"}
+    )
+    df["shark_behaviour_generic"] = sanitize_labels(
+        df["shark_behaviour"], SHARK_BEHAVIOUR_GENERIC_MAPPING
+    ).fillna("unknown")
+    df["shark_behaviour_specific"] = sanitize_labels(
+        df["shark_behaviour"], SHARK_BEHAVIOUR_SPECIFIC_MAPPING
+    ).fillna("unknown")
+    df["month_year"] = pd.to_datetime(
+        {
+            "year": df["incident_year"],
+            "month": df["incident_month"],
+            "day": 1,
+        }
+    )
+    df[FILL_UNKNOWN_COLUMNS] = df[FILL_UNKNOWN_COLUMNS].fillna("unknown")
+    no_shark_name = (
+        df["shark_common_name"].isna() & df["shark_scientific_name"].isna()
+    )
+    df.loc[no_shark_name, ["shark_common_name", "shark_scientific_name"]] = (
+        "shark_not_known"
+    )
+    return df[["uin"] + CLEANED_COLUMNS]
+
+
+def get_dashboard_data(cleaned: pd.DataFrame) -> pd.DataFrame:
+    """
+    Relabelling of the cleaned rows for the dash app: incidents with an
+    unknown provoked/unprovoked are dropped, site categories and
+    severities are grouped and title cased, shark names shortened
+    ("white shark" -> "White") and behaviours grouped
+    (DASHBOARD_BEHAVIOUR_GROUPS)
+
+    Args:
+        cleaned (pd.DataFrame): rows from clean_incidents
+
+    Returns:
+        pd.DataFrame: CLEANED_COLUMNS in the dash app labels
+    """
+    df = cleaned.loc[
+        cleaned["provoked_unprovoked"] != "unknown", CLEANED_COLUMNS
+    ].reset_index(drop=True)
+    df["site_category_cleaned"] = (
+        df["site_category_cleaned"]
+        .where(
+            df["site_category_cleaned"].isin(DASHBOARD_SITE_CATEGORIES),
+            "others",
+        )
+        .str.replace("_", " ")
+        .str.title()
+    )
+    df["injury_severity"] = (
+        df["injury_severity"]
+        .map(DASHBOARD_INJURY_SEVERITY)
+        .fillna("Others")
+        .mask(df["injury_severity"].isna(), "Unknown")
+    )
+    df["shark_common_name"] = (
+        df["shark_common_name"]
+        .where(~df["shark_common_name"].isin(UNKNOWN_SHARK_NAMES), "unknown")
+        .str.replace(" shark", "")
+        .str.title()
+    )
+    behaviour_groups = {
+        behaviour: group
+        for group, behaviours in DASHBOARD_BEHAVIOUR_GROUPS.items()
+        for behaviour in behaviours
+    }
+    df["shark_behaviour_generic"] = (
+        df["shark_behaviour_generic"]
+        .map(behaviour_groups)
+        .fillna(DASHBOARD_DEFAULT_BEHAVIOUR_GROUP)
+    )
+    return df
+
+
+def read_ingest_state(state_path: str) -> pd.DataFrame:
+    """Cleaned rows of the last run with their raw row hash, None if
+    there is no state (first run) or pyarrow is missing"""
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return None
+    if not os.path.exists(state_path):
+        return None
+    table = feather.read_table(state_path)
+    if table.schema.metadata is None or set(CLEANED_COLUMNS) - set(
+        table.column_names
+    ):
+        return None
+    state = table.to_pandas()
+    state.attrs["source_mtime_ns"] = table.schema.metadata.get(
+        b"source_mtime_ns", b""
+    ).decode()
+    state.attrs["source_sha256"] = table.schema.metadata.get(
+        b"source_sha256", b""
+    ).decode()
+    return state
+
+
+def write_ingest_state(
+    state: pd.DataFrame, xlsx_path: str, state_path: str
+) -> None:
+    """Write the cleaned rows + row hashes, tagged with the xlsx mtime
+    and hash. Skipped without pyarrow (every run is then a full run)."""
+    try:
+        import pyarrow as pa
+        from pyarrow import feather
+    except ImportError:
+        return
+    # raw cells can mix numbers and text (coordinates), arrow columns can't
+    state = state.copy()
+    for column_name in state.columns[state.dtypes == object]:
+        column = state[column_name]
+        state[column_name] = column.where(column.isna(), column.astype(str))
+    table = pa.Table.from_pandas(state, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **table.schema.metadata,
+            "source_mtime_ns": str(os.stat(xlsx_path).st_mtime_ns),
+            "source_sha256": get_file_hash(xlsx_path),
+        }
+    )
+    temp_path = state_path + ".tmp"
+    feather.write_feather(table, temp_path)
+    os.replace(temp_path, state_path)
+
+
+def update_cleaned_rows(
+    raw: pd.DataFrame, state: pd.DataFrame = None
+) -> pd.DataFrame:
+    """
+    Clean only the rows whose uin is new or whose raw values changed,
+    reuse the cleaned rows of the state for the rest
+
+    Args:
+        raw (pd.DataFrame): rows from read_raw_incidents
+        state (pd.DataFrame): state of the last run, see read_ingest_state.
+            Defaults to None (clean everything).
+
+    Returns:
+        pd.DataFrame: new state, uin + row_hash + CLEANED_COLUMNS in the
+            order of raw. attrs["n_cleaned"] is the number of rows cleaned.
+    """
+    row_hashes = get_row_hashes(raw)
+    if state is None:
+        is_unchanged = np.zeros(len(raw), dtype=bool)
+    else:
+        previous_hashes = pd.Series(
+            state["row_hash"].to_numpy(), index=state["uin"].to_numpy()
+        )
+        is_unchanged = raw["uin"].map(previous_hashes).to_numpy() == row_hashes
+
+    cleaned = clean_incidents(raw[~is_unchanged])
+    if is_unchanged.any():
+        reused = state.set_index("uin").loc[
+            raw["uin"][is_unchanged], CLEANED_COLUMNS
+        ]
+        cleaned = pd.concat([reused.reset_index(), cleaned], ignore_index=True)
+        # back to the order of the release
+        cleaned = cleaned.set_index("uin").loc[raw["uin"]].reset_index()
+    cleaned.insert(1, "row_hash", row_hashes)
+    cleaned.attrs["n_cleaned"] = int((~is_unchanged).sum())
+    return cleaned
+
+
+def write_dashboard_data(df: pd.DataFrame, path: str) -> None:
+    """
+    Write the dash app csv plus the feather cache and columnar store the
+    app loads from, so its next start maps them without parsing the csv
+
+    Args:
+        df (pd.DataFrame): rows from get_dashboard_data
+        path (str): path to the dash app csv
+    """
+    df.to_csv(path, index=False)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return  # the app falls back to parsing the csv
+    # typed exactly like prepare_data parses the csv
+    typed = apply_data_schema(pd.read_csv(path))
+    write_data_cache(typed, path, get_cache_path(path))
+    store_path = get_store_path(path)
+    meta = read_store_meta(store_path) or {}
+    write_columnar_store(
+        typed,
+        path,
+        store_path,
+        list(
+            dict.fromkeys(
+                list(meta.get("columns", []))
+                + get_dashboard_columns()
+                + DASHBOARD_MAP_COLUMNS
+            )
+        ),
+    )
+
+
+def ingest(
+    xlsx_path: str = RAW_DATA_PATH,
+    cleaned_path: str = CLEANED_DATA_PATH,
+    dashboard_path: str = DASHBOARD_DATA_PATH,
+    state_path: str = STATE_PATH,
+    full: bool = False,
+) -> int:
+    """
+    Refresh the cleaned csvs from a database release
+
+    Args:
+        xlsx_path (str): path to the xlsx release
+        cleaned_path (str): streamlit app csv to write
+        dashboard_path (str): dash app csv to write
+        state_path (str): state of the incremental runs
+        full (bool): ignore the state and clean every row.
+            Defaults to False.
+
+    Returns:
+        int: number of rows cleaned, 0 if the release didn't change
+    """
+    state = None if full else read_ingest_state(state_path)
+    outputs_exist = os.path.exists(cleaned_path) and os.path.exists(
+        dashboard_path
+    )
+    if (
+        state is not None
+        and outputs_exist
+        and is_source_unchanged(
+            xlsx_path,
+            state.attrs["source_mtime_ns"],
+            state.attrs["source_sha256"],
+        )
+    ):
+        return 0
+
+    cleaned = update_cleaned_rows(read_raw_incidents(xlsx_path), state)
+    cleaned[CLEANED_COLUMNS].to_csv(cleaned_path, index=False)
+    write_dashboard_data(get_dashboard_data(cleaned), dashboard_path)
+    write_ingest_state(cleaned, xlsx_path, state_path)
+    return cleaned.attrs["n_cleaned"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--xlsx", default=RAW_DATA_PATH)
+    parser.add_argument("--cleaned-out", default=CLEANED_DATA_PATH)
+    parser.add_argument("--dashboard-out", default=DASHBOARD_DATA_PATH)
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument(
+        "--full", action="store_true", help="clean every row again"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_cleaned = ingest(
+        args.xlsx,
+        args.cleaned_out,
+        args.dashboard_out,
+        args.state,
+        args.full,
+    )
+    print(
+        f"{n_cleaned} rows cleaned in {time.perf_counter() - start:.2f}s"
+        if n_cleaned
+        else "up to date"
+    )
+
+
+if __name__ == "__main__":
+    main()
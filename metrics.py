@@ -0,0 +1,206 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count of observed values, one series
+    per combination of label values (Prometheus histogram semantics)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Tuple[str, ...],
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        """
+        Args:
+            name (str): metric name
+            description (str): HELP text
+            label_names (Tuple[str, ...]): names of the labels
+            buckets (Tuple[float, ...]): bucket upper bounds, ascending.
+                Defaults to DEFAULT_BUCKETS.
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, label_values: Tuple[str, ...]) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0]
+            self._series[label_values] = series
+        for bucket_number, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                series[0][bucket_number] += 1
+                break
+        else:
+            series[0][-1] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        """Lines of the text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_values, (bucket_counts, total) in sorted(
+            self._series.items()
+        ):
+            labels = ",".join(
+                f'{label_name}="{label_value}"'
+                for label_name, label_value in zip(
+                    self.label_names, label_values
+                )
+            )
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for upper_bound, count in zip(
+                self.buckets + (float("inf"),), bucket_counts
+            ):
+                cumulative += count
+                bound = "+Inf" if upper_bound == float("inf") else upper_bound
+                lines.append(
+                    f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Per stage callback timings plus any gauges, rendered as Prometheus text.
+
+    Every process keeps its own numbers, so with several gunicorn workers
+    each scrape sees the worker that answered it. When disabled, timing is
+    a no-op and nothing is recorded.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled (bool): record anything at all. Defaults to True.
+        """
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "dash_callback_stage_seconds",
+            "Time spent per callback stage",
+            ("stage", "graph"),
+        )
+        # (prefix, description, collect function)
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str, graph: str = ""):
+        """
+        Time a block into the stage histogram
+
+        Args:
+            stage (str): stage name (filter, aggregate, build, ...)
+            graph (str): graph id the work is for. Defaults to "".
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds.observe(elapsed, (stage, graph))
+
+    def timed(self, stage: str, graph: str = "") -> Callable:
+        """Decorator version of time(), for whole callbacks"""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(stage, graph):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def add_gauges(
+        self,
+        prefix: str,
+        description: str,
+        collect: Callable[[], Dict[str, float]],
+    ) -> None:
+        """
+        Gauges read at scrape time, e.g. cache stats
+
+        Args:
+            prefix (str): metric name prefix, joined to each key by "_"
+            description (str): HELP text
+            collect (Callable[[], Dict[str, float]]): returns name -> value
+        """
+        self._gauges.append((prefix, description, collect))
+
+    def render(self) -> str:
+        """
+        Everything in the Prometheus text exposition format
+
+        Returns:
+            str: metrics page
+        """
+        with self._lock:
+            lines = self.stage_seconds.render()
+        for prefix, description, collect in self._gauges:
+            for key, value in collect().items():
+                name = f"{prefix}_{key}"
+                lines += [
+                    f"# HELP {name} {description}",
+                    f"# TYPE {name} gauge",
+                    f"{name} {float(value)}",
+                ]
+        return "\n".join(lines) + "\n"
+
+    def register_endpoint(self, server, path: str = "/metrics") -> None:
+        """
+        Serve render() on the flask server, 404 while disabled
+
+        Args:
+            server (flask.Flask): app.server of the dash app
+            path (str): url. Defaults to "/metrics".
+        """
+        from flask import Response, abort
+
+        def metrics_view():
+            if not self.enabled:
+                abort(404)
+            return Response(
+                self.render(), mimetype="text/plain; version=0.0.4"
+            )
+
+        server.add_url_rule(path, "metrics", metrics_view)
@@ -1,14 +1,12 @@
+import os
+
 import pandas as pd
-from dateutil.relativedelta import relativedelta
 
 import plotly.express as px
 import plotly.graph_objects as go
 
-import cufflinks as cf
 import plotly.io as pio
 
-cf.go_offline()
-
 import streamlit as st
 
 from graph_functions import *
@@ -22,17 +20,80 @@ pio.templates["custom"] = go.layout.Template(
 
 pio.templates.default = "custom"
 
-data_path = "/Users/paniket/TU_Eindhoven/2_Study/Q2_JBI100_Visualisation_4/4_Code/JBI100_Visualisation/data/filtered_cleaned_shark_data.csv"
-df = pd.read_csv(data_path)
-df["month_year"] = pd.to_datetime(df["month_year"])
+# Relative to this file, so it runs from any directory
+repo_path = os.path.dirname(os.path.abspath(__file__))
+data_path = os.path.join(repo_path, "data", "filtered_cleaned_shark_data.csv")
+
+# Streamlit reruns this whole file on every widget change. The data,
+# the filtered data and the figures are cached on their (hashable) inputs,
+# so a rerun with filters seen before only copies them out of the cache.
+# Entries expire after CACHE_TTL seconds, at most CACHE_MAX_ENTRIES each.
+CACHE_TTL = 60 * 60
+CACHE_MAX_ENTRIES = 128
+
+# Chart name -> function(filtered df, **options) -> figure
+CHART_BUILDERS = {
+    "incidents_over_time": get_incidents_over_time,
+    "incidents_by_category": lambda data, category_col: (
+        line_chart_on_category(data, category_col, "incident_year")
+    ),
+    "monthly_separate": lambda data, scale_y: (
+        create_subplots_monthly_incident(
+            *prepare_incident_data(data), scale_y=scale_y
+        )
+    ),
+    "monthly_together": lambda data: create_multi_bar_monthly_incident(
+        *prepare_incident_data(data)
+    ),
+    "top_sharks": create_top_sharks_chart,
+    "incident_by_shark": create_incident_by_shark_chart,
+    "victim_activity_vs_provoked": compare_victim_activity_vs_provoked,
+    "attack_severity": create_attack_severity_chart,
+    "custom_grouped_bar": create_custom_grouped_bar_chart,
+}
+
+
+@st.cache_data(show_spinner=False)
+def load_data(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df["month_year"] = pd.to_datetime(df["month_year"])
+    return df
+
+
+@st.cache_data(
+    ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False
+)
+def get_filtered_data(
+    start_year: int, end_year: int, states: tuple
+) -> pd.DataFrame:
+    df = load_data(data_path)
+    filtered_data = df[
+        (df["incident_year"] >= start_year) & (df["incident_year"] <= end_year)
+    ]
+    return filtered_data[filtered_data["state_names"].isin(states)]
+
+
+@st.cache_data(
+    ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False
+)
+def get_chart(
+    chart_name: str, start_year: int, end_year: int, states: tuple, **options
+) -> go.Figure:
+    # cache_data hands out copies, so builders can't change cached data
+    return CHART_BUILDERS[chart_name](
+        get_filtered_data(start_year, end_year, states), **options
+    )
+
 
 # Set page configuration
 st.set_page_config(
     page_title="Shark Incident Visualizations",
-    page_icon="/Users/paniket/TU_Eindhoven/2_Study/Q2_JBI100_Visualisation_4/4_Code/JBI100_Visualisation/images/shark_smile.png",
+    page_icon=os.path.join(repo_path, "images", "shark_smile.png"),
     layout="wide",
 )
 
+df = load_data(data_path)
+
 st.title("Interactive Shark Attack Data Explorer")
 st.sidebar.title("Filter Options")
 
@@ -46,16 +107,13 @@ start_year, end_year = st.sidebar.slider(
     value=(1900, 2000),
 )
 
-filtered_data = df[
-    (df["incident_year"] >= start_year) & (df["incident_year"] <= end_year)
-]
-
 state_filter = st.sidebar.multiselect(
     "Select State(s)",
     options=df["state_names"].unique(),
     default=df["state_names"].unique(),
 )
-filtered_data = filtered_data[filtered_data["state_names"].isin(state_filter)]
+# Key of the filtered data in the caches
+filters = (start_year, end_year, tuple(state_filter))
 
 
 graph_choice = st.sidebar.selectbox(
@@ -78,7 +136,7 @@ if graph_choice == "Trends Over Time":
     )
 
     if trend_option == "All incidents over time":
-        fig = get_incidents_over_time(filtered_data)
+        fig = get_chart("incidents_over_time", *filters)
     else:
         category_col = st.sidebar.selectbox(
             "Select Category to Separate By:",
@@ -90,45 +148,10 @@ if graph_choice == "Trends Over Time":
                 "victim_activity",
             ],
         )
-
-        custom_data = (
-            filtered_data.groupby(["incident_year", category_col])
-            .size()
-            .reset_index(name="attack_count")
-        )
-
-        line_graph = go.Figure()
-        unique_categories = custom_data[category_col].unique()
-        color_map = px.colors.qualitative.Safe[: len(unique_categories)]
-
-        for category, color in zip(unique_categories, color_map):
-            filtered_category_data = custom_data[
-                custom_data[category_col] == category
-            ]
-            line_graph.add_trace(
-                go.Scatter(
-                    x=filtered_category_data["incident_year"],
-                    y=filtered_category_data["attack_count"],
-                    mode="lines",
-                    line=dict(color=color, width=2),
-                    name=str(category).capitalize(),
-                )
-            )
-
-        line_graph.update_layout(
-            title=f"Shark Incidents Over Time by {category_col.replace('_', ' ').capitalize()}",
-            xaxis_title="Year",
-            yaxis_title="Number of Incidents",
-            font=dict(color="#00796b", size=12),
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=False),
-            legend_title=category_col.replace("_", " ").capitalize(),
+        fig = get_chart(
+            "incidents_by_category", *filters, category_col=category_col
         )
 
-        fig = line_graph
-
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -139,13 +162,9 @@ elif graph_choice == "Monthly Trends":
 
     if separate_graphs == "True":
         scale_y = st.sidebar.checkbox("Scale Y Axis", value=False)
-        monthly_data, month_names = prepare_incident_data(filtered_data)
-        fig = create_subplots_monthly_incident(
-            monthly_data, month_names, scale_y=scale_y
-        )
+        fig = get_chart("monthly_separate", *filters, scale_y=scale_y)
     else:
-        monthly_data, month_names = prepare_incident_data(filtered_data)
-        fig = create_multi_bar_monthly_incident(monthly_data, month_names)
+        fig = get_chart("monthly_together", *filters)
 
     st.plotly_chart(fig, use_container_width=True)
 
@@ -162,15 +181,15 @@ elif graph_choice == "Shark Related Information":
     )
 
     if shark_option == "Most Dangerous Sharks":
-        fig = create_top_sharks_chart(filtered_data)
+        fig = get_chart("top_sharks", *filters)
     elif shark_option == "Shark Incidents by Injury Type":
-        fig = create_incident_by_shark_chart(filtered_data)
+        fig = get_chart("incident_by_shark", *filters)
     elif shark_option == "Victim Activities and Shark Attacks":
-        fig = compare_victim_activity_vs_provoked(filtered_data)
+        fig = get_chart("victim_activity_vs_provoked", *filters)
 
     st.plotly_chart(fig, use_container_width=True)
 elif graph_choice == "Attack Severity by Site":
-    fig = create_attack_severity_chart(filtered_data)
+    fig = get_chart("attack_severity", *filters)
     st.plotly_chart(fig, use_container_width=True)
 elif graph_choice == "Custom Grouped Bar Charts":
     x_col = st.sidebar.selectbox(
@@ -192,29 +211,15 @@ elif graph_choice == "Custom Grouped Bar Charts":
     x_label = st.sidebar.text_input("X-Axis Label:", "X-Axis")
     y_label = st.sidebar.text_input("Y-Axis Label:", "Y-Axis")
 
-    bar_chart_data = (
-        filtered_data.groupby([x_col, color_col])
-        .size()
-        .reset_index(name="count")
-    )
-
-    fig = px.bar(
-        bar_chart_data,
-        x=x_col,
-        y=y_col,
-        color=color_col,
+    fig = get_chart(
+        "custom_grouped_bar",
+        *filters,
+        x_col=x_col,
+        y_col=y_col,
+        color_col=color_col,
         title=title,
-        labels={x_col: x_label, y_col: y_label, color_col: "Category"},
-        barmode="group",
-        color_discrete_sequence=px.colors.qualitative.Safe,
-    )
-
-    fig.update_layout(
-        font=dict(color="#00796b", size=12),
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        xaxis=dict(showgrid=False),
-        yaxis=dict(showgrid=False),
+        x_label=x_label,
+        y_label=y_label,
     )
 
     st.plotly_chart(fig, use_container_width=True)
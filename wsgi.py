@@ -0,0 +1,13 @@
+"""
+WSGI entry point for gunicorn/uwsgi:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+The app is built at import time, so with preloading it happens once in the
+master process before the workers are forked.
+"""
+
+from app import create_app
+
+app = create_app()
+server = app.server